@@ -1,48 +1,56 @@
 import os
 import logging
-import json
 import shutil
 from datetime import datetime
 from utils.apktool import APKTool
 from utils.file_manager import FileManager
 from utils.apk_preview import APKPreview
+from utils.build_manifest import BuildManifest
+from utils.blob_store import BlobStore, file_sha256
+from utils.resource_index import ResourceIndex
 
 class APKEditor:
-    def __init__(self, projects_folder, temp_folder):
+    def __init__(self, projects_folder, temp_folder, blobs_folder='blobs', cache_folder='cache'):
         self.projects_folder = projects_folder
         self.temp_folder = temp_folder
-        self.apktool = APKTool()
-        self.file_manager = FileManager(projects_folder)
-        self.apk_preview = APKPreview(temp_folder)
+        self.apktool = APKTool(cache_folder=cache_folder)
+        self.blob_store = BlobStore(blobs_folder)
+        self.file_manager = FileManager(projects_folder, blob_store=self.blob_store)
+        self.apk_preview = APKPreview(temp_folder, os.path.join(cache_folder, 'previews'))
         
-    def decompile_apk(self, apk_path, project_id, project_name):
+    def decompile_apk(self, apk_path, project_id, project_name, apk_sha256=None):
         """Decompile APK and create project"""
         try:
             # Create project directory
             project_dir = os.path.join(self.projects_folder, project_id)
             os.makedirs(project_dir, exist_ok=True)
             
-            # Decompile APK
+            # Decompile APK; the digest keys both the decompile cache and the blob store
+            original_sha256 = apk_sha256 or file_sha256(apk_path)
             decompiled_dir = os.path.join(project_dir, 'decompiled')
-            success = self.apktool.decompile(apk_path, decompiled_dir)
+            success = self.apktool.decompile(apk_path, decompiled_dir, apk_sha256=original_sha256)
             
             if success:
+                # Link original APK into the project through the content-addressed store
+                self.blob_store.store(apk_path, os.path.join(project_dir, 'original.apk'), digest=original_sha256)
+                
                 # Create project metadata
                 metadata = {
                     'id': project_id,
                     'name': project_name,
                     'original_apk': os.path.basename(apk_path),
+                    'original_sha256': original_sha256,
                     'created_at': datetime.now().isoformat(),
                     'status': 'decompiled'
                 }
                 
                 # Save metadata
-                metadata_path = os.path.join(project_dir, 'metadata.json')
-                with open(metadata_path, 'w') as f:
-                    json.dump(metadata, f, indent=2)
+                self.file_manager.metadata.save(project_id, metadata)
+                
+                # Parse the manifest and resources once for previews and resource listings
+                ResourceIndex(decompiled_dir).build()
                 
-                # Copy original APK to project
-                shutil.copy2(apk_path, os.path.join(project_dir, 'original.apk'))
+                self.file_manager.index_project(project_id)
                 
                 logging.info(f"APK decompiled successfully: {project_id}")
                 return True
@@ -68,46 +76,32 @@ class APKEditor:
         }
         
         try:
+            index = ResourceIndex(decompiled_dir).load()
+            
             # Get drawable resources (images)
-            drawable_dirs = [
-                'res/drawable',
-                'res/drawable-hdpi',
-                'res/drawable-mdpi',
-                'res/drawable-xhdpi',
-                'res/drawable-xxhdpi',
-                'res/drawable-xxxhdpi'
-            ]
-            
-            for drawable_dir in drawable_dirs:
-                drawable_path = os.path.join(decompiled_dir, drawable_dir)
-                if os.path.exists(drawable_path):
-                    for file in os.listdir(drawable_path):
-                        if file.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                            resources['images'].append({
-                                'name': file,
-                                'path': os.path.join(drawable_dir, file),
-                                'size': os.path.getsize(os.path.join(drawable_path, file))
-                            })
+            for path, size in sorted(index['drawables'].items()):
+                if path.startswith('res/drawable'):
+                    resources['images'].append({
+                        'name': os.path.basename(path),
+                        'path': path,
+                        'size': size
+                    })
             
             # Get string resources
-            strings_path = os.path.join(decompiled_dir, 'res/values/strings.xml')
-            if os.path.exists(strings_path):
+            if index['strings_size'] is not None:
                 resources['strings'].append({
                     'name': 'strings.xml',
                     'path': 'res/values/strings.xml',
-                    'size': os.path.getsize(strings_path)
+                    'size': index['strings_size']
                 })
             
             # Get layout resources
-            layout_path = os.path.join(decompiled_dir, 'res/layout')
-            if os.path.exists(layout_path):
-                for file in os.listdir(layout_path):
-                    if file.endswith('.xml'):
-                        resources['layouts'].append({
-                            'name': file,
-                            'path': os.path.join('res/layout', file),
-                            'size': os.path.getsize(os.path.join(layout_path, file))
-                        })
+            for path, size in sorted(index['layouts'].items()):
+                resources['layouts'].append({
+                    'name': os.path.basename(path),
+                    'path': path,
+                    'size': size
+                })
             
         except Exception as e:
             logging.error(f"Error getting resources: {str(e)}")
@@ -145,7 +139,10 @@ class APKEditor:
             os.makedirs(os.path.dirname(full_path), exist_ok=True)
             
             # Save uploaded file
-            file.save(full_path)
+            resource_index = ResourceIndex(decompiled_dir)
+            with self.file_manager.track_size(project_id, full_path, resource_index.index_path):
+                file.save(full_path)
+                resource_index.update(resource_path)
             
             logging.info(f"Image saved: {resource_path}")
             return True
@@ -165,8 +162,11 @@ class APKEditor:
             os.makedirs(os.path.dirname(full_path), exist_ok=True)
             
             # Save content
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            resource_index = ResourceIndex(decompiled_dir)
+            with self.file_manager.track_size(project_id, full_path, resource_index.index_path):
+                with open(full_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                resource_index.update(resource_path)
             
             logging.info(f"String resource saved: {resource_path}")
             return True
@@ -186,8 +186,11 @@ class APKEditor:
             os.makedirs(os.path.dirname(full_path), exist_ok=True)
             
             # Save content
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            resource_index = ResourceIndex(decompiled_dir)
+            with self.file_manager.track_size(project_id, full_path, resource_index.index_path):
+                with open(full_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                resource_index.update(resource_path)
             
             logging.info(f"Layout resource saved: {resource_path}")
             return True
@@ -203,13 +206,25 @@ class APKEditor:
             decompiled_dir = os.path.join(project_dir, 'decompiled')
             output_path = os.path.join(project_dir, 'compiled.apk')
             
-            # Compile APK
-            success = self.apktool.compile(decompiled_dir, output_path)
+            # Reuse the last build when the decompiled tree has not changed since
+            build_manifest = BuildManifest(project_dir, ignored_dirs=['build'])
+            previous_build = build_manifest.load()
+            tree_state = build_manifest.scan(previous_build)
+            if build_manifest.is_current(previous_build, tree_state, ['compiled.apk']):
+                logging.info(f"No changes since last compile, reusing cached APK: {project_id}")
+                return self.get_compiled_apk_path(project_id)
+            
+            # Compile and sign APK, accounting for the outputs and apktool's build/ folder
+            signed_path = os.path.join(project_dir, 'signed.apk')
+            with self.file_manager.track_size(project_id, output_path, signed_path,
+                                              os.path.join(decompiled_dir, 'build')):
+                success = self.apktool.compile(decompiled_dir, output_path, file_index=tree_state)
+                if success:
+                    sign_success = self.apktool.sign_apk(output_path, signed_path)
+            self.file_manager.refresh_outputs(project_id)
             
             if success:
-                # Sign APK
-                signed_path = os.path.join(project_dir, 'signed.apk')
-                sign_success = self.apktool.sign_apk(output_path, signed_path)
+                build_manifest.save(tree_state)
                 
                 if sign_success:
                     logging.info(f"APK compiled and signed: {project_id}")
@@ -258,13 +273,16 @@ class APKEditor:
             
             # Save preview data to project metadata
             if preview_data:
-                metadata_path = os.path.join(project_dir, 'metadata.json')
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
+                metadata = self.file_manager.metadata.load(project_id)
+                if metadata is not None:
+                    # Cached renders come back under the same paths, so only a real change is written
+                    previous = metadata.get('preview', {})
+                    if (previous.get('icon_path'), previous.get('app_name'), previous.get('layout_path')) == \
+                            (preview_data['icon'], preview_data['name'], preview_data['layout']):
+                        return preview_data
                     
                     # Add preview data paths
-                    metadata['preview'] = {
+                    preview = {
                         'icon_path': preview_data['icon'],
                         'app_name': preview_data['name'],
                         'layout_path': preview_data['layout'],
@@ -272,8 +290,11 @@ class APKEditor:
                     }
                     
                     # Save updated metadata
-                    with open(metadata_path, 'w') as f:
-                        json.dump(metadata, f, indent=2)
+                    with self.file_manager.track_size(project_id, self.file_manager.metadata.path(project_id)):
+                        metadata = self.file_manager.metadata.update(project_id, {'preview': preview})
+                    if metadata is not None:
+                        metadata.setdefault('id', project_id)
+                        self.file_manager.index.update_metadata(metadata)
             
             return preview_data
             
@@ -284,53 +305,20 @@ class APKEditor:
     def get_app_preview(self, project_id):
         """Get APK preview data"""
         try:
-            project_dir = os.path.join(self.projects_folder, project_id)
-            metadata_path = os.path.join(project_dir, 'metadata.json')
-            
-            # Check if preview already exists in metadata
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r') as f:
-                    metadata = json.load(f)
-                
-                if 'preview' in metadata:
-                    preview = metadata['preview']
-                    
-                    # Verify layout file exists (icon is optional)
-                    layout_exists = preview.get('layout_path') and os.path.exists(preview['layout_path'])
-                    
-                    if layout_exists:
-                        # Convert layout to base64 for embedding in HTML
-                        layout_base64 = self.apk_preview.get_image_base64(preview['layout_path'])
-                        
-                        # Icon is optional - only convert if it exists
-                        icon_base64 = None
-                        if preview.get('icon_path') and os.path.exists(preview['icon_path']):
-                            icon_base64 = self.apk_preview.get_image_base64(preview['icon_path'])
-                        
-                        return {
-                            'app_name': preview.get('app_name', 'Unknown App'),
-                            'icon_base64': icon_base64,
-                            'layout_base64': layout_base64
-                        }
-            
-            # If no preview exists or files are missing, generate new preview
+            # Renders are cached by their inputs, so this only draws when the layout or its values changed
             preview_data = self.generate_app_preview(project_id)
             
             if preview_data:
-                # Layout is required
-                layout_base64 = None
-                if preview_data.get('layout') and os.path.exists(preview_data['layout']):
-                    layout_base64 = self.apk_preview.get_image_base64(preview_data['layout'])
-                
-                # Icon is optional
-                icon_base64 = None
-                if preview_data.get('icon') and os.path.exists(preview_data['icon']):
-                    icon_base64 = self.apk_preview.get_image_base64(preview_data['icon'])
+                # Images are served by URL; the cache key in their file name doubles as the ETag
+                images = {}
+                for kind in ('icon', 'layout'):
+                    path = preview_data.get(kind)
+                    images[kind] = self.apk_preview.preview_cache.etag(path) if path and os.path.exists(path) else None
                 
                 return {
                     'app_name': preview_data['name'],
-                    'icon_base64': icon_base64,
-                    'layout_base64': layout_base64
+                    'icon_etag': images['icon'],
+                    'layout_etag': images['layout']
                 }
             
             return None
@@ -338,3 +326,22 @@ class APKEditor:
         except Exception as e:
             logging.error(f"Error getting app preview: {str(e)}")
             return None
+    
+    def get_preview_image(self, project_id, kind):
+        """Return (path, etag) of a project's stored preview image ('icon' or 'layout')"""
+        try:
+            metadata = self.file_manager.metadata.load(project_id) or {}
+            path = metadata.get('preview', {}).get(f"{kind}_path")
+            
+            # Evicted or never rendered: draw it again
+            if not path or not os.path.exists(path):
+                preview_data = self.generate_app_preview(project_id)
+                path = preview_data.get(kind) if preview_data else None
+                if not path or not os.path.exists(path):
+                    return None, None
+            
+            return path, self.apk_preview.preview_cache.etag(path)
+            
+        except Exception as e:
+            logging.error(f"Error getting preview image: {str(e)}")
+            return None, None
@@ -1,14 +1,23 @@
 import os
 import logging
-import requests
 import json
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify, Response
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 import uuid
+import threading
 from datetime import datetime
 from apk_editor import APKEditor
-from utils.file_manager import FileManager
+from utils.job_queue import JobQueue, JobQueueFull
+from utils.chunked_upload import ChunkedUploads, UploadError
+from utils.resource_index import ResourceIndex
+from utils.blob_store import cached_file_sha256
+from utils.storage_janitor import StorageJanitor, default_categories, job_paths
+from utils.gemini_client import GeminiClient, GeminiError
+from utils.generation_stream import GenerationStream
+from utils.gui_rules import DEFAULT_ENGINE as gui_rules
+from utils.gui_batch import run_batch
+from utils.layout_rewriter import LayoutRewriter, AttributeRule, map_values, layout_paths, rewrite_values
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -20,28 +29,69 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['MAX_UPLOAD_SIZE'] = 2 * 1024 * 1024 * 1024  # 2GB max APK through chunked uploads
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024
+app.config['PREVIEW_MAX_AGE'] = int(os.environ.get('PREVIEW_MAX_AGE', 365 * 24 * 3600))
+# Let a front-end server (Apache/lighttpd X-Sendfile) stream downloads from disk
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '0') == '1'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['PROJECTS_FOLDER'] = 'projects'
 app.config['TEMP_FOLDER'] = 'temp'
+app.config['BLOBS_FOLDER'] = 'blobs'
+app.config['CACHE_FOLDER'] = 'cache'
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['PROJECTS_PER_PAGE'] = 50
+app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', 4))
+# Show generated code while the model is still writing it
+app.config['AI_STREAMING'] = os.environ.get('AI_STREAMING', '1') == '1'
 
 # Ensure directories exist
-for folder in [app.config['UPLOAD_FOLDER'], app.config['PROJECTS_FOLDER'], app.config['TEMP_FOLDER']]:
+for folder in [app.config['UPLOAD_FOLDER'], app.config['PROJECTS_FOLDER'], app.config['TEMP_FOLDER'], app.config['BLOBS_FOLDER'], app.config['CACHE_FOLDER']]:
     os.makedirs(folder, exist_ok=True)
 
 # Initialize services
-file_manager = FileManager(app.config['PROJECTS_FOLDER'])
-apk_editor = APKEditor(app.config['PROJECTS_FOLDER'], app.config['TEMP_FOLDER'])
+apk_editor = APKEditor(app.config['PROJECTS_FOLDER'], app.config['TEMP_FOLDER'], app.config['BLOBS_FOLDER'],
+                       app.config['CACHE_FOLDER'])
+# One FileManager, so every metadata write goes through the same store and its per-project locks
+file_manager = apk_editor.file_manager
+job_queue = JobQueue(max_workers=app.config['JOB_WORKERS'])
+gemini_client = GeminiClient.from_env(cache_folder=os.path.join(app.config['CACHE_FOLDER'], 'gemini'))
+# Separate workers so slow AI calls never hold up decompile and compile jobs
+ai_jobs = JobQueue(max_workers=int(os.environ.get('GEMINI_MAX_CONCURRENCY', 4)))
+# Live output of streaming generations, by function ID, until their job finishes
+generation_streams = {}
+generation_streams_lock = threading.Lock()
+chunked_uploads = ChunkedUploads(app.config['UPLOAD_FOLDER'], max_size=app.config['MAX_UPLOAD_SIZE'])
+
+# Expire leftovers in uploads/ and temp/, never touching files an active job still needs
+storage_janitor = StorageJanitor(default_categories(app.config['UPLOAD_FOLDER'], app.config['TEMP_FOLDER']),
+                                 max_bytes=int(os.environ.get('STORAGE_QUOTA_BYTES', 5 * 1024 ** 3)),
+                                 interval=int(os.environ.get('STORAGE_SWEEP_INTERVAL', 3600)),
+                                 protected=[lambda: job_paths(job_queue), lambda: job_paths(ai_jobs)])
+storage_janitor.start()
 
 @app.route('/')
 def index():
     """Main page with project list and upload form"""
-    projects = file_manager.list_projects()
-
-    # Check if Gemini API is configured
-    gemini_api_key = os.environ.get('GEMINI_API_KEY')
-    gemini_enabled = gemini_api_key and gemini_api_key != 'AIzaSyDummy_Key_Replace_With_Real_Key'
+    per_page = app.config['PROJECTS_PER_PAGE']
+    page = max(1, request.args.get('page', 1, type=int))
+    sort = request.args.get('sort', 'created_at')
+    descending = request.args.get('order', 'desc') != 'asc'
+    
+    total = file_manager.count_projects()
+    projects = file_manager.list_projects(offset=(page - 1) * per_page, limit=per_page,
+                                          sort=sort, descending=descending)
+    pagination = {
+        'page': page,
+        'pages': max(1, (total + per_page - 1) // per_page),
+        'total': total,
+        'sort': sort,
+        'order': 'desc' if descending else 'asc'
+    }
 
-    return render_template('index.html', projects=projects, gemini_enabled=gemini_enabled)
+    return render_template('index.html', projects=projects, gemini_enabled=gemini_client.enabled,
+                           pagination=pagination, chunked_upload=True,
+                           upload_chunk_size=app.config['UPLOAD_CHUNK_SIZE'])
 
 @app.route('/upload', methods=['POST'])
 def upload_apk():
@@ -95,20 +145,20 @@ def upload_apk():
             os.remove(upload_path)
             return redirect(url_for('index'))
 
-        # Decompile APK
+        # Decompile APK in the background
         project_name = request.form.get('project_name', filename.replace('.apk', ''))
-        logging.info(f"Decompiling APK with project name: {project_name}")
-        success = apk_editor.decompile_apk(upload_path, project_id, project_name)
+        logging.info(f"Queueing decompile with project name: {project_name}")
+        job = job_queue.submit('decompile', run_decompile_job, upload_path, project_id, project_name,
+                               project_id=project_id,
+                               next_url=url_for('project_view', project_id=project_id))
 
-        if success:
-            logging.info(f"APK decompiled successfully: {project_id}")
-            flash(f'APK "{filename}" uploaded and decompiled successfully!', 'success')
-            return redirect(url_for('project_view', project_id=project_id))
-        else:
-            logging.error(f"Failed to decompile APK: {filename}")
-            flash('Failed to decompile APK. Please check if it\'s a valid APK file.', 'error')
-            return redirect(url_for('index'))
+        flash(f'APK "{filename}" uploaded, decompiling in the background...', 'success')
+        return redirect(url_for('index', job=job.id))
 
+    except JobQueueFull as e:
+        logging.warning(f"Upload rejected: {str(e)}")
+        flash(str(e), 'error')
+        return redirect(url_for('index'))
     except Exception as e:
         logging.error(f"Upload error: {str(e)}")
         flash(f'Upload failed: {str(e)}', 'error')
@@ -125,8 +175,13 @@ def project_view(project_id):
     # Get project resources
     resources = apk_editor.get_project_resources(project_id)
     
-    # Get APK preview data
+    # Get APK preview data; images load from versioned /preview URLs
     app_preview = apk_editor.get_app_preview(project_id)
+    if app_preview:
+        for kind in ('icon', 'layout'):
+            etag = app_preview[f"{kind}_etag"]
+            app_preview[f"{kind}_url"] = url_for('preview_image', project_id=project_id, kind=kind,
+                                                 v=etag) if etag else None
 
     return render_template('project.html', 
                          project=project, 
@@ -134,6 +189,23 @@ def project_view(project_id):
                          project_id=project_id,
                          app_preview=app_preview)
 
+@app.route('/preview/<project_id>/<kind>')
+def preview_image(project_id, kind):
+    """Serve a stored preview image with a strong ETag"""
+    if kind not in ('icon', 'layout') or not file_manager.get_project(project_id):
+        return jsonify({'error': 'Preview not found'}), 404
+
+    path, etag = apk_editor.get_preview_image(project_id, kind)
+    if not path:
+        return jsonify({'error': 'Preview not found'}), 404
+
+    # A URL carrying the current version never changes, anything else revalidates
+    max_age = app.config['PREVIEW_MAX_AGE'] if request.args.get('v') == etag else 0
+    response = send_file(path, mimetype='image/png', etag=etag, conditional=True, max_age=max_age)
+    if max_age:
+        response.cache_control.immutable = True
+    return response
+
 @app.route('/edit/<project_id>/<resource_type>/<path:resource_path>')
 def edit_resource(project_id, resource_type, resource_path):
     """Edit a specific resource"""
@@ -206,19 +278,116 @@ def compile_apk(project_id):
             flash('Project not found', 'error')
             return redirect(url_for('index'))
 
-        output_path = apk_editor.compile_apk(project_id)
-        if output_path:
-            flash('APK compiled successfully!', 'success')
-            return redirect(url_for('download_apk', project_id=project_id))
-        else:
-            flash('Failed to compile APK', 'error')
-            return redirect(url_for('project_view', project_id=project_id))
+        job = job_queue.submit('compile', run_compile_job, project_id,
+                               project_id=project_id,
+                               next_url=url_for('download_apk', project_id=project_id))
+        flash('Compiling APK in the background...', 'success')
+        return redirect(url_for('project_view', project_id=project_id, job=job.id))
 
+    except JobQueueFull as e:
+        flash(str(e), 'error')
+        return redirect(url_for('project_view', project_id=project_id))
     except Exception as e:
         logging.error(f"Compile error: {str(e)}")
         flash(f'Compile failed: {str(e)}', 'error')
         return redirect(url_for('project_view', project_id=project_id))
 
+def run_decompile_job(job, upload_path, project_id, project_name, apk_sha256=None):
+    """Background job: decompile an uploaded APK into a new project"""
+    job.update(10, f"Decompiling {os.path.basename(upload_path)}")
+    if not apk_editor.decompile_apk(upload_path, project_id, project_name, apk_sha256=apk_sha256):
+        raise RuntimeError("Failed to decompile APK. Please check if it's a valid APK file.")
+    
+    # The project now holds the APK through the blob store
+    os.remove(upload_path)
+    job.update(100, 'APK decompiled successfully')
+
+def run_compile_job(job, project_id):
+    """Background job: compile and sign a project"""
+    job.update(10, 'Compiling APK')
+    # A batch compile and a single compile of the same project must not build over each other
+    with job_queue.project_lock(project_id):
+        output_path = apk_editor.compile_apk(project_id)
+    if not output_path:
+        raise RuntimeError('Failed to compile APK')
+    job.update(100, 'APK compiled successfully!')
+    return output_path
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable chunked APK upload"""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not filename.lower().endswith('.apk'):
+        return jsonify({'error': 'Please upload an APK file'}), 400
+    
+    try:
+        size = int(data['size']) if data.get('size') is not None else None
+        upload = chunked_uploads.create(filename, size)
+        return jsonify(upload), 201
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid upload size'}), 400
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Report how many bytes of an upload have been received"""
+    try:
+        return jsonify(chunked_uploads.status(upload_id))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append a chunk of raw bytes at ?offset=N"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Missing offset'}), 400
+    
+    try:
+        new_offset = chunked_uploads.write_chunk(upload_id, offset, request.stream)
+        return jsonify({'id': upload_id, 'offset': new_offset})
+    except UploadError as e:
+        if e.status == 415:
+            chunked_uploads.discard(upload_id)
+        return jsonify({'error': str(e), 'offset': e.offset}), e.status
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Finish a chunked upload and queue its decompile"""
+    try:
+        upload = chunked_uploads.status(upload_id)
+        data_path, apk_sha256 = chunked_uploads.complete(upload_id)
+    except UploadError as e:
+        if e.status == 415:
+            chunked_uploads.discard(upload_id)
+        return jsonify({'error': str(e), 'offset': e.offset}), e.status
+    
+    try:
+        project_id = str(uuid.uuid4())
+        filename = upload['filename']
+        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{project_id}_{filename}")
+        os.replace(data_path, upload_path)
+        
+        data = request.get_json(silent=True) or {}
+        project_name = data.get('project_name') or filename.replace('.apk', '')
+        job = job_queue.submit('decompile', run_decompile_job, upload_path, project_id, project_name,
+                               apk_sha256=apk_sha256, project_id=project_id,
+                               next_url=url_for('project_view', project_id=project_id))
+        
+        return jsonify({'job_id': job.id, 'redirect_url': url_for('index', job=job.id)})
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report progress of a background job"""
+    job = job_queue.get(job_id) or ai_jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/download/<project_id>')
 def download_apk(project_id):
     """Download compiled APK"""
@@ -230,10 +399,14 @@ def download_apk(project_id):
 
         apk_path = apk_editor.get_compiled_apk_path(project_id)
         if apk_path and os.path.exists(apk_path):
+            # Content-hash ETag plus conditional handling gives Range/If-Range resume support
             return send_file(apk_path, 
                            as_attachment=True, 
                            download_name=f"{project['name']}_modified.apk",
-                           mimetype='application/vnd.android.package-archive')
+                           mimetype='application/vnd.android.package-archive',
+                           etag=cached_file_sha256(apk_path),
+                           conditional=True,
+                           max_age=0)
         else:
             flash('Compiled APK not found. Please compile first.', 'error')
             return redirect(url_for('project_view', project_id=project_id))
@@ -279,24 +452,100 @@ def generate_function():
                 image.save(image_path)
                 image_paths.append(image_path)
 
-        # Generate function based on prompt
-        generated_code = generate_code_from_prompt(function_prompt, image_paths)
-
-        # Save generated function
         function_id = str(uuid.uuid4())
-        function_file = os.path.join(app.config['TEMP_FOLDER'], f"generated_function_{function_id}.py")
+        if app.config['AI_STREAMING']:
+            # The function page follows the stream and shows code as it is generated
+            with generation_streams_lock:
+                generation_streams[function_id] = GenerationStream()
+            try:
+                ai_jobs.submit('generate', run_stream_function_job, function_prompt, function_id, *image_paths)
+            except JobQueueFull:
+                with generation_streams_lock:
+                    generation_streams.pop(function_id, None)
+                raise
+            return redirect(url_for('view_generated_function', function_id=function_id))
+
+        # The API call runs on an AI worker; the job page forwards to the result when it is ready
+        job = ai_jobs.submit('generate', run_generate_function_job, function_prompt, function_id, *image_paths,
+                             next_url=url_for('view_generated_function', function_id=function_id))
+
+        flash('Generating function in the background...', 'success')
+        return redirect(url_for('index', job=job.id))
+
+    except JobQueueFull as e:
+        flash(str(e), 'error')
+        return redirect(url_for('index'))
+    except Exception as e:
+        logging.error(f"Generate function error: {str(e)}")
+        flash(f'Generation failed: {str(e)}', 'error')
+        return redirect(url_for('index'))
 
-        with open(function_file, 'w') as f:
-            f.write(generated_code)
+def run_generate_function_job(job, function_prompt, function_id, *image_paths):
+    """Background job: generate code for a prompt and save it as a generated function"""
+    job.update(10, 'Generating code')
+    generated_code = generate_code_from_prompt(function_prompt, list(image_paths))
 
-        flash(f'Function generated successfully! Saved as: generated_function_{function_id}.py', 'success')
+    function_file = os.path.join(app.config['TEMP_FOLDER'], f"generated_function_{function_id}.py")
+    with open(function_file, 'w') as f:
+        f.write(generated_code)
+    job.update(100, f'Function generated successfully! Saved as: generated_function_{function_id}.py')
+    return function_file
 
-        return redirect(url_for('view_generated_function', function_id=function_id))
+def run_stream_function_job(job, function_prompt, function_id, *image_paths):
+    """Background job: stream generated code into the saved function file and its live stream"""
+    with generation_streams_lock:
+        stream = generation_streams[function_id]
+    function_file = os.path.join(app.config['TEMP_FOLDER'], f"generated_function_{function_id}.py")
 
+    try:
+        job.update(10, 'Generating code')
+        with open(function_file, 'w') as f:
+            for text in stream_code_from_prompt(function_prompt, list(image_paths)):
+                # The file is written first, so a follower that misses the stream still reads everything
+                f.write(text)
+                f.flush()
+                stream.append(text)
+        stream.close()
+        job.update(100, f'Function generated successfully! Saved as: generated_function_{function_id}.py')
+        return function_file
     except Exception as e:
-        logging.error(f"Generate function error: {str(e)}")
-        flash(f'Generation failed: {str(e)}', 'error')
-        return redirect(url_for('index'))
+        stream.close(error=str(e))
+        raise
+    finally:
+        with generation_streams_lock:
+            generation_streams.pop(function_id, None)
+
+@app.route('/view_function/<function_id>/events')
+def generated_function_events(function_id):
+    """Server-sent events carrying a generated function's code as it is produced"""
+    with generation_streams_lock:
+        stream = generation_streams.get(function_id)
+    function_file = os.path.join(app.config['TEMP_FOLDER'], f"generated_function_{function_id}.py")
+
+    def events():
+        if stream is None:
+            # Already finished: replay the saved file in one event
+            if not os.path.exists(function_file):
+                yield f"event: failed\ndata: {json.dumps({'error': 'Generated function not found'})}\n\n"
+                return
+            with open(function_file, 'r') as f:
+                yield f"data: {json.dumps({'text': f.read()})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+            return
+
+        for text in stream.follow():
+            if text is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {json.dumps({'text': text})}\n\n"
+        if stream.error:
+            yield f"event: failed\ndata: {json.dumps({'error': stream.error})}\n\n"
+        else:
+            yield "event: done\ndata: {}\n\n"
+
+    # X-Accel-Buffering stops nginx from holding events back
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/view_function/<function_id>')
 def view_generated_function(function_id):
@@ -304,6 +553,13 @@ def view_generated_function(function_id):
     try:
         function_file = os.path.join(app.config['TEMP_FOLDER'], f"generated_function_{function_id}.py")
 
+        with generation_streams_lock:
+            streaming = function_id in generation_streams
+        if streaming:
+            # The page fills itself in from the event stream
+            return render_template('view_function.html', function_code='', function_id=function_id,
+                                   stream_url=url_for('generated_function_events', function_id=function_id))
+
         if not os.path.exists(function_file):
             flash('Generated function not found', 'error')
             return redirect(url_for('index'))
@@ -320,18 +576,16 @@ def view_generated_function(function_id):
         flash(f'View failed: {str(e)}', 'error')
         return redirect(url_for('index'))
 
-def generate_code_from_prompt(prompt, image_paths):
-    """Generate code using Google Gemini AI based on user prompt and images"""
-    try:
-        # Get API key from environment or use default for testing
-        api_key = os.environ.get('GEMINI_API_KEY', 'AIzaSyDummy_Key_Replace_With_Real_Key')
-
-        if api_key == 'AIzaSyDummy_Key_Replace_With_Real_Key':
-            logging.warning("Using dummy Gemini API key. Set GEMINI_API_KEY environment variable for real AI generation.")
-            return generate_fallback_code(prompt)
+CODE_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "topK": 40,
+    "topP": 0.95,
+    "maxOutputTokens": 2048,
+}
 
-        # Prepare the prompt for Android development
-        enhanced_prompt = f"""
+def build_code_prompt(prompt):
+    """Wrap a user request in the Android code generation instructions"""
+    return f"""
         You are an expert Android developer. Generate Android code based on this request:
 
         User Request: {prompt}
@@ -345,58 +599,60 @@ def generate_code_from_prompt(prompt, image_paths):
         Focus on practical, working Android code that can be integrated into an APK.
         """
 
-        # Prepare request data
-        request_data = {
-            "contents": [{
-                "parts": [{"text": enhanced_prompt}]
-            }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 2048,
-            }
-        }
-
-        # Make API request to Gemini
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
-
-        headers = {
-            'Content-Type': 'application/json',
-        }
-
-        response = requests.post(url, headers=headers, json=request_data, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-
-            if 'candidates' in result and len(result['candidates']) > 0:
-                generated_content = result['candidates'][0]['content']['parts'][0]['text']
-
-                # Format the generated code
-                formatted_code = f"""# AI Generated Android Code
+def generated_code_header(prompt):
+    return f"""# AI Generated Android Code
 # Generated at: {datetime.now().isoformat()}
 # Prompt: {prompt}
 
-{generated_content}
-
 """
-                logging.info("AI code generation successful")
-                return formatted_code
-            else:
-                logging.error("No content generated by Gemini API")
-                return generate_fallback_code(prompt)
-        else:
-            logging.error(f"Gemini API error: {response.status_code} - {response.text}")
+
+def generate_code_from_prompt(prompt, image_paths):
+    """Generate code using Google Gemini AI based on user prompt and images"""
+    try:
+        if not gemini_client.enabled:
+            logging.warning("Using dummy Gemini API key. Set GEMINI_API_KEY environment variable for real AI generation.")
             return generate_fallback_code(prompt)
 
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Request error during AI generation: {str(e)}")
+        generated_content = gemini_client.generate(build_code_prompt(prompt), CODE_GENERATION_CONFIG)
+        logging.info("AI code generation successful")
+        return f"{generated_code_header(prompt)}{generated_content}\n\n"
+
+    except GeminiError as e:
+        logging.error(f"Error during AI generation: {str(e)}")
         return generate_fallback_code(prompt)
     except Exception as e:
         logging.error(f"Error during AI code generation: {str(e)}")
         return generate_fallback_code(prompt)
 
+def stream_code_from_prompt(prompt, image_paths):
+    """Yield generated code as the model streams it, falling back to templates if nothing arrives"""
+    if not gemini_client.enabled:
+        logging.warning("Using dummy Gemini API key. Set GEMINI_API_KEY environment variable for real AI generation.")
+        yield generate_fallback_code(prompt)
+        return
+
+    started = False
+    try:
+        for text in gemini_client.stream(build_code_prompt(prompt), CODE_GENERATION_CONFIG):
+            if not started:
+                started = True
+                yield generated_code_header(prompt)
+            yield text
+    except GeminiError as e:
+        # Text already sent cannot be taken back, so only an empty stream falls back
+        if started:
+            raise
+        logging.error(f"Error during AI generation: {str(e)}")
+        yield generate_fallback_code(prompt)
+        return
+
+    if started:
+        logging.info("AI code generation successful")
+        yield "\n\n"
+    else:
+        logging.error("No content generated by Gemini API")
+        yield generate_fallback_code(prompt)
+
 def generate_fallback_code(prompt):
     """Generate fallback code when AI is not available"""
     code_template = f"""# Generated Android Code (Fallback Mode)
@@ -775,10 +1031,15 @@ def modify_gui(project_id):
         modifications = generate_gui_modifications(gui_changes, color_scheme, image_paths)
 
         # Apply modifications to project
-        success = apply_gui_modifications(project_id, modifications)
+        report = apply_gui_modifications(project_id, modifications)
 
-        if success:
-            flash('GUI modifications applied successfully!', 'success')
+        if report is not None:
+            if report:
+                changed = sum(len(changes) for changes in report.values())
+                flash(f'GUI modifications applied successfully! {changed} changes in '
+                      f'{len(report)} files: {", ".join(sorted(report))}', 'success')
+            else:
+                flash('GUI modifications applied, but no matching resources needed changes', 'success')
 
             # Update project metadata
             file_manager.update_project_metadata(project_id, {
@@ -797,6 +1058,73 @@ def modify_gui(project_id):
         flash(f'Modification failed: {str(e)}', 'error')
         return redirect(url_for('project_view', project_id=project_id))
 
+@app.route('/batch_modify_gui', methods=['POST'])
+def batch_modify_gui():
+    """Apply one GUI modification spec to many projects and return a per-project report"""
+    spec = request.get_json(silent=True) or {}
+    project_ids = spec.get('project_ids') or []
+    gui_changes = (spec.get('gui_changes') or '').strip()
+    color_scheme = spec.get('color_scheme') or ''
+
+    if not isinstance(project_ids, list) or not project_ids:
+        return jsonify({'error': 'project_ids must be a non-empty list'}), 400
+    if not gui_changes and not color_scheme:
+        return jsonify({'error': 'Provide gui_changes and/or color_scheme'}), 400
+
+    report = run_gui_batch(project_ids, gui_changes, color_scheme, compile=bool(spec.get('compile')))
+    return jsonify(report)
+
+def run_gui_batch(project_ids, gui_changes, color_scheme, compile=False):
+    """Parse a modification spec once, apply it to every project on a worker pool, optionally queue a compile"""
+    modifications = generate_gui_modifications(gui_changes, color_scheme, [])
+
+    def apply_project(project_id):
+        if not file_manager.get_project(project_id):
+            return {'status': 'not_found'}
+        report = apply_gui_modifications(project_id, modifications)
+        if report is None:
+            return {'status': 'failed', 'error': 'Failed to apply GUI modifications'}
+        file_manager.update_project_metadata(project_id, {
+            'last_gui_changes': gui_changes,
+            'color_scheme': color_scheme,
+            'status': 'modified'
+        })
+        return {'status': 'ok', 'changes': report}
+
+    report = run_batch(project_ids, apply_project, max_workers=app.config['BATCH_WORKERS'])
+    report['modifications'] = modifications
+
+    if compile:
+        succeeded = [project_id for project_id, result in report['projects'].items() if result['status'] == 'ok']
+        if succeeded:
+            # One job for the whole batch, so dozens of projects never overflow the job queue
+            try:
+                job = job_queue.submit('batch_compile', run_batch_compile_job, *succeeded)
+                report['compile_job'] = job.id
+            except JobQueueFull as e:
+                report['compile_error'] = str(e)
+
+    return report
+
+def run_batch_compile_job(job, *project_ids):
+    """Background job: compile and sign several projects one after another"""
+    outputs = {}
+    for index, project_id in enumerate(project_ids):
+        try:
+            with job_queue.project_lock(project_id):
+                outputs[project_id] = apk_editor.compile_apk(project_id)
+        except Exception as e:
+            logging.error(f"Batch compile failed for {project_id}: {str(e)}")
+            outputs[project_id] = None
+        job.update((index + 1) * 100 // len(project_ids),
+                   f"{'Compiled' if outputs[project_id] else 'Failed to compile'} {project_id} "
+                   f"({index + 1}/{len(project_ids)})")
+
+    failed = [project_id for project_id, output in outputs.items() if not output]
+    if failed:
+        raise RuntimeError(f"Failed to compile {len(failed)} of {len(project_ids)} projects: {', '.join(failed)}")
+    return outputs
+
 def generate_gui_modifications(changes_description, color_scheme, image_paths):
     """Generate GUI modifications based on user description"""
     modifications = {
@@ -823,141 +1151,53 @@ def generate_gui_modifications(changes_description, color_scheme, image_paths):
             modifications['colors'] = color_schemes[color_scheme]
 
     # Text analysis for modifications
-    changes_lower = changes_description.lower()
-
-    # Control knob modifications
-    if 'knob' in changes_lower or 'control' in changes_lower:
-        if 'blue' in changes_lower:
-            modifications['colors']['control_color'] = '#007bff'
-        elif 'green' in changes_lower:
-            modifications['colors']['control_color'] = '#28a745'
-        elif 'red' in changes_lower:
-            modifications['colors']['control_color'] = '#dc3545'
-        elif 'orange' in changes_lower:
-            modifications['colors']['control_color'] = '#fd7e14'
-
-    # D-pad modifications
-    if 'dpad' in changes_lower or 'd-pad' in changes_lower:
-        if 'bigger' in changes_lower or 'larger' in changes_lower:
-            modifications['layouts']['dpad_size'] = 'large'
-        elif 'smaller' in changes_lower:
-            modifications['layouts']['dpad_size'] = 'small'
-
-    # Glow/lighting effects
-    if 'glow' in changes_lower or 'light' in changes_lower:
-        if 'blue' in changes_lower:
-            modifications['colors']['glow_color'] = '#007bff'
-        elif 'green' in changes_lower:
-            modifications['colors']['glow_color'] = '#28a745'
-        elif 'red' in changes_lower:
-            modifications['colors']['glow_color'] = '#dc3545'
-
-    # Connection status modifications
-    if 'connection' in changes_lower or 'status' in changes_lower:
-        if 'connected' in changes_lower:
-            modifications['strings']['connection_status'] = 'Connected'
-            modifications['colors']['status_color'] = '#28a745'
-        elif 'disconnected' in changes_lower:
-            modifications['strings']['connection_status'] = 'Disconnected'
-            modifications['colors']['status_color'] = '#dc3545'
-
-    # Button modifications (legacy support)
-    if 'button' in changes_lower:
-        if 'blue' in changes_lower:
-            modifications['colors']['button_color'] = '#007bff'
-        elif 'green' in changes_lower:
-            modifications['colors']['button_color'] = '#28a745'
-        elif 'red' in changes_lower:
-            modifications['colors']['button_color'] = '#dc3545'
-
-    # Text modifications
-    if 'text' in changes_lower:
-        if 'bigger' in changes_lower or 'larger' in changes_lower:
-            modifications['layouts']['text_size'] = 'large'
-        elif 'smaller' in changes_lower:
-            modifications['layouts']['text_size'] = 'small'
-
-    return modifications
+    return gui_rules.apply(changes_description, modifications)
+
+# Layout attribute rules for each text_size modification
+TEXT_SIZE_RULES = {
+    'large': [AttributeRule('android:textSize', map_values({'14sp': '18sp', '16sp': '20sp'}))],
+    'small': [AttributeRule('android:textSize', map_values({'16sp': '12sp', '18sp': '14sp'}))],
+}
 
 def apply_gui_modifications(project_id, modifications):
-    """Apply GUI modifications to project files"""
+    """Apply GUI modifications to project files and report what changed, or return None on failure"""
     try:
         project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
         decompiled_dir = os.path.join(project_dir, 'decompiled')
-
-        # Apply color modifications
-        if modifications['colors']:
-            colors_file = os.path.join(decompiled_dir, 'res/values/colors.xml')
-            if os.path.exists(colors_file):
-                with open(colors_file, 'r') as f:
-                    content = f.read()
-
-                # Update colors
-                for color_name, color_value in modifications['colors'].items():
-                    # Simple color replacement
-                    color_pattern = f'<color name="{color_name}">'
-                    if color_pattern in content:
-                        content = content.replace(
-                            f'{color_pattern}#[0-9A-Fa-f]{{6}}</color>',
-                            f'{color_pattern}{color_value}</color>'
-                        )
-
-                with open(colors_file, 'w') as f:
-                    f.write(content)
-
-        # Apply string modifications
-        if modifications['strings']:
-            strings_file = os.path.join(decompiled_dir, 'res/values/strings.xml')
-            if os.path.exists(strings_file):
-                with open(strings_file, 'r') as f:
-                    content = f.read()
-
-                # Update strings
-                for string_name, string_value in modifications['strings'].items():
-                    # Simple string replacement
-                    string_pattern = f'<string name="{string_name}">'
-                    if string_pattern in content:
-                        import re
-                        content = re.sub(
-                            f'{string_pattern}.*?</string>',
-                            f'{string_pattern}{string_value}</string>',
-                            content
-                        )
-
-                with open(strings_file, 'w') as f:
-                    f.write(content)
-
-        # Apply layout modifications
-        if modifications['layouts']:
-            layout_files = []
-            layout_dir = os.path.join(decompiled_dir, 'res/layout')
-            if os.path.exists(layout_dir):
-                layout_files = [f for f in os.listdir(layout_dir) if f.endswith('.xml')]
-
-            for layout_file in layout_files:
-                layout_path = os.path.join(layout_dir, layout_file)
-                with open(layout_path, 'r') as f:
-                    content = f.read()
-
-                # Apply text size modifications
-                if 'text_size' in modifications['layouts']:
-                    size_value = modifications['layouts']['text_size']
-                    if size_value == 'large':
-                        content = content.replace('android:textSize="14sp"', 'android:textSize="18sp"')
-                        content = content.replace('android:textSize="16sp"', 'android:textSize="20sp"')
-                    elif size_value == 'small':
-                        content = content.replace('android:textSize="16sp"', 'android:textSize="12sp"')
-                        content = content.replace('android:textSize="18sp"', 'android:textSize="14sp"')
-
-                with open(layout_path, 'w') as f:
-                    f.write(content)
-
-        logging.info(f"GUI modifications applied to project: {project_id}")
-        return True
+        report = {}
+
+        # Apply color and string modifications
+        for rel_path, tag, values in (('res/values/colors.xml', 'color', modifications['colors']),
+                                      ('res/values/strings.xml', 'string', modifications['strings'])):
+            values_file = os.path.join(decompiled_dir, rel_path)
+            if values and os.path.exists(values_file):
+                with file_manager.track_size(project_id, values_file):
+                    changes = rewrite_values(values_file, tag, values)
+                if changes:
+                    report[rel_path] = changes
+
+        # Apply layout modifications in one pass per file, writing only files that change
+        rules = TEXT_SIZE_RULES.get(modifications['layouts'].get('text_size'), [])
+        if rules:
+            paths = layout_paths(decompiled_dir)
+            with file_manager.track_size(project_id, *paths):
+                changed = LayoutRewriter(rules).rewrite_files(paths)
+            for path, changes in changed.items():
+                report[os.path.relpath(path, decompiled_dir).replace(os.sep, '/')] = changes
+
+        # Strings, colors and layouts feed the preview, so keep the resource index in step
+        if report:
+            resource_index = ResourceIndex(decompiled_dir)
+            with file_manager.track_size(project_id, resource_index.index_path):
+                resource_index.update(*report)
+
+        logging.info(f"GUI modifications applied to project {project_id}: "
+                     f"{sum(len(changes) for changes in report.values())} changes in {len(report)} files")
+        return report
 
     except Exception as e:
         logging.error(f"Error applying GUI modifications: {str(e)}")
-        return False
+        return None
 
 @app.errorhandler(413)
 def too_large(e):
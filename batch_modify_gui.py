@@ -0,0 +1,84 @@
+import sys
+import json
+import time
+import argparse
+
+from app import file_manager, job_queue, run_gui_batch
+
+
+def parse_args():
+    """Read the modification spec from a JSON file and/or the command line"""
+    parser = argparse.ArgumentParser(description="Apply one GUI modification to many projects")
+    parser.add_argument('project_ids', nargs='*', help="Projects to modify")
+    parser.add_argument('--all', action='store_true', help="Modify every project")
+    parser.add_argument('--spec', help="JSON file with project_ids, gui_changes, color_scheme and compile")
+    parser.add_argument('--changes', help="GUI change description, e.g. 'bigger text'")
+    parser.add_argument('--color-scheme', help="Color scheme name, e.g. blue")
+    parser.add_argument('--compile', action='store_true', help="Compile the modified projects and wait for them")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    spec = {}
+    if args.spec:
+        with open(args.spec, 'r') as f:
+            spec = json.load(f)
+
+    # Command line values override the spec file
+    if args.project_ids:
+        spec['project_ids'] = args.project_ids
+    if args.all:
+        spec['project_ids'] = [project['id'] for project in file_manager.list_projects()]
+    if args.changes is not None:
+        spec['gui_changes'] = args.changes
+    if args.color_scheme is not None:
+        spec['color_scheme'] = args.color_scheme
+    if args.compile:
+        spec['compile'] = True
+
+    if not spec.get('project_ids'):
+        parser.error("no projects given; pass project IDs, --all or a --spec file")
+    if not spec.get('gui_changes') and not spec.get('color_scheme'):
+        parser.error("give --changes and/or --color-scheme")
+    return spec, args.output
+
+
+def wait_for_job(job_id):
+    """Block until a background job finishes and return its final state"""
+    job = job_queue.get(job_id)
+    last_message = None
+    while job.active:
+        if job.message != last_message:
+            last_message = job.message
+            print(f"[{job.progress:3d}%] {job.message}", file=sys.stderr)
+        time.sleep(1)
+    return job
+
+
+def main():
+    spec, output = parse_args()
+
+    report = run_gui_batch(spec['project_ids'], (spec.get('gui_changes') or '').strip(),
+                           spec.get('color_scheme') or '', compile=bool(spec.get('compile')))
+
+    if report.get('compile_job'):
+        job = wait_for_job(report['compile_job'])
+        report['compile'] = {'state': job.state, 'error': job.error, 'outputs': job.result}
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    summary = report['summary']
+    print(f"{summary['succeeded']}/{summary['projects']} projects modified, "
+          f"{summary['changes']} changes in {summary['files_changed']} files", file=sys.stderr)
+
+    failed = summary['failed'] or summary['not_found'] or report.get('compile_error') \
+        or report.get('compile', {}).get('state') == 'failed'
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,10 +6,20 @@ import zipfile
 import subprocess
 import base64
 import tempfile
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify
 from werkzeug.utils import secure_filename
 import uuid
 from datetime import datetime
+from utils.apk_rebuilder import APKRebuilder, write_file
+from utils.compression_policy import DEFAULT_POLICY
+from utils.build_manifest import BuildManifest
+from utils.job_queue import JobQueue, JobQueueFull
+from utils.blob_store import BlobStore, cached_file_sha256
+from utils.lazy_tree import LazyTree
+from utils.preview_cache import PreviewCache
+from utils.metadata_store import MetadataStore
+from utils.gui_batch import run_batch, ProjectProgress
+from utils.storage_janitor import StorageJanitor, default_categories, conversion_paths, job_paths
 
 # Configure logging
 logging.basicConfig(
@@ -34,12 +44,40 @@ app.config['PROJECTS_FOLDER'] = 'projects'
 app.config['TEMP_FOLDER'] = 'temp'
 app.config['TOOLS_FOLDER'] = 'tools'
 app.config['KEYSTORE_FOLDER'] = os.path.join('tools', 'keystores')
+app.config['BLOBS_FOLDER'] = 'blobs'
+app.config['CACHE_FOLDER'] = 'cache'
+app.config['LAZY_DECOMPILE'] = os.environ.get('LAZY_DECOMPILE', '1') != '0'
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', 4))
+# Let a front-end server (Apache/lighttpd X-Sendfile) stream downloads from disk
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '0') == '1'
 
 # Ensure directories exist
-for folder in [app.config['UPLOAD_FOLDER'], app.config['PROJECTS_FOLDER'], app.config['TEMP_FOLDER'], app.config['TOOLS_FOLDER'], app.config['KEYSTORE_FOLDER']]:
+for folder in [app.config['UPLOAD_FOLDER'], app.config['PROJECTS_FOLDER'], app.config['TEMP_FOLDER'], app.config['TOOLS_FOLDER'], app.config['KEYSTORE_FOLDER'], app.config['BLOBS_FOLDER'], app.config['CACHE_FOLDER']]:
     os.makedirs(folder, exist_ok=True)
     logger.info(f"Directory created/verified: {folder}")
 
+# Background workers for decompile/compile/sign
+job_queue = JobQueue(max_workers=app.config['JOB_WORKERS'])
+
+# Deduplicated storage for uploaded/original APKs
+blob_store = BlobStore(app.config['BLOBS_FOLDER'])
+
+# Locked, atomically written project metadata.json files
+metadata_store = MetadataStore(app.config['PROJECTS_FOLDER'])
+
+# Expire leftovers in uploads/ and temp/, keeping conversion history and files active jobs need
+storage_janitor = StorageJanitor(default_categories(app.config['UPLOAD_FOLDER'], app.config['TEMP_FOLDER']),
+                                 max_bytes=int(os.environ.get('STORAGE_QUOTA_BYTES', 5 * 1024 ** 3)),
+                                 interval=int(os.environ.get('STORAGE_SWEEP_INTERVAL', 3600)),
+                                 protected=[lambda: conversion_paths(app.config['TEMP_FOLDER']),
+                                            lambda: job_paths(job_queue)])
+storage_janitor.start()
+
+# Rendered previews keyed by their inputs
+preview_cache = PreviewCache(os.path.join(app.config['CACHE_FOLDER'], 'previews'),
+                             int(os.environ.get('PREVIEW_CACHE_MAX_BYTES', 256 * 1024 ** 2)))
+
 # Import the APK Signer module (with error handling)
 try:
     from tools.apk_signer import APKSigner
@@ -89,11 +127,8 @@ def list_projects():
         for project_id in os.listdir(projects_folder):
             project_path = os.path.join(projects_folder, project_id)
             if os.path.isdir(project_path):
-                metadata_path = os.path.join(project_path, 'metadata.json')
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
-                    
+                metadata = metadata_store.load(project_id)
+                if metadata is not None:
                     # Add calculated fields
                     metadata['size'] = os.path.getsize(os.path.join(project_path, 'original.apk')) if os.path.exists(os.path.join(project_path, 'original.apk')) else 0
                     metadata['has_compiled'] = os.path.exists(os.path.join(project_path, 'compiled.apk'))
@@ -113,12 +148,9 @@ def get_project(project_id):
     """Get project metadata"""
     try:
         project_path = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
-        metadata_path = os.path.join(project_path, 'metadata.json')
+        metadata = metadata_store.load(project_id)
         
-        if os.path.exists(metadata_path):
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
-            
+        if metadata is not None:
             # Add calculated fields
             metadata['size'] = os.path.getsize(os.path.join(project_path, 'original.apk')) if os.path.exists(os.path.join(project_path, 'original.apk')) else 0
             metadata['has_compiled'] = os.path.exists(os.path.join(project_path, 'compiled.apk'))
@@ -142,9 +174,13 @@ def simple_decompile_apk(apk_path, project_id, project_name):
         decompiled_dir = os.path.join(project_dir, 'decompiled')
         os.makedirs(decompiled_dir, exist_ok=True)
         
-        # Extract APK contents (it's just a ZIP file)
-        with zipfile.ZipFile(apk_path, 'r') as zip_ref:
-            zip_ref.extractall(decompiled_dir)
+        # Extract APK contents (it's just a ZIP file); in lazy mode only what the editor needs,
+        # the rest is read from original.apk on first access and at compile time
+        if app.config['LAZY_DECOMPILE']:
+            LazyTree.create(apk_path, decompiled_dir)
+        else:
+            with zipfile.ZipFile(apk_path, 'r') as zip_ref:
+                zip_ref.extractall(decompiled_dir)
         
         # Create basic structure if it doesn't exist
         for folder in ['res/drawable', 'res/layout', 'res/values']:
@@ -159,22 +195,22 @@ def simple_decompile_apk(apk_path, project_id, project_name):
     <string name="app_name">''' + project_name + '''</string>
 </resources>''')
         
+        # Link original APK into the project through the content-addressed store
+        original_sha256 = blob_store.store(apk_path, os.path.join(project_dir, 'original.apk'))
+        
         # Create project metadata
         metadata = {
             'id': project_id,
             'name': project_name,
             'original_apk': os.path.basename(apk_path),
+            'original_sha256': original_sha256,
+            'lazy': app.config['LAZY_DECOMPILE'],
             'created_at': datetime.now().isoformat(),
             'status': 'decompiled'
         }
         
         # Save metadata
-        metadata_path = os.path.join(project_dir, 'metadata.json')
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        # Copy original APK to project
-        shutil.copy2(apk_path, os.path.join(project_dir, 'original.apk'))
+        metadata_store.save(project_id, metadata)
         
         logger.info(f"APK decompiled successfully: {project_id}")
         return True
@@ -184,13 +220,18 @@ def simple_decompile_apk(apk_path, project_id, project_name):
         # Clean up on failure
         project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
         if os.path.exists(project_dir):
+            blob_store.release(os.path.join(project_dir, 'original.apk'))
             shutil.rmtree(project_dir)
         return False
 
+def get_project_tree(project_id):
+    """Decompiled tree of a project, extracting entries from original.apk on first access"""
+    project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
+    return LazyTree(os.path.join(project_dir, 'decompiled'), os.path.join(project_dir, 'original.apk'))
+
 def get_project_resources(project_id):
     """Get available resources for editing"""
-    project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
-    decompiled_dir = os.path.join(project_dir, 'decompiled')
+    tree = get_project_tree(project_id)
     
     resources = {
         'images': [],
@@ -209,36 +250,33 @@ def get_project_resources(project_id):
             'res/drawable-xxxhdpi'
         ]
         
+        # Sizes come from the archive's central directory for files not extracted yet
         for drawable_dir in drawable_dirs:
-            drawable_path = os.path.join(decompiled_dir, drawable_dir)
-            if os.path.exists(drawable_path):
-                for file in os.listdir(drawable_path):
-                    if file.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                        resources['images'].append({
-                            'name': file,
-                            'path': os.path.join(drawable_dir, file),
-                            'size': os.path.getsize(os.path.join(drawable_path, file))
-                        })
+            for file, size in tree.list_dir(drawable_dir):
+                if file.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
+                    resources['images'].append({
+                        'name': file,
+                        'path': os.path.join(drawable_dir, file),
+                        'size': size
+                    })
         
         # Get string resources
-        strings_path = os.path.join(decompiled_dir, 'res/values/strings.xml')
-        if os.path.exists(strings_path):
-            resources['strings'].append({
-                'name': 'strings.xml',
-                'path': 'res/values/strings.xml',
-                'size': os.path.getsize(strings_path)
-            })
+        for file, size in tree.list_dir('res/values'):
+            if file == 'strings.xml':
+                resources['strings'].append({
+                    'name': 'strings.xml',
+                    'path': 'res/values/strings.xml',
+                    'size': size
+                })
         
         # Get layout resources
-        layout_path = os.path.join(decompiled_dir, 'res/layout')
-        if os.path.exists(layout_path):
-            for file in os.listdir(layout_path):
-                if file.endswith('.xml'):
-                    resources['layouts'].append({
-                        'name': file,
-                        'path': os.path.join('res/layout', file),
-                        'size': os.path.getsize(os.path.join(layout_path, file))
-                    })
+        for file, size in tree.list_dir('res/layout'):
+            if file.endswith('.xml'):
+                resources['layouts'].append({
+                    'name': file,
+                    'path': os.path.join('res/layout', file),
+                    'size': size
+                })
         
     except Exception as e:
         logger.error(f"Error getting resources: {str(e)}")
@@ -309,110 +347,152 @@ def upload_apk():
             os.remove(upload_path)
             return redirect(url_for('index'))
 
-        # Decompile APK using simple method (no APKTool dependency)
+        # Decompile APK using simple method (no APKTool dependency) in the background
         project_name = request.form.get('project_name', filename.replace('.apk', ''))
-        logger.info(f"Decompiling APK with project name: {project_name}")
-        success = simple_decompile_apk(upload_path, project_id, project_name)
+        logger.info(f"Queueing decompile with project name: {project_name}")
+        job = job_queue.submit('decompile', decompile_project, upload_path, project_id, project_name,
+                               project_id=project_id,
+                               next_url=url_for('project_view', project_id=project_id))
 
-        if success:
-            logger.info(f"APK decompiled successfully: {project_id}")
-            flash(f'APK "{filename}" uploaded and decompiled successfully!', 'success')
-            return redirect(url_for('project_view', project_id=project_id))
-        else:
-            logger.error(f"Failed to decompile APK: {filename}")
-            flash('Failed to decompile APK. Please check if it\'s a valid APK file.', 'error')
-            return redirect(url_for('index'))
+        flash(f'APK "{filename}" uploaded, decompiling in the background...', 'success')
+        return redirect(url_for('index', job=job.id))
 
+    except JobQueueFull as e:
+        logger.warning(f"Upload rejected: {str(e)}")
+        flash(str(e), 'error')
+        return redirect(url_for('index'))
     except Exception as e:
         logger.error(f"Upload error: {str(e)}", exc_info=True)
         flash(f'Upload failed: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+def decompile_project(job, upload_path, project_id, project_name):
+    """Background job: decompile an uploaded APK into a new project"""
+    job.update(10, f"Decompiling {os.path.basename(upload_path)}")
+    if not simple_decompile_apk(upload_path, project_id, project_name):
+        raise RuntimeError("Failed to decompile APK. Please check if it's a valid APK file.")
+    
+    # The project now holds the APK through the blob store
+    os.remove(upload_path)
+    job.update(100, 'APK decompiled successfully')
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report progress of a background job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 def generate_app_preview(project_id):
     """Generate a simple app preview"""
     try:
-        project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
-        decompiled_dir = os.path.join(project_dir, 'decompiled')
-        
-        # Get project metadata
-        project = get_project(project_id)
-        if not project:
+        preview_path = get_app_preview_path(project_id)
+        if not preview_path:
             return None
-            
-        # Import AI helper
-        try:
-            # Make sure utils directory exists
-            os.makedirs('utils', exist_ok=True)
-            
-            # Check if ai_helper.py exists, if not, we'll use the fallback
-            if not os.path.exists(os.path.join('utils', 'ai_helper.py')):
-                raise ImportError("AI Helper module not found")
-                
-            from utils.ai_helper import AIHelper
-            ai_helper = AIHelper(app.config['TEMP_FOLDER'])
-            
-            # Get color scheme from project metadata
-            color_scheme = project.get('color_scheme', 'blue')
-            
-            # Generate preview
-            preview_info = ai_helper.generate_app_preview(
-                project_name=project['name'],
-                color_scheme=color_scheme,
-                gui_changes=project.get('last_gui_changes', '')
-            )
-            
-            if preview_info:
-                return {
-                    'app_name': project['name'],
-                    'icon_base64': None,  # We don't extract the icon in this simplified version
-                    'layout_base64': preview_info['preview_base64']
-                }
-                
-        except ImportError as e:
-            logger.warning(f"AI Helper module not available: {str(e)}, using fallback preview")
-        except Exception as e:
-            logger.warning(f"Error using AI Helper: {str(e)}, using fallback preview")
-            
-        # Fallback to simple preview generation
-        from PIL import Image, ImageDraw, ImageFont
-        import io
-        import base64
-        
-        # Create a simple layout preview image
-        img = Image.new('RGB', (300, 500), color=(30, 30, 30))
-        draw = ImageDraw.Draw(img)
-        
-        # Add a simple representation of the layout
-        draw.rectangle([(10, 10), (290, 50)], fill=(50, 50, 50))
-        
-        # Try to use a font, fall back to default if not available
-        try:
-            font = ImageFont.truetype("arial.ttf", 20)
-        except IOError:
-            font = ImageFont.load_default()
-            
-        # Add app name
-        draw.text((150, 30), project['name'], fill=(200, 200, 200), anchor="mm")
-        
-        # Add some placeholder elements
-        draw.rectangle([(10, 60), (290, 120)], fill=(40, 40, 40))
-        draw.rectangle([(10, 130), (290, 190)], fill=(40, 40, 40))
-        draw.rectangle([(10, 200), (290, 260)], fill=(40, 40, 40))
-        
-        # Convert to base64
-        buffered = io.BytesIO()
-        img.save(buffered, format="PNG")
-        layout_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
         
+        # The image loads from a versioned URL so browsers can cache it
         return {
-            'app_name': project['name'],
-            'icon_base64': None,
-            'layout_base64': layout_base64
+            'app_name': get_project(project_id)['name'],
+            'icon_url': None,  # We don't extract the icon in this simplified version
+            'layout_url': url_for('preview_image', project_id=project_id, kind='layout',
+                                  v=preview_cache.etag(preview_path))
         }
     except Exception as e:
         logger.error(f"Error generating app preview: {str(e)}")
         return None
 
+def get_app_preview_path(project_id):
+    """Return the cached preview image for a project, rendering it if its inputs changed"""
+    # Get project metadata
+    project = get_project(project_id)
+    if not project:
+        return None
+    
+    # Get color scheme from project metadata
+    color_scheme = project.get('color_scheme', 'blue')
+    gui_changes = project.get('last_gui_changes', '')
+    
+    # Page views reuse the cached image until the name, colors or GUI changes differ
+    key = preview_cache.make_key('app_preview', project['name'], color_scheme, gui_changes)
+    return preview_cache.render(
+        key, lambda path: render_app_preview(path, project['name'], color_scheme, gui_changes))
+
+@app.route('/preview/<project_id>/<kind>')
+def preview_image(project_id, kind):
+    """Serve a project's preview image with a strong ETag"""
+    try:
+        preview_path = get_app_preview_path(project_id) if kind == 'layout' else None
+        if not preview_path:
+            return jsonify({'error': 'Preview not found'}), 404
+        
+        # A URL carrying the current version never changes, anything else revalidates
+        etag = preview_cache.etag(preview_path)
+        max_age = 365 * 24 * 3600 if request.args.get('v') == etag else 0
+        response = send_file(preview_path, mimetype='image/png', etag=etag, conditional=True, max_age=max_age)
+        if max_age:
+            response.cache_control.immutable = True
+        return response
+    except Exception as e:
+        logger.error(f"Preview image error: {str(e)}")
+        return jsonify({'error': 'Preview not found'}), 404
+
+def render_app_preview(preview_path, project_name, color_scheme, gui_changes):
+    """Draw an app preview PNG to preview_path"""
+    # Import AI helper
+    try:
+        # Make sure utils directory exists
+        os.makedirs('utils', exist_ok=True)
+        
+        # Check if ai_helper.py exists, if not, we'll use the fallback
+        if not os.path.exists(os.path.join('utils', 'ai_helper.py')):
+            raise ImportError("AI Helper module not found")
+            
+        from utils.ai_helper import AIHelper
+        ai_helper = AIHelper(app.config['TEMP_FOLDER'])
+        
+        # Generate preview
+        preview_info = ai_helper.generate_app_preview(
+            project_name=project_name,
+            color_scheme=color_scheme,
+            gui_changes=gui_changes
+        )
+        
+        if preview_info:
+            os.replace(preview_info['preview_path'], preview_path)
+            return
+            
+    except ImportError as e:
+        logger.warning(f"AI Helper module not available: {str(e)}, using fallback preview")
+    except Exception as e:
+        logger.warning(f"Error using AI Helper: {str(e)}, using fallback preview")
+        
+    # Fallback to simple preview generation
+    from PIL import Image, ImageDraw, ImageFont
+    
+    # Create a simple layout preview image
+    img = Image.new('RGB', (300, 500), color=(30, 30, 30))
+    draw = ImageDraw.Draw(img)
+    
+    # Add a simple representation of the layout
+    draw.rectangle([(10, 10), (290, 50)], fill=(50, 50, 50))
+    
+    # Try to use a font, fall back to default if not available
+    try:
+        font = ImageFont.truetype("arial.ttf", 20)
+    except IOError:
+        font = ImageFont.load_default()
+        
+    # Add app name
+    draw.text((150, 30), project_name, fill=(200, 200, 200), anchor="mm")
+    
+    # Add some placeholder elements
+    draw.rectangle([(10, 60), (290, 120)], fill=(40, 40, 40))
+    draw.rectangle([(10, 130), (290, 190)], fill=(40, 40, 40))
+    draw.rectangle([(10, 200), (290, 260)], fill=(40, 40, 40))
+    
+    img.save(preview_path, format='PNG')
+
 @app.route('/project/<project_id>')
 def project_view(project_id):
     """View project details and resources"""
@@ -451,12 +531,13 @@ def edit_resource(project_id, resource_type, resource_path):
             flash('Project not found', 'error')
             return redirect(url_for('index'))
 
-        # Get resource content
-        decompiled_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id, 'decompiled')
-        full_path = os.path.join(decompiled_dir, resource_path)
+        # Get resource content, extracting it from the original APK on first access
+        full_path = get_project_tree(project_id).materialize(resource_path)
         
         resource_content = None
-        if resource_type in ['string', 'layout']:
+        if full_path is None:
+            flash('Invalid resource path', 'error')
+        elif resource_type in ['string', 'layout']:
             if os.path.exists(full_path):
                 with open(full_path, 'r', encoding='utf-8') as f:
                     resource_content = f.read()
@@ -484,9 +565,11 @@ def save_resource(project_id, resource_type, resource_path):
             flash('Project not found', 'error')
             return redirect(url_for('index'))
             
-        decompiled_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id, 'decompiled')
-        full_path = os.path.join(decompiled_dir, resource_path)
-        
+        full_path = get_project_tree(project_id).path(resource_path)
+        if full_path is None:
+            logger.warning(f"Rejected resource path outside project {project_id}: {resource_path}")
+            return 'Invalid resource path', 400
+
         if resource_type == 'image':
             # Handle image upload
             if 'image_file' in request.files:
@@ -532,165 +615,145 @@ def compile_apk(project_id):
             flash('Project not found', 'error')
             return redirect(url_for('index'))
 
-        # Simple compilation - create a ZIP file with APK extension
+        # Skip the build entirely when nothing changed since the last successful compile
         project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
-        decompiled_dir = os.path.join(project_dir, 'decompiled')
-        output_path = os.path.join(project_dir, 'compiled.apk')
+        build_manifest = BuildManifest(project_dir)
+        previous_build = build_manifest.load()
+        if build_manifest.is_current(previous_build, build_manifest.scan(previous_build), ['compiled.apk', 'signed.apk']):
+            logger.info(f"No changes since last compile, reusing cached APK: {project_id}")
+            flash('No changes since the last compile, using the cached APK.', 'success')
+            return redirect(url_for('download_apk', project_id=project_id))
+
+        job = job_queue.submit('compile', compile_project, project_id,
+                               project_id=project_id,
+                               next_url=url_for('download_apk', project_id=project_id))
+        flash('Compiling APK in the background...', 'success')
+        return redirect(url_for('project_view', project_id=project_id, job=job.id))
+
+    except JobQueueFull as e:
+        flash(str(e), 'error')
+        return redirect(url_for('project_view', project_id=project_id))
+    except Exception as e:
+        logger.error(f"Compile error: {str(e)}", exc_info=True)
+        flash(f'Compile failed: {str(e)}', 'error')
+        return redirect(url_for('project_view', project_id=project_id))
+
+def compile_project(job, project_id):
+    """Background job: rebuild, fix and sign a project's APK"""
+    # A batch compile and a single compile of the same project must not build over each other
+    with job_queue.project_lock(project_id):
+        return build_project(job, project_id)
+
+def build_project(job, project_id):
+    """Rebuild, fix and sign a project's APK; callers hold the project's lock"""
+    # Simple compilation - create a ZIP file with APK extension
+    project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
+    decompiled_dir = os.path.join(project_dir, 'decompiled')
+    output_path = os.path.join(project_dir, 'compiled.apk')
+    
+    job.update(5, 'Scanning decompiled files')
+    build_manifest = BuildManifest(project_dir)
+    previous_build = build_manifest.load()
+    tree_state = build_manifest.scan(previous_build)
+    changed_files = build_manifest.changed_files(previous_build, tree_state)
+    logger.info(f"{len(changed_files)} files changed since last compile")
+    build_succeeded = False
+    
+    # Check if original APK exists to use as a base
+    job.update(20, 'Building APK')
+    original_apk = os.path.join(project_dir, 'original.apk')
+    if os.path.exists(original_apk):
+        logger.info(f"Using original APK as base for compilation")
         
-        # Check if original APK exists to use as a base
-        original_apk = os.path.join(project_dir, 'original.apk')
-        if os.path.exists(original_apk):
-            logger.info(f"Using original APK as base for compilation")
-            
-            # Create a temporary directory for merging
-            temp_dir = os.path.join(app.config['TEMP_FOLDER'], f"compile_{project_id}")
-            os.makedirs(temp_dir, exist_ok=True)
+        try:
+            # Stream the original APK, recompressing only files edited since the last build
+            APKRebuilder().rebuild(original_apk, decompiled_dir, output_path,
+                                   file_index=tree_state, previous_apk=output_path)
+            build_succeeded = True
+            logger.info(f"Created APK with proper structure: {output_path}")
+        except Exception as e:
+            # Shipping the unedited original instead would hide the failure, so fail the job
+            logger.error(f"Error creating APK with proper structure: {str(e)}")
+            raise RuntimeError(f"Failed to rebuild APK: {str(e)}")
+    else:
+        # Fallback to simple ZIP creation if original APK is not available
+        logger.warning(f"Original APK not found, creating simple ZIP with APK extension")
+        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # First add AndroidManifest.xml if it exists
+            manifest_path = os.path.join(decompiled_dir, "AndroidManifest.xml")
+            if os.path.exists(manifest_path):
+                write_file(zipf, manifest_path, "AndroidManifest.xml")
             
-            try:
-                # Extract original APK to temp directory
-                with zipfile.ZipFile(original_apk, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
-                
-                # Copy modified files from decompiled directory to temp directory
-                for root, dirs, files in os.walk(decompiled_dir):
-                    for file in files:
-                        src_path = os.path.join(root, file)
-                        rel_path = os.path.relpath(src_path, decompiled_dir)
-                        dst_path = os.path.join(temp_dir, rel_path)
-                        
-                        # Ensure directory exists
-                        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                        
-                        # Copy file
-                        shutil.copy2(src_path, dst_path)
-                
-                # Create new APK from temp directory with proper structure
-                with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    # First add AndroidManifest.xml
-                    manifest_path = os.path.join(temp_dir, "AndroidManifest.xml")
-                    if os.path.exists(manifest_path):
-                        zipf.write(manifest_path, "AndroidManifest.xml")
-                    
-                    # Then add classes.dex files
-                    for dex_file in ["classes.dex", "classes2.dex", "classes3.dex"]:
-                        dex_path = os.path.join(temp_dir, dex_file)
-                        if os.path.exists(dex_path):
-                            zipf.write(dex_path, dex_file)
+            # Add all other files
+            for root, dirs, files in os.walk(decompiled_dir):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    arcname = os.path.relpath(file_path, decompiled_dir).replace(os.sep, '/')
                     
-                    # Then add resources.arsc
-                    resources_path = os.path.join(temp_dir, "resources.arsc")
-                    if os.path.exists(resources_path):
-                        zipf.write(resources_path, "resources.arsc")
+                    # Skip AndroidManifest.xml as we've already added it
+                    if arcname == "AndroidManifest.xml":
+                        continue
                     
-                    # Add all other files
-                    for root, dirs, files in os.walk(temp_dir):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, temp_dir)
-                            
-                            # Skip files we've already added
-                            if arcname in ["AndroidManifest.xml", "classes.dex", "classes2.dex", "classes3.dex", "resources.arsc"]:
-                                continue
-                            
-                            zipf.write(file_path, arcname)
-                
-                logger.info(f"Created APK with proper structure: {output_path}")
-            except Exception as e:
-                logger.error(f"Error creating APK with proper structure: {str(e)}")
-                # Fall back to copying the original APK
-                shutil.copy2(original_apk, output_path)
-                logger.info(f"Copied original APK as fallback: {output_path}")
-            finally:
-                # Clean up temp directory
-                shutil.rmtree(temp_dir)
-        else:
-            # Fallback to simple ZIP creation if original APK is not available
-            logger.warning(f"Original APK not found, creating simple ZIP with APK extension")
-            with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # First add AndroidManifest.xml if it exists
-                manifest_path = os.path.join(decompiled_dir, "AndroidManifest.xml")
-                if os.path.exists(manifest_path):
-                    zipf.write(manifest_path, "AndroidManifest.xml")
-                
-                # Add all other files
-                for root, dirs, files in os.walk(decompiled_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, decompiled_dir)
-                        
-                        # Skip AndroidManifest.xml as we've already added it
-                        if arcname == "AndroidManifest.xml":
-                            continue
-                        
-                        zipf.write(file_path, arcname)
+                    # Media and resources.arsc are stored and 4-byte aligned
+                    write_file(zipf, file_path, arcname, DEFAULT_POLICY.compress_type(arcname),
+                               DEFAULT_POLICY.alignment)
+        build_succeeded = True
+    
+    # Fix and sign the APK to make it installable
+    job.update(60, 'Fixing and signing APK')
+    signed_path = os.path.join(project_dir, 'signed.apk')
+    
+    try:
+        # Try to use the APK fixer
+        from tools.apk_fixer import APKFixer
+        fixer = APKFixer(app.config['TEMP_FOLDER'])
         
-        # Fix and sign the APK to make it installable
-        signed_path = os.path.join(project_dir, 'signed.apk')
+        # Fix and sign the APK
+        success, result = fixer.fix_apk(output_path, signed_path)
         
-        try:
-            # Try to use the APK fixer
-            from tools.apk_fixer import APKFixer
-            fixer = APKFixer(app.config['TEMP_FOLDER'])
-            
-            # Fix and sign the APK
-            success, result = fixer.fix_apk(output_path, signed_path)
-            
-            if success:
-                logger.info(f"APK fixed and signed: {signed_path}")
-                # Update project metadata to reflect signing
-                metadata_path = os.path.join(project_dir, 'metadata.json')
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
-                    
-                    # Update fields
-                    metadata.update({
-                        'status': 'signed',
-                        'signed_at': datetime.now().isoformat()
-                    })
-                    
-                    # Save updated metadata
-                    with open(metadata_path, 'w') as f:
-                        json.dump(metadata, f, indent=2)
-            else:
-                logger.warning(f"Failed to fix and sign APK: {result}")
-                # Just copy the compiled APK as signed.apk
-                shutil.copy2(output_path, signed_path)
-        except Exception as e:
-            logger.warning(f"Error fixing and signing APK: {str(e)}")
+        if success:
+            logger.info(f"APK fixed and signed: {signed_path}")
+            # Update project metadata to reflect signing
+            metadata_store.update(project_id, {
+                'status': 'signed',
+                'signed_at': datetime.now().isoformat()
+            })
+        else:
+            logger.warning(f"Failed to fix and sign APK: {result}")
             # Just copy the compiled APK as signed.apk
             shutil.copy2(output_path, signed_path)
-        
-        # Create a special version for direct installation
-        installable_path = os.path.join(project_dir, 'installable.apk')
-        try:
-            # Just copy the original APK as the installable version
-            # This ensures we have a valid APK structure
-            if os.path.exists(original_apk):
-                shutil.copy2(original_apk, installable_path)
-                logger.info(f"Created installable APK from original: {installable_path}")
-            else:
-                # If no original APK, use the signed one
-                shutil.copy2(signed_path, installable_path)
-                logger.info(f"Created installable APK from signed: {installable_path}")
-        except Exception as e:
-            logger.warning(f"Error creating installable APK: {str(e)}")
-        
-        # Verify the APK was created
-        if os.path.exists(output_path):
-            file_size = os.path.getsize(output_path)
-            logger.info(f"Compiled APK created successfully: {output_path} ({file_size} bytes)")
-            flash('APK compiled and signed successfully! You can now download and install it.', 'success')
+    except Exception as e:
+        logger.warning(f"Error fixing and signing APK: {str(e)}")
+        # Just copy the compiled APK as signed.apk
+        shutil.copy2(output_path, signed_path)
+    
+    # Create a special version for direct installation
+    job.update(85, 'Creating installable APK')
+    installable_path = os.path.join(project_dir, 'installable.apk')
+    try:
+        # Just copy the original APK as the installable version
+        # This ensures we have a valid APK structure
+        if os.path.exists(original_apk):
+            shutil.copy2(original_apk, installable_path)
+            logger.info(f"Created installable APK from original: {installable_path}")
         else:
-            logger.error(f"Failed to create compiled APK: {output_path}")
-            flash('Failed to compile APK', 'error')
-            
-        return redirect(url_for('download_apk', project_id=project_id))
-
+            # If no original APK, use the signed one
+            shutil.copy2(signed_path, installable_path)
+            logger.info(f"Created installable APK from signed: {installable_path}")
     except Exception as e:
-        logger.error(f"Compile error: {str(e)}", exc_info=True)
-        flash(f'Compile failed: {str(e)}', 'error')
-        return redirect(url_for('project_view', project_id=project_id))
+        logger.warning(f"Error creating installable APK: {str(e)}")
+    
+    # Verify the APK was created
+    if not os.path.exists(output_path):
+        logger.error(f"Failed to create compiled APK: {output_path}")
+        raise RuntimeError('Failed to compile APK')
+    
+    if build_succeeded:
+        build_manifest.save(tree_state)
+    file_size = os.path.getsize(output_path)
+    logger.info(f"Compiled APK created successfully: {output_path} ({file_size} bytes)")
+    job.update(100, 'APK compiled and signed successfully! You can now download and install it.')
+    return output_path
 
 @app.route('/download/<project_id>')
 def download_apk(project_id):
@@ -717,74 +780,51 @@ def download_apk(project_id):
         # Determine which file to use
         if os.path.exists(installable_path):
             source_path = installable_path
-            file_type = "installable"
         elif os.path.exists(signed_path):
             source_path = signed_path
-            file_type = "signed"
         elif os.path.exists(compiled_path):
             source_path = compiled_path
-            file_type = "compiled"
         else:
             flash('Compiled APK not found. Please compile first.', 'error')
             return redirect(url_for('project_view', project_id=project_id))
         
-        # If APK+ format is requested, create a special version
+        # APK+ downloads are the original APK under a .apk+ name, so it is served in place
+        # instead of being copied per request
         if format_type.lower() == 'apk+':
-            try:
-                # For APK+ format, we'll create a copy of the original APK
-                # but rename it with .apk+ extension
-                apk_plus_path = os.path.join(project_dir, f"{file_type}.apk+")
-                
-                # Use the original APK as the base (most reliable)
-                original_apk = os.path.join(project_dir, 'original.apk')
-                if os.path.exists(original_apk):
-                    # Simply copy the original APK with .apk+ extension
-                    shutil.copy2(original_apk, apk_plus_path)
-                    logger.info(f"Created APK+ from original APK: {apk_plus_path}")
-                else:
-                    # If original APK doesn't exist, use the source path
-                    shutil.copy2(source_path, apk_plus_path)
-                    logger.info(f"Created APK+ from {file_type} APK: {apk_plus_path}")
-                
-                # Return the file with .apk+ extension
-                # Note: This won't be directly installable on Android, but can be used with APK+ tools
-                return send_file(apk_plus_path, 
-                            as_attachment=True, 
-                            download_name=f"{project['name']}.apk+",
-                            mimetype='application/octet-stream')
-            except Exception as e:
-                logger.error(f"Error creating APK+ format: {str(e)}")
-                # Fall back to standard APK
-                flash('Error creating APK+ format, downloading standard APK instead.', 'warning')
-            except Exception as e:
-                logger.error(f"Error creating APK+ format: {str(e)}")
-                # Fall back to standard APK
-                flash('Error creating APK+ format, downloading standard APK instead.', 'warning')
-            except ImportError:
-                logger.warning("APK+ handler not available")
-                flash('APK+ format not supported, downloading standard APK instead.', 'warning')
-            except Exception as e:
-                logger.error(f"Error converting to APK+ format: {str(e)}")
-                flash('Error creating APK+ format, downloading standard APK instead.', 'warning')
+            original_apk = os.path.join(project_dir, 'original.apk')
+            apk_plus_source = original_apk if os.path.exists(original_apk) else source_path
+            # Note: This won't be directly installable on Android, but can be used with APK+ tools
+            return send_download(apk_plus_source, f"{project['name']}.apk+", 'application/octet-stream')
         
         # Return the standard APK
-        return send_file(source_path, 
-                    as_attachment=True, 
-                    download_name=f"{project['name']}_modified.apk",
-                    mimetype='application/vnd.android.package-archive')
+        return send_download(source_path, f"{project['name']}_modified.apk",
+                             'application/vnd.android.package-archive')
 
     except Exception as e:
         logger.error(f"Download error: {str(e)}", exc_info=True)
         flash(f'Download failed: {str(e)}', 'error')
         return redirect(url_for('project_view', project_id=project_id))
 
+def send_download(path, download_name, mimetype):
+    """Send a file with a content-hash ETag and Range/If-Range support so interrupted downloads resume"""
+    return send_file(path,
+                     as_attachment=True,
+                     download_name=download_name,
+                     mimetype=mimetype,
+                     etag=cached_file_sha256(path),
+                     conditional=True,
+                     max_age=0)
+
 @app.route('/delete/<project_id>')
 def delete_project(project_id):
     """Delete project"""
     try:
         project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
         if os.path.exists(project_dir):
+            # original.apk is a link into the blob store, drop its reference first
+            blob_store.release(os.path.join(project_dir, 'original.apk'))
             shutil.rmtree(project_dir)
+            metadata_store.forget(project_id)
             flash('Project deleted successfully!', 'success')
         else:
             flash('Project not found', 'error')
@@ -853,23 +893,12 @@ def modify_gui(project_id):
             flash(f'AI processing error: {str(e)}', 'warning')
         
         # Update project metadata to record the changes
-        metadata_path = os.path.join(project_dir, 'metadata.json')
-        
-        if os.path.exists(metadata_path):
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
-            
-            # Update fields
-            metadata.update({
-                'last_gui_changes': gui_changes,
-                'color_scheme': color_scheme,
-                'status': 'modified',
-                'updated_at': datetime.now().isoformat()
-            })
-            
-            # Save updated metadata
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+        metadata_store.update(project_id, {
+            'last_gui_changes': gui_changes,
+            'color_scheme': color_scheme,
+            'status': 'modified',
+            'updated_at': datetime.now().isoformat()
+        })
 
         flash('GUI modifications applied successfully!', 'success')
         return redirect(url_for('project_view', project_id=project_id))
@@ -879,6 +908,78 @@ def modify_gui(project_id):
         flash(f'Modification failed: {str(e)}', 'error')
         return redirect(url_for('project_view', project_id=project_id))
 
+@app.route('/batch_modify_gui', methods=['POST'])
+def batch_modify_gui():
+    """Apply one GUI modification spec to many projects and return a per-project report"""
+    spec = request.get_json(silent=True) or {}
+    project_ids = spec.get('project_ids') or []
+    gui_changes = (spec.get('gui_changes') or '').strip()
+    color_scheme = spec.get('color_scheme') or ''
+
+    if not isinstance(project_ids, list) or not project_ids:
+        return jsonify({'error': 'project_ids must be a non-empty list'}), 400
+    if not gui_changes and not color_scheme:
+        return jsonify({'error': 'Provide gui_changes and/or color_scheme'}), 400
+
+    try:
+        from utils.ai_helper import AIHelper
+    except ImportError as e:
+        return jsonify({'error': f'AI helper not available: {str(e)}'}), 503
+
+    # Parsed once for the whole batch
+    ai_helper = AIHelper(app.config['TEMP_FOLDER'])
+    changes = ai_helper.analyze_gui_changes(gui_changes) if gui_changes else None
+
+    def apply_project(project_id):
+        if not get_project(project_id):
+            return {'status': 'not_found'}
+        project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
+        result = ai_helper.apply_gui_changes(project_id, project_dir, gui_changes, color_scheme, changes=changes)
+        if result.get('error'):
+            return {'status': 'failed', 'error': result['error']}
+
+        metadata_store.update(project_id, {
+            'last_gui_changes': gui_changes,
+            'color_scheme': color_scheme,
+            'status': 'modified',
+            'updated_at': datetime.now().isoformat()
+        })
+        decompiled_dir = os.path.join(project_dir, 'decompiled')
+        return {'status': 'ok',
+                'changes': {os.path.relpath(path, decompiled_dir).replace(os.sep, '/'): file_changes
+                            for path, file_changes in result.get('changes', {}).items()}}
+
+    report = run_batch(project_ids, apply_project, max_workers=app.config['BATCH_WORKERS'])
+    report['analysis'] = changes
+
+    if spec.get('compile'):
+        succeeded = [project_id for project_id, result in report['projects'].items() if result['status'] == 'ok']
+        if succeeded:
+            # One job for the whole batch, so dozens of projects never overflow the job queue
+            try:
+                job = job_queue.submit('batch_compile', compile_projects, *succeeded)
+                report['compile_job'] = job.id
+            except JobQueueFull as e:
+                report['compile_error'] = str(e)
+
+    return jsonify(report)
+
+def compile_projects(job, *project_ids):
+    """Background job: compile several projects one after another"""
+    outputs = {}
+    for index, project_id in enumerate(project_ids):
+        try:
+            outputs[project_id] = compile_project(ProjectProgress(job, project_id, index, len(project_ids)),
+                                                  project_id)
+        except Exception as e:
+            logger.error(f"Batch compile failed for {project_id}: {str(e)}")
+            outputs[project_id] = None
+
+    failed = [project_id for project_id, output in outputs.items() if not output]
+    if failed:
+        raise RuntimeError(f"Failed to compile {len(failed)} of {len(project_ids)} projects: {', '.join(failed)}")
+    return outputs
+
 @app.route('/favicon.ico')
 def favicon():
     """Serve favicon to prevent 404 errors"""
@@ -982,34 +1083,26 @@ def sign_apk(project_id):
         # Check if compiled APK exists
         project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
         compiled_path = os.path.join(project_dir, 'compiled.apk')
-        signed_path = os.path.join(project_dir, 'signed.apk')
         
         if not os.path.exists(compiled_path):
             flash('Compiled APK not found. Please compile first.', 'error')
             return redirect(url_for('sign_apk_page', project_id=project_id))
         
-        # Initialize APK signer
+        # Use debug keystore if "debug" is selected
+        if keystore == 'debug':
+            keystore = None  # APKSigner will use debug keystore
+            alias = None
+            password = None
+        
+        # Sign the APK in the background
         try:
-            signer = APKSigner(app.config['TOOLS_FOLDER'])
-            
-            # Use debug keystore if "debug" is selected
-            if keystore == 'debug':
-                keystore = None  # APKSigner will use debug keystore
-                alias = None
-                password = None
-            
-            # Sign the APK
-            success, result = signer.sign_apk(compiled_path, signed_path, keystore, alias, password)
-            
-            if success:
-                flash('APK signed successfully!', 'success')
-                return redirect(url_for('download_apk', project_id=project_id))
-            else:
-                flash(f'Failed to sign APK: {result}', 'error')
-                return redirect(url_for('sign_apk_page', project_id=project_id))
-        except Exception as e:
-            logger.error(f"Error signing APK: {str(e)}")
-            flash(f"Error signing APK: {str(e)}", "error")
+            job = job_queue.submit('sign', sign_project, project_id, keystore, alias, password,
+                                   project_id=project_id,
+                                   next_url=url_for('download_apk', project_id=project_id))
+            flash('Signing APK in the background...', 'success')
+            return redirect(url_for('project_view', project_id=project_id, job=job.id))
+        except JobQueueFull as e:
+            flash(str(e), 'error')
             return redirect(url_for('sign_apk_page', project_id=project_id))
         
     except Exception as e:
@@ -1017,6 +1110,21 @@ def sign_apk(project_id):
         flash(f"An error occurred: {str(e)}", "error")
         return redirect(url_for('sign_apk_page', project_id=project_id))
 
+def sign_project(job, project_id, keystore, alias, password):
+    """Background job: sign a compiled APK with the selected keystore"""
+    project_dir = os.path.join(app.config['PROJECTS_FOLDER'], project_id)
+    compiled_path = os.path.join(project_dir, 'compiled.apk')
+    signed_path = os.path.join(project_dir, 'signed.apk')
+    
+    job.update(10, 'Signing APK')
+    signer = APKSigner(app.config['TOOLS_FOLDER'])
+    success, result = signer.sign_apk(compiled_path, signed_path, keystore, alias, password)
+    if not success:
+        raise RuntimeError(f'Failed to sign APK: {result}')
+    
+    job.update(100, 'APK signed successfully!')
+    return signed_path
+
 @app.route('/create_keystore/<project_id>', methods=['POST'])
 def create_keystore(project_id):
     """Create a new keystore"""
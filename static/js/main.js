@@ -12,6 +12,8 @@ const APKEditor = {
         this.initFormValidation();
         this.initAlerts();
         this.initGUIModification();
+        this.initJobPolling();
+        this.initChunkedUpload();
     },
 
     initFileUpload: function () {
@@ -72,6 +74,140 @@ const APKEditor = {
                 }
             });
         }
+    },
+
+    initJobPolling: function () {
+        const jobStatus = document.getElementById('job-status');
+        if (!jobStatus) {
+            return;
+        }
+
+        const jobId = jobStatus.dataset.jobId;
+        const message = document.getElementById('job-message');
+        const progress = document.getElementById('job-progress');
+        const log = document.getElementById('job-log');
+
+        const poll = function () {
+            fetch('/jobs/' + encodeURIComponent(jobId))
+                .then(response => response.json())
+                .then(job => {
+                    if (job.error && !job.state) {
+                        message.textContent = job.error;
+                        return;
+                    }
+
+                    message.textContent = job.message;
+                    progress.style.width = job.progress + '%';
+                    progress.textContent = job.progress + '%';
+                    log.textContent = (job.log || []).join('\n');
+
+                    if (job.state === 'done') {
+                        progress.classList.remove('progress-bar-animated');
+                        if (job.next_url) {
+                            window.location.href = job.next_url;
+                        }
+                    } else if (job.state === 'failed') {
+                        progress.classList.remove('progress-bar-animated');
+                        progress.classList.add('bg-danger');
+                        message.textContent = 'Failed: ' + job.error;
+                    } else {
+                        setTimeout(poll, 1000);
+                    }
+                })
+                .catch(() => setTimeout(poll, 3000));
+        };
+
+        poll();
+    },
+
+    initChunkedUpload: function () {
+        const form = document.getElementById('upload-form');
+        if (!form || form.dataset.chunkedUpload !== 'true' || !window.fetch) {
+            return;
+        }
+
+        const chunkSize = parseInt(form.dataset.chunkSize, 10) || 8 * 1024 * 1024;
+        const progress = document.getElementById('upload-progress');
+        const bar = progress ? progress.querySelector('.progress-bar') : null;
+
+        const showProgress = function (sent, total) {
+            if (!bar) {
+                return;
+            }
+            const percent = total ? Math.floor(sent * 100 / total) : 0;
+            progress.classList.remove('d-none');
+            bar.style.width = percent + '%';
+            bar.textContent = percent + '%';
+        };
+
+        const readJson = function (response) {
+            return response.json().then(data => {
+                if (!response.ok) {
+                    const error = new Error(data.error || 'Upload failed');
+                    error.status = response.status;
+                    error.offset = data.offset;
+                    throw error;
+                }
+                return data;
+            });
+        };
+
+        // Send the file from offset onwards, resuming from the server's offset after a dropped request
+        const sendChunks = function (file, uploadId, offset, retries) {
+            showProgress(offset, file.size);
+            if (offset >= file.size) {
+                return Promise.resolve();
+            }
+
+            return fetch('/uploads/' + uploadId + '?offset=' + offset, {
+                method: 'PUT',
+                headers: {'Content-Type': 'application/octet-stream'},
+                body: file.slice(offset, offset + chunkSize)
+            })
+                .then(readJson)
+                .then(data => sendChunks(file, uploadId, data.offset, 5))
+                .catch(error => {
+                    if (retries <= 0 || (error.status && error.status !== 409 && error.status < 500)) {
+                        throw error;
+                    }
+                    return new Promise(resolve => setTimeout(resolve, 1000))
+                        .then(() => fetch('/uploads/' + uploadId).then(readJson))
+                        .then(status => sendChunks(file, uploadId, status.offset, retries - 1));
+                });
+        };
+
+        form.addEventListener('submit', function (e) {
+            const file = form.querySelector('input[type="file"]').files[0];
+            if (!file || e.defaultPrevented) {
+                return;
+            }
+            e.preventDefault();
+
+            const button = form.querySelector('button[type="submit"]');
+            const projectName = form.querySelector('[name="project_name"]').value;
+            button.disabled = true;
+
+            fetch('/uploads', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({filename: file.name, size: file.size})
+            })
+                .then(readJson)
+                .then(upload => sendChunks(file, upload.id, upload.offset, 5).then(() => upload.id))
+                .then(uploadId => fetch('/uploads/' + uploadId + '/complete', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({project_name: projectName})
+                }))
+                .then(readJson)
+                .then(result => {
+                    window.location.href = result.redirect_url;
+                })
+                .catch(error => {
+                    button.disabled = false;
+                    alert('Upload failed: ' + error.message);
+                });
+        });
     }
 };
 
@@ -0,0 +1,86 @@
+import json
+import time
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.gemini_client import GeminiClient
+
+CHUNKS = ['def ', 'hello():', '\n    pass']
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    """Streams CHUNKS as server-sent events, slowly enough for a second caller to join"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.calls += 1
+        self.server.called.set()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        if ':streamGenerateContent' in self.path:
+            for text in CHUNKS:
+                event = {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(0.2)
+        else:
+            event = {'candidates': [{'content': {'parts': [{'text': ''.join(CHUNKS)}]}}]}
+            self.wfile.write(json.dumps(event).encode('utf-8'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GeminiClientStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGemini)
+        self.server.calls = 0
+        self.server.called = threading.Event()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = GeminiClient('test-key', base_url=f"http://127.0.0.1:{self.server.server_port}")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def collect(self, results, name, produce):
+        try:
+            results[name] = produce()
+        except Exception as e:
+            results[name] = e
+
+    def test_concurrent_streams_share_one_upstream_call(self):
+        results = {}
+        first = threading.Thread(target=self.collect,
+                                 args=(results, 'first', lambda: list(self.client.stream('write hello'))))
+        first.start()
+        self.assertTrue(self.server.called.wait(5))
+        second = threading.Thread(target=self.collect,
+                                  args=(results, 'second', lambda: list(self.client.stream('write  hello'))))
+        second.start()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(self.server.calls, 1)
+        self.assertEqual(results['first'], CHUNKS)
+        self.assertEqual(''.join(results['second']), ''.join(CHUNKS))
+
+    def test_generate_waits_on_an_inflight_stream(self):
+        results = {}
+        streaming = threading.Thread(target=self.collect,
+                                     args=(results, 'stream', lambda: list(self.client.stream('write hello'))))
+        streaming.start()
+        self.assertTrue(self.server.called.wait(5))
+        self.collect(results, 'generate', lambda: self.client.generate('write hello'))
+        streaming.join(5)
+
+        self.assertEqual(self.server.calls, 1)
+        self.assertEqual(results['generate'], ''.join(CHUNKS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import java.io.BufferedReader;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+
+/**
+ * Long-lived apktool worker used by utils/apktool_pool.py.
+ *
+ * Reads one job per line from stdin (tab separated apktool arguments), runs it
+ * in this JVM and answers "DONE <status>" on stdout. Everything apktool prints
+ * goes to stderr so stdout only carries the protocol.
+ *
+ * Launched in source-file mode: java -cp apktool.jar ApktoolWorker.java
+ */
+public class ApktoolWorker {
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        System.setOut(System.err);
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        protocol.println("READY");
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+
+            int status = 0;
+            try {
+                brut.apktool.Main.main(line.split("\t"));
+            } catch (Throwable t) {
+                t.printStackTrace();
+                status = 1;
+            }
+
+            System.err.flush();
+            protocol.println("DONE " + status);
+        }
+    }
+}
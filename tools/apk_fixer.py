@@ -5,6 +5,7 @@ import logging
 import subprocess
 import tempfile
 import uuid
+from utils.parallel_zip import ParallelZipWriter
 
 logger = logging.getLogger("APKEditor")
 
@@ -33,12 +34,9 @@ class APKFixer:
                 
                 # Create fixed APK
                 fixed_path = os.path.join(self.temp_folder, f"fixed_{os.path.basename(input_path)}")
-                with zipfile.ZipFile(fixed_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for root, dirs, files in os.walk(temp_dir):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, temp_dir)
-                            zipf.write(file_path, arcname)
+                writer = ParallelZipWriter(fixed_path)
+                writer.add_tree(temp_dir)
+                writer.write()
                 
                 # Sign the APK
                 success, result = self._sign_apk(fixed_path, output_path)
@@ -56,8 +54,9 @@ class APKFixer:
         
         except Exception as e:
             logger.error(f"Error fixing APK: {str(e)}")
-            return False, str(e)    def _f
-ix_apk_structure(self, apk_dir):
+            return False, str(e)
+    
+    def _fix_apk_structure(self, apk_dir):
         """Fix the APK directory structure for proper installation"""
         try:
             # Ensure META-INF directory exists
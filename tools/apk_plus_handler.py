@@ -4,6 +4,8 @@ import zipfile
 import logging
 import json
 from datetime import datetime
+from utils.apk_rebuilder import order_entries, copy_raw_entry, write_bytes, write_file
+from utils.compression_policy import DEFAULT_POLICY
 
 logger = logging.getLogger("APKEditor")
 
@@ -37,47 +39,18 @@ class APKPlusHandler:
         """Convert standard APK to APK+ format"""
         try:
             # Create output path
-            output_path = apk_path.replace('.apk', '.apk+')
-            if not output_path.endswith('.apk+'):
-                output_path += '.apk+'
-                
-            # Create a temporary directory for processing
-            temp_dir = os.path.join(self.temp_folder, f"apk_plus_{os.path.basename(apk_path)}")
-            os.makedirs(temp_dir, exist_ok=True)
+            output_path = self._apk_plus_path(apk_path)
             
-            try:
-                # Extract APK contents
-                with zipfile.ZipFile(apk_path, 'r') as zipf:
-                    zipf.extractall(temp_dir)
-                
-                # Create APK+ metadata
-                metadata = {
-                    'original_apk': os.path.basename(apk_path),
-                    'converted_at': datetime.now().isoformat(),
-                    'format_version': '1.0',
-                    'is_installable': False
-                }
-                
-                # Save metadata to the extracted directory
-                metadata_path = os.path.join(temp_dir, 'apk_plus_metadata.json')
-                with open(metadata_path, 'w') as f:
-                    json.dump(metadata, f, indent=2)
-                
-                # Create APK+ file
-                with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for root, dirs, files in os.walk(temp_dir):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, temp_dir)
-                            zipf.write(file_path, arcname)
-                
-                logger.info(f"APK converted to APK+ format: {output_path}")
-                return True, output_path
-                
-            finally:
-                # Clean up temp directory
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
+            metadata = {
+                'original_apk': os.path.basename(apk_path),
+                'converted_at': datetime.now().isoformat(),
+                'format_version': '1.0',
+                'is_installable': False
+            }
+            self._write_apk_plus(apk_path, output_path, metadata)
+            
+            logger.info(f"APK converted to APK+ format: {output_path}")
+            return True, output_path
         
         except Exception as e:
             logger.error(f"Error converting to APK+: {str(e)}")
@@ -86,58 +59,19 @@ class APKPlusHandler:
     def create_installable_apk_plus(self, apk_path):
         """Create an installable APK+ file"""
         try:
-            # First convert to regular APK+
-            success, output_path = self.convert_to_apk_plus(apk_path)
-            if not success:
-                return False, output_path
+            installable_path = self._apk_plus_path(apk_path).replace('.apk+', '_installable.apk+')
             
-            # Create a temporary directory for processing
-            temp_dir = os.path.join(self.temp_folder, f"installable_{os.path.basename(apk_path)}")
-            os.makedirs(temp_dir, exist_ok=True)
+            metadata = {
+                'original_apk': os.path.basename(apk_path),
+                'converted_at': datetime.now().isoformat(),
+                'format_version': '1.0',
+                'is_installable': True,
+                'original_apk_included': True
+            }
+            self._write_apk_plus(apk_path, installable_path, metadata, include_original=True)
             
-            try:
-                # Extract APK+ contents
-                with zipfile.ZipFile(output_path, 'r') as zipf:
-                    zipf.extractall(temp_dir)
-                
-                # Update metadata to mark as installable
-                metadata_path = os.path.join(temp_dir, 'apk_plus_metadata.json')
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
-                    
-                    metadata['is_installable'] = True
-                    metadata['original_apk_included'] = True
-                    
-                    with open(metadata_path, 'w') as f:
-                        json.dump(metadata, f, indent=2)
-                
-                # Include the original APK in the APK+ package
-                original_apk_dir = os.path.join(temp_dir, 'original_apk')
-                os.makedirs(original_apk_dir, exist_ok=True)
-                shutil.copy2(apk_path, os.path.join(original_apk_dir, os.path.basename(apk_path)))
-                
-                # Create installable APK+ file
-                installable_path = output_path.replace('.apk+', '_installable.apk+')
-                with zipfile.ZipFile(installable_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for root, dirs, files in os.walk(temp_dir):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, temp_dir)
-                            zipf.write(file_path, arcname)
-                
-                logger.info(f"Created installable APK+: {installable_path}")
-                
-                # Remove the non-installable version
-                if os.path.exists(output_path):
-                    os.remove(output_path)
-                
-                return True, installable_path
-                
-            finally:
-                # Clean up temp directory
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
+            logger.info(f"Created installable APK+: {installable_path}")
+            return True, installable_path
         
         except Exception as e:
             logger.error(f"Error creating installable APK+: {str(e)}")
@@ -150,89 +84,61 @@ class APKPlusHandler:
             output_path = apk_plus_path.replace('.apk+', '.apk')
             if output_path == apk_plus_path:  # If no extension change happened
                 output_path = apk_plus_path + '.converted.apk'
-                
-            # Create a temporary directory for processing
-            temp_dir = os.path.join(self.temp_folder, f"std_apk_{os.path.basename(apk_plus_path)}")
-            os.makedirs(temp_dir, exist_ok=True)
             
-            try:
-                # Extract APK+ contents
-                with zipfile.ZipFile(apk_plus_path, 'r') as zipf:
-                    zipf.extractall(temp_dir)
-                
+            with zipfile.ZipFile(apk_plus_path, 'r') as zipf:
                 # Check if this is an installable APK+ with the original APK included
-                metadata_path = os.path.join(temp_dir, 'apk_plus_metadata.json')
-                original_apk_included = False
-                
-                if os.path.exists(metadata_path):
+                metadata = {}
+                if 'apk_plus_metadata.json' in zipf.namelist():
                     try:
-                        with open(metadata_path, 'r') as f:
-                            metadata = json.load(f)
-                        
-                        original_apk_included = metadata.get('original_apk_included', False)
-                        original_apk_name = metadata.get('original_apk', '')
-                        
-                        if original_apk_included and original_apk_name:
-                            original_apk_path = os.path.join(temp_dir, 'original_apk', original_apk_name)
-                            if os.path.exists(original_apk_path):
-                                # Simply copy the original APK
-                                shutil.copy2(original_apk_path, output_path)
-                                logger.info(f"Restored original APK from APK+: {output_path}")
-                                return True, output_path
+                        metadata = json.loads(zipf.read('apk_plus_metadata.json'))
                     except Exception as e:
                         logger.error(f"Error reading APK+ metadata: {str(e)}")
                 
-                # If no original APK or not installable, create a new APK from the contents
-                # Remove APK+ specific files
-                if os.path.exists(metadata_path):
-                    os.remove(metadata_path)
-                
-                original_apk_dir = os.path.join(temp_dir, 'original_apk')
-                if os.path.exists(original_apk_dir):
-                    shutil.rmtree(original_apk_dir)
-                
-                # Create standard APK file
-                with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    # First add AndroidManifest.xml if it exists
-                    manifest_path = os.path.join(temp_dir, "AndroidManifest.xml")
-                    if os.path.exists(manifest_path):
-                        zipf.write(manifest_path, "AndroidManifest.xml")
-                    
-                    # Then add classes.dex files
-                    for dex_file in ["classes.dex", "classes2.dex", "classes3.dex"]:
-                        dex_path = os.path.join(temp_dir, dex_file)
-                        if os.path.exists(dex_path):
-                            zipf.write(dex_path, dex_file)
-                    
-                    # Then add resources.arsc
-                    resources_path = os.path.join(temp_dir, "resources.arsc")
-                    if os.path.exists(resources_path):
-                        zipf.write(resources_path, "resources.arsc")
-                    
-                    # Add all other files
-                    for root, dirs, files in os.walk(temp_dir):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, temp_dir)
-                            
-                            # Skip files we've already added or APK+ specific files
-                            if arcname in ["AndroidManifest.xml", "classes.dex", "classes2.dex", "classes3.dex", "resources.arsc", "apk_plus_metadata.json"]:
-                                continue
-                            
-                            # Skip original_apk directory
-                            if arcname.startswith('original_apk/'):
-                                continue
-                            
-                            zipf.write(file_path, arcname)
-                
-                logger.info(f"APK+ converted to standard APK: {output_path}")
-                return True, output_path
-                
-            finally:
-                # Clean up temp directory
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
+                original_apk_name = metadata.get('original_apk', '')
+                if metadata.get('original_apk_included', False) and original_apk_name:
+                    original_entry = f"original_apk/{original_apk_name}"
+                    if original_entry in zipf.namelist():
+                        # Stream the nested original APK straight out of the archive
+                        with zipf.open(original_entry) as src, open(output_path, 'wb') as dst:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+                        logger.info(f"Restored original APK from APK+: {output_path}")
+                        return True, output_path
+                
+                # If no original APK or not installable, copy the APK entries out without
+                # the APK+ specific files; priority entries go first
+                entries = {info.filename: info for info in zipf.infolist()
+                           if not info.is_dir() and info.filename != 'apk_plus_metadata.json'
+                           and not info.filename.startswith('original_apk/')}
+                with open(apk_plus_path, 'rb') as src_fp, \
+                        zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as dst:
+                    for name in order_entries(entries):
+                        copy_raw_entry(src_fp, entries[name], dst, DEFAULT_POLICY.alignment)
+            
+            logger.info(f"APK+ converted to standard APK: {output_path}")
+            return True, output_path
         
         except Exception as e:
             logger.error(f"Error converting to standard APK: {str(e)}")
-            return False, str(e)
\ No newline at end of file
+            return False, str(e)
+    
+    def _apk_plus_path(self, apk_path):
+        output_path = apk_path.replace('.apk', '.apk+')
+        if not output_path.endswith('.apk+'):
+            output_path += '.apk+'
+        return output_path
+    
+    def _write_apk_plus(self, apk_path, output_path, metadata, include_original=False):
+        """Build an APK+ in one pass: raw-copy the APK entries, then append metadata and the original APK"""
+        alignment = DEFAULT_POLICY.alignment
+        with zipfile.ZipFile(apk_path, 'r') as src, open(apk_path, 'rb') as src_fp, \
+                zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as dst:
+            for info in src.infolist():
+                if info.is_dir() or info.filename == 'apk_plus_metadata.json':
+                    continue
+                copy_raw_entry(src_fp, info, dst, alignment)
+            
+            write_bytes(dst, 'apk_plus_metadata.json', json.dumps(metadata, indent=2).encode('utf-8'))
+            if include_original:
+                # Already compressed, so the nested APK is stored as-is
+                write_file(dst, apk_path, f"original_apk/{os.path.basename(apk_path)}",
+                           zipfile.ZIP_STORED, alignment)
@@ -7,8 +7,29 @@ import random
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont, ImageColor, ImageFilter, ImageEnhance
 
+from utils.gui_rules import DEFAULT_ENGINE
+from utils.layout_rewriter import LayoutRewriter, AttributeRule, scale_unit, constant, layout_paths, rewrite_values
+
 logger = logging.getLogger("APKEditor")
 
+# Scale explicit dp sizes and sp text sizes up by 20%
+GROW_RULES = [
+    AttributeRule("android:layout_width", scale_unit(1.2, "dp")),
+    AttributeRule("android:layout_height", scale_unit(1.2, "dp")),
+    AttributeRule("android:textSize", scale_unit(1.2, "sp")),
+]
+
+# Elevation on buttons and a text shadow on text views, only where not already set
+GLOW_RULES = [
+    AttributeRule("android:elevation", constant("8dp"), tags=["Button"], add_missing=True),
+    AttributeRule("android:stateListAnimator", constant("@android:anim/button_state_list_anim"),
+                  tags=["Button"], add_missing=True),
+    AttributeRule("android:shadowColor", constant("#80000000"), tags=["TextView"], add_missing=True),
+    AttributeRule("android:shadowDx", constant("2"), tags=["TextView"], add_missing=True),
+    AttributeRule("android:shadowDy", constant("2"), tags=["TextView"], add_missing=True),
+    AttributeRule("android:shadowRadius", constant("4"), tags=["TextView"], add_missing=True),
+]
+
 class AIHelper:
     """Helper class for AI-based GUI modifications"""
     
@@ -72,52 +93,22 @@ class AIHelper:
     
     def analyze_gui_changes(self, description):
         """Analyze GUI change description and extract key modifications"""
-        description = description.lower()
-        changes = {
-            "colors": [],
-            "sizes": [],
-            "effects": [],
-            "layout": []
-        }
-        
-        # Extract color changes
-        color_keywords = ["blue", "green", "red", "yellow", "orange", "purple", "pink", "black", "white", "gray", "grey", "dark", "light"]
-        for color in color_keywords:
-            if color in description:
-                changes["colors"].append(color)
-        
-        # Extract size changes
-        size_keywords = ["bigger", "larger", "smaller", "wider", "taller", "thinner", "resize"]
-        for size in size_keywords:
-            if size in description:
-                changes["sizes"].append(size)
-        
-        # Extract effect changes
-        effect_keywords = ["glow", "shadow", "gradient", "transparent", "opacity", "blur", "sharp", "bold", "italic"]
-        for effect in effect_keywords:
-            if effect in description:
-                changes["effects"].append(effect)
-        
-        # Extract layout changes
-        layout_keywords = ["move", "position", "align", "center", "left", "right", "top", "bottom", "margin", "padding"]
-        for layout in layout_keywords:
-            if layout in description:
-                changes["layout"].append(layout)
-        
-        return changes
+        return DEFAULT_ENGINE.analyze(description)
     
-    def generate_app_preview(self, project_name, color_scheme=None, gui_changes=None):
-        """Generate a simple app preview based on project name and optional color scheme"""
+    def generate_app_preview(self, project_name, color_scheme=None, gui_changes=None, changes=None):
+        """Generate a simple app preview; changes can pass in an analysis of gui_changes already made"""
         try:
             # Set default dimensions for the preview
             width, height = 300, 600
+            if gui_changes and changes is None:
+                changes = self.analyze_gui_changes(gui_changes)
             
             # Choose color scheme
             colors = self.color_schemes.get(color_scheme, self.color_schemes["blue"])
             if not color_scheme and gui_changes:
                 # Try to extract color scheme from GUI changes
-                for color in self.color_schemes.keys():
-                    if color in gui_changes.lower():
+                for color in changes["colors"]:
+                    if color in self.color_schemes:
                         colors = self.color_schemes[color]
                         break
             
@@ -156,8 +147,6 @@ class AIHelper:
             
             # Add some UI elements based on GUI changes
             if gui_changes:
-                changes = self.analyze_gui_changes(gui_changes)
-                
                 # Add controller elements
                 self._add_controller_elements(draw, width, content_top, content_height, colors, changes)
             else:
@@ -268,13 +257,14 @@ class AIHelper:
         # Blend with original
         return Image.blend(glow, img, 0.7)
     
-    def apply_gui_changes(self, project_id, project_dir, gui_changes, color_scheme):
-        """Apply GUI changes to the project files"""
+    def apply_gui_changes(self, project_id, project_dir, gui_changes, color_scheme, changes=None):
+        """Apply GUI changes to the project files; changes can pass in an analysis shared across projects"""
         try:
             decompiled_dir = os.path.join(project_dir, 'decompiled')
             
-            # Track modified files
+            # Track modified files and the attributes/values changed in each
             modified_files = []
+            changes_by_file = {}
             
             # Apply color scheme changes to XML files
             if color_scheme and color_scheme != "Keep Current":
@@ -283,67 +273,60 @@ class AIHelper:
                 # Update colors.xml if it exists
                 colors_xml_path = os.path.join(decompiled_dir, 'res/values/colors.xml')
                 if os.path.exists(colors_xml_path):
-                    with open(colors_xml_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # Replace primary color
-                    content = self._replace_color_in_xml(content, "colorPrimary", colors["primary"])
-                    content = self._replace_color_in_xml(content, "colorPrimaryDark", colors["background"])
-                    content = self._replace_color_in_xml(content, "colorAccent", colors["accent"])
-                    
-                    with open(colors_xml_path, 'w', encoding='utf-8') as f:
-                        f.write(content)
-                    
-                    modified_files.append(colors_xml_path)
+                    color_changes = rewrite_values(colors_xml_path, 'color', {
+                        "colorPrimary": colors["primary"],
+                        "colorPrimaryDark": colors["background"],
+                        "colorAccent": colors["accent"]
+                    }, add_missing=True)
+                    if color_changes:
+                        changes_by_file[colors_xml_path] = color_changes
+                        modified_files.append(colors_xml_path)
                 else:
                     # Create colors.xml if it doesn't exist
                     os.makedirs(os.path.join(decompiled_dir, 'res/values'), exist_ok=True)
+                    new_colors = {
+                        "colorPrimary": colors["primary"],
+                        "colorPrimaryDark": colors["background"],
+                        "colorAccent": colors["accent"],
+                        "textColor": colors["text"]
+                    }
                     with open(colors_xml_path, 'w', encoding='utf-8') as f:
-                        f.write(f'''<?xml version="1.0" encoding="utf-8"?>
-<resources>
-    <color name="colorPrimary">{colors["primary"]}</color>
-    <color name="colorPrimaryDark">{colors["background"]}</color>
-    <color name="colorAccent">{colors["accent"]}</color>
-    <color name="textColor">{colors["text"]}</color>
-</resources>''')
+                        f.write('<?xml version="1.0" encoding="utf-8"?>\n<resources>\n')
+                        for name, value in new_colors.items():
+                            f.write(f'    <color name="{name}">{value}</color>\n')
+                        f.write('</resources>')
                     
+                    changes_by_file[colors_xml_path] = [{"element": "color", "name": name, "old": None, "new": value}
+                                                        for name, value in new_colors.items()]
                     modified_files.append(colors_xml_path)
             
             # Apply specific GUI changes based on description
             if gui_changes:
-                changes = self.analyze_gui_changes(gui_changes)
+                if changes is None:
+                    changes = self.analyze_gui_changes(gui_changes)
                 
-                # Update layout files
-                layout_dir = os.path.join(decompiled_dir, 'res/layout')
-                if os.path.exists(layout_dir):
-                    for layout_file in os.listdir(layout_dir):
-                        if layout_file.endswith('.xml'):
-                            layout_path = os.path.join(layout_dir, layout_file)
-                            with open(layout_path, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                            
-                            # Apply size changes
-                            if any(size in changes["sizes"] for size in ["bigger", "larger"]):
-                                content = self._increase_element_sizes(content)
-                            
-                            # Apply effect changes
-                            if "glow" in changes["effects"]:
-                                content = self._add_glow_effect_to_xml(content)
-                            
-                            with open(layout_path, 'w', encoding='utf-8') as f:
-                                f.write(content)
-                            
-                            modified_files.append(layout_path)
+                # Update layout files in one pass each, rewriting only those that change
+                rules = []
+                if any(size in changes["sizes"] for size in ["bigger", "larger"]):
+                    rules += GROW_RULES
+                if "glow" in changes["effects"]:
+                    rules += GLOW_RULES
+                if rules:
+                    layout_changes = LayoutRewriter(rules).rewrite_files(layout_paths(decompiled_dir))
+                    changes_by_file.update(layout_changes)
+                    modified_files.extend(layout_changes)
             
             # Generate a preview of the changes
             preview_info = self.generate_app_preview(
                 project_name=project_id, 
                 color_scheme=color_scheme, 
-                gui_changes=gui_changes
+                gui_changes=gui_changes,
+                changes=changes
             )
             
             return {
                 "modified_files": modified_files,
+                "changes": changes_by_file,
                 "preview": preview_info
             }
             
@@ -354,55 +337,3 @@ class AIHelper:
                 "preview": None,
                 "error": str(e)
             }
-    
-    def _replace_color_in_xml(self, content, color_name, new_color):
-        """Replace a color value in XML content"""
-        import re
-        pattern = f'<color name="{color_name}">.*?</color>'
-        replacement = f'<color name="{color_name}">{new_color}</color>'
-        
-        # Check if the color exists
-        if re.search(pattern, content):
-            return re.sub(pattern, replacement, content)
-        else:
-            # Add the color if it doesn't exist
-            insert_point = content.find('</resources>')
-            if insert_point > 0:
-                return content[:insert_point] + f'    {replacement}\n' + content[insert_point:]
-            else:
-                return content
-    
-    def _increase_element_sizes(self, content):
-        """Increase the size of elements in XML layout"""
-        import re
-        
-        # Increase width and height attributes
-        content = re.sub(r'android:layout_width="(\d+)dp"', 
-                        lambda m: f'android:layout_width="{int(m.group(1)) * 1.2:.0f}dp"', 
-                        content)
-        
-        content = re.sub(r'android:layout_height="(\d+)dp"', 
-                        lambda m: f'android:layout_height="{int(m.group(1)) * 1.2:.0f}dp"', 
-                        content)
-        
-        # Increase text sizes
-        content = re.sub(r'android:textSize="(\d+)sp"', 
-                        lambda m: f'android:textSize="{int(m.group(1)) * 1.2:.0f}sp"', 
-                        content)
-        
-        return content
-    
-    def _add_glow_effect_to_xml(self, content):
-        """Add glow effect to elements in XML layout"""
-        import re
-        
-        # Add shadow to buttons and text views
-        button_pattern = r'<Button\s+([^>]*)>'
-        textview_pattern = r'<TextView\s+([^>]*)>'
-        
-        shadow_props = 'android:elevation="8dp" android:stateListAnimator="@android:anim/button_state_list_anim"'
-        
-        content = re.sub(button_pattern, f'<Button \\1 {shadow_props}>', content)
-        content = re.sub(textview_pattern, f'<TextView \\1 android:shadowColor="#80000000" android:shadowDx="2" android:shadowDy="2" android:shadowRadius="4">', content)
-        
-        return content
\ No newline at end of file
@@ -1,4 +1,6 @@
 import os
+import re
+import json
 import logging
 import subprocess
 import shutil
@@ -7,11 +9,18 @@ import xml.etree.ElementTree as ET
 from PIL import Image, ImageDraw, ImageFont
 import io
 import base64
+from utils.resource_index import ResourceIndex
+from utils.preview_cache import PreviewCache
+
+# @string/name and @color/name references in layout XML
+_RESOURCE_REFERENCE = re.compile(r'@(string|color)/([\w.]+)')
 
 class APKPreview:
-    def __init__(self, temp_folder):
+    def __init__(self, temp_folder, cache_folder=None):
         self.temp_folder = temp_folder
         os.makedirs(temp_folder, exist_ok=True)
+        max_bytes = int(os.environ.get('PREVIEW_CACHE_MAX_BYTES', 256 * 1024 ** 2))
+        self.preview_cache = PreviewCache(cache_folder or os.path.join(temp_folder, 'previews'), max_bytes)
     
     def is_button_element(self, tag):
         """Return True if the tag represents a button (standard or common custom)."""
@@ -32,20 +41,6 @@ class APKPreview:
     def extract_app_icon(self, apk_path, project_id):
         """Extract the app icon from APK"""
         try:
-            # Create temp directory for extraction
-            extract_dir = os.path.join(self.temp_folder, f"icon_extract_{project_id}")
-            os.makedirs(extract_dir, exist_ok=True)
-            
-            # Extract AndroidManifest.xml and resources
-            with zipfile.ZipFile(apk_path, 'r') as zip_ref:
-                for file in zip_ref.namelist():
-                    if file.startswith('res/drawable') and file.endswith('.png'):
-                        zip_ref.extract(file, extract_dir)
-                    if file == 'AndroidManifest.xml':
-                        zip_ref.extract(file, extract_dir)
-                    if file.startswith('res/mipmap') and file.endswith('.png'):
-                        zip_ref.extract(file, extract_dir)
-            
             # Look for icon in common locations
             icon_paths = [
                 'res/mipmap-xxxhdpi/ic_launcher.png',
@@ -61,13 +56,19 @@ class APKPreview:
                 'res/drawable-mdpi/ic_launcher.png'
             ]
             
-            for icon_path in icon_paths:
-                full_path = os.path.join(extract_dir, icon_path)
-                if os.path.exists(full_path):
-                    # Save icon to project directory
-                    icon_dest = os.path.join(self.temp_folder, f"icon_{project_id}.png")
-                    shutil.copy2(full_path, icon_dest)
-                    return icon_dest
+            # Only the central directory is read; the icon itself is extracted once per content
+            with zipfile.ZipFile(apk_path, 'r') as zip_ref:
+                names = set(zip_ref.namelist())
+                for icon_path in icon_paths:
+                    if icon_path in names:
+                        info = zip_ref.getinfo(icon_path)
+                        key = self.preview_cache.make_key('icon', icon_path, info.CRC, info.file_size)
+                        
+                        def extract(path):
+                            with zip_ref.open(info) as src, open(path, 'wb') as dst:
+                                shutil.copyfileobj(src, dst)
+                        
+                        return self.preview_cache.render(key, extract)
             
             # If no icon found, create a placeholder
             return self._create_placeholder_icon(project_id)
@@ -75,98 +76,46 @@ class APKPreview:
         except Exception as e:
             logging.error(f"Error extracting app icon: {str(e)}")
             return self._create_placeholder_icon(project_id)
-        finally:
-            # Clean up
-            if os.path.exists(extract_dir):
-                shutil.rmtree(extract_dir)
     
     def _create_placeholder_icon(self, project_id):
         """Create a placeholder icon when extraction fails"""
         try:
             icon_size = 192
-            icon = Image.new('RGBA', (icon_size, icon_size), (52, 152, 219))
-            draw = ImageDraw.Draw(icon)
-            
-            # Add text
-            try:
-                font = ImageFont.truetype("arial.ttf", 48)
-            except:
-                font = ImageFont.load_default()
-            
-            draw.text((icon_size/2, icon_size/2), "APK", fill=(255, 255, 255), font=font, anchor="mm")
-            
-            # Save icon
-            icon_path = os.path.join(self.temp_folder, f"icon_{project_id}.png")
-            icon.save(icon_path)
-            return icon_path
+            key = self.preview_cache.make_key('placeholder_icon', icon_size)
+            return self.preview_cache.render(key, lambda path: self._render_placeholder_icon(path, icon_size))
             
         except Exception as e:
             logging.error(f"Error creating placeholder icon: {str(e)}")
             return None
     
+    def _render_placeholder_icon(self, icon_path, icon_size):
+        icon = Image.new('RGBA', (icon_size, icon_size), (52, 152, 219))
+        draw = ImageDraw.Draw(icon)
+        
+        # Add text
+        try:
+            font = ImageFont.truetype("arial.ttf", 48)
+        except:
+            font = ImageFont.load_default()
+        
+        draw.text((icon_size/2, icon_size/2), "APK", fill=(255, 255, 255), font=font, anchor="mm")
+        
+        # Save icon
+        icon.save(icon_path, format='PNG')
+    
     def extract_app_name(self, decompiled_dir):
-        """Extract app name from strings.xml"""
+        """Extract app name from the project's resource index"""
         try:
-            strings_path = os.path.join(decompiled_dir, 'res/values/strings.xml')
-            if os.path.exists(strings_path):
-                tree = ET.parse(strings_path)
-                root = tree.getroot()
-                
-                # Look for app_name string
-                for string in root.findall('.//string'):
-                    if string.get('name') == 'app_name':
-                        return string.text
-            
-            # If not found, check AndroidManifest.xml
-            manifest_path = os.path.join(decompiled_dir, 'AndroidManifest.xml')
-            if os.path.exists(manifest_path):
-                tree = ET.parse(manifest_path)
-                root = tree.getroot()
-                
-                # Get application label
-                app_element = root.find('.//application')
-                if app_element is not None:
-                    label = app_element.get('{http://schemas.android.com/apk/res/android}label')
-                    if label and label.startswith('@string/'):
-                        # Try to resolve string reference
-                        string_name = label.replace('@string/', '')
-                        if os.path.exists(strings_path):
-                            tree = ET.parse(strings_path)
-                            root = tree.getroot()
-                            for string in root.findall('.//string'):
-                                if string.get('name') == string_name:
-                                    return string.text
-                    elif label:
-                        return label
-            
-            return "Unknown App"
+            return ResourceIndex(decompiled_dir).app_name() or "Unknown App"
             
         except Exception as e:
             logging.error(f"Error extracting app name: {str(e)}")
             return "Unknown App"
     
     def extract_main_activity(self, decompiled_dir):
-        """Extract main activity from AndroidManifest.xml"""
+        """Extract main activity from the project's resource index"""
         try:
-            manifest_path = os.path.join(decompiled_dir, 'AndroidManifest.xml')
-            if os.path.exists(manifest_path):
-                tree = ET.parse(manifest_path)
-                root = tree.getroot()
-                
-                # Find main activity
-                for activity in root.findall('.//activity'):
-                    for intent_filter in activity.findall('.//intent-filter'):
-                        action = intent_filter.find('.//action')
-                        category = intent_filter.find('.//category')
-                        
-                        if (action is not None and 
-                            action.get('{http://schemas.android.com/apk/res/android}name') == 'android.intent.action.MAIN' and
-                            category is not None and
-                            category.get('{http://schemas.android.com/apk/res/android}name') == 'android.intent.category.LAUNCHER'):
-                            
-                            return activity.get('{http://schemas.android.com/apk/res/android}name')
-            
-            return None
+            return ResourceIndex(decompiled_dir).load()['launcher_activity']
             
         except Exception as e:
             logging.error(f"Error extracting main activity: {str(e)}")
@@ -175,74 +124,88 @@ class APKPreview:
     def extract_layout_preview(self, decompiled_dir, project_id):
         """Extract and render layout preview"""
         try:
-            # Find main activity layout
-            main_activity = self.extract_main_activity(decompiled_dir)
-            if not main_activity:
-                return self._create_layout_preview(project_id, None)
+            index = ResourceIndex(decompiled_dir).load()
             
-            # Look for layout files
-            layout_dir = os.path.join(decompiled_dir, 'res/layout')
-            if not os.path.exists(layout_dir):
+            # Find main activity layout
+            if not index['launcher_activity'] or not index['layouts']:
                 return self._create_layout_preview(project_id, None)
             
             # Try to find main layout
-            layout_files = os.listdir(layout_dir)
+            layout_files = sorted(index['layouts'])
             main_layout = None
             
             # Common layout names
             common_layouts = ['activity_main.xml', 'main.xml', 'main_activity.xml']
             
             for layout in common_layouts:
-                if layout in layout_files:
-                    main_layout = os.path.join(layout_dir, layout)
+                if f"res/layout/{layout}" in index['layouts']:
+                    main_layout = f"res/layout/{layout}"
                     break
             
             # If not found, use first layout
-            if not main_layout and layout_files:
-                main_layout = os.path.join(layout_dir, layout_files[0])
+            if not main_layout:
+                main_layout = layout_files[0]
             
-            return self._create_layout_preview(project_id, main_layout)
+            return self._create_layout_preview(project_id, os.path.join(decompiled_dir, main_layout), index)
             
         except Exception as e:
             logging.error(f"Error extracting layout preview: {str(e)}")
             return self._create_layout_preview(project_id, None)
     
-    def _create_layout_preview(self, project_id, layout_path):
-        """Create a preview image from layout XML"""
+    def _create_layout_preview(self, project_id, layout_path, index=None):
+        """Create a preview image from layout XML, reusing the cached render when its inputs are unchanged"""
         try:
-            # Create a blank image
             width, height = 360, 640
-            image = Image.new('RGBA', (width, height), (30, 30, 30))
-            draw = ImageDraw.Draw(image)
-            
-            # Add status bar
-            draw.rectangle([(0, 0), (width, 30)], fill=(20, 20, 20))
-            
-            # Try to load layout
+            layout_data = b''
             if layout_path and os.path.exists(layout_path):
-                try:
-                    tree = ET.parse(layout_path)
-                    root = tree.getroot()
-                    
-                    # Simple layout rendering (very basic)
-                    self._render_layout_element(draw, root, 0, 30, width, height-30)
-                except Exception as e:
-                    logging.error(f"Error parsing layout: {str(e)}")
-                    # Add error text
-                    draw.text((width/2, height/2), "Layout Preview Error", fill=(255, 100, 100), anchor="mm")
-            else:
-                # Add placeholder text
-                draw.text((width/2, height/2), "No Layout Found", fill=(200, 200, 200), anchor="mm")
+                with open(layout_path, 'rb') as f:
+                    layout_data = f.read()
             
-            # Save preview
-            preview_path = os.path.join(self.temp_folder, f"layout_preview_{project_id}.png")
-            image.save(preview_path)
-            return preview_path
+            key = self.preview_cache.make_key('layout', width, height, layout_data,
+                                              self._referenced_values(layout_data, index))
+            return self.preview_cache.render(
+                key, lambda path: self._render_layout_preview(path, layout_data, width, height))
             
         except Exception as e:
             logging.error(f"Error creating layout preview: {str(e)}")
             return None
     
+    def _referenced_values(self, layout_data, index):
+        """Serialize the strings and colors a layout references, so editing them invalidates its preview"""
+        if not index:
+            return ''
+        values = {}
+        for kind, name in sorted(set(_RESOURCE_REFERENCE.findall(layout_data.decode('utf-8', 'replace')))):
+            table = index['strings'] if kind == 'string' else index.get('colors', {})
+            values[f"{kind}/{name}"] = table.get(name)
+        return json.dumps(values, sort_keys=True)
+    
+    def _render_layout_preview(self, preview_path, layout_data, width, height):
+        # Create a blank image
+        image = Image.new('RGBA', (width, height), (30, 30, 30))
+        draw = ImageDraw.Draw(image)
+        
+        # Add status bar
+        draw.rectangle([(0, 0), (width, 30)], fill=(20, 20, 20))
+        
+        # Try to load layout
+        if layout_data:
+            try:
+                root = ET.fromstring(layout_data)
+                
+                # Simple layout rendering (very basic)
+                self._render_layout_element(draw, root, 0, 30, width, height-30)
+            except Exception as e:
+                logging.error(f"Error parsing layout: {str(e)}")
+                # Add error text
+                draw.text((width/2, height/2), "Layout Preview Error", fill=(255, 100, 100), anchor="mm")
+        else:
+            # Add placeholder text
+            draw.text((width/2, height/2), "No Layout Found", fill=(200, 200, 200), anchor="mm")
+        
+        # Save preview
+        image.save(preview_path, format='PNG')
+    
     def _render_layout_element(self, draw, element, x, y, width, height, depth=0):
         """Recursively render layout elements (improved button recognition)"""
         if depth > 5:  # Limit recursion
@@ -0,0 +1,282 @@
+import os
+import struct
+import zipfile
+import zlib
+import time
+import logging
+from utils.compression_policy import DEFAULT_POLICY
+
+# Entries Android tooling expects at the front of the archive
+PRIORITY_ENTRIES = [
+    'AndroidManifest.xml',
+    'classes.dex',
+    'classes2.dex',
+    'classes3.dex',
+    'resources.arsc'
+]
+
+# Bit 3 of the general purpose flags: sizes/CRC follow the data in a descriptor
+_DATA_DESCRIPTOR_FLAG = 0x08
+_ZIP64_EXTRA_ID = 0x0001
+# Extra field zipalign uses to pad stored entries to their alignment
+_ALIGNMENT_EXTRA_ID = 0xD935
+_CHUNK_SIZE = 1024 * 1024
+# Files above this size are streamed instead of compressed in memory
+_STREAM_THRESHOLD = 64 * 1024 * 1024
+
+
+def order_entries(names):
+    """Return archive names with the priority entries first, rest in original order"""
+    names = list(names)
+    present = set(names)
+    ordered = [name for name in PRIORITY_ENTRIES if name in present]
+    ordered.extend(name for name in names if name not in PRIORITY_ENTRIES)
+    return ordered
+
+
+def file_crc32(path):
+    """Calculate the ZIP CRC-32 of a file using chunked reads"""
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc & 0xffffffff
+
+
+def _read_chunks(path):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(_CHUNK_SIZE), b'')
+
+
+def compress_file(file_path, compress_type, level=-1):
+    """Read and compress one file, returning (crc32, file_size, compressed bytes)"""
+    crc = 0
+    size = 0
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if compress_type == zipfile.ZIP_DEFLATED else None
+    parts = []
+
+    for chunk in _read_chunks(file_path):
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        parts.append(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        parts.append(compressor.flush())
+
+    return crc & 0xffffffff, size, b''.join(parts)
+
+
+def _alignment_extra(zinfo, header_offset, alignment):
+    """Return zinfo's extra field padded so the entry's data starts on an alignment boundary"""
+    extra = zipfile._strip_extra(zinfo.extra, (_ALIGNMENT_EXTRA_ID,))
+    data_start = header_offset + zipfile.sizeFileHeader + len(zinfo.filename.encode('utf-8')) + len(extra)
+    # 4 bytes of extra header plus the 2-byte alignment value come before the padding
+    padding = (-(data_start + 6)) % alignment
+    return extra + struct.pack('<HHH', _ALIGNMENT_EXTRA_ID, 2 + padding, alignment) + b'\0' * padding
+
+
+def _data_offset(src_fp, info):
+    """Locate the first byte of an entry's compressed data in the source archive"""
+    src_fp.seek(info.header_offset)
+    header = src_fp.read(zipfile.sizeFileHeader)
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+    # Name and extra lengths come from the local header, they may differ from the central directory
+    return info.header_offset + zipfile.sizeFileHeader + fields[10] + fields[11]
+
+
+def write_entry(dst_zip, zinfo, chunks, alignment=0):
+    """Append an already-compressed entry to a ZipFile opened for writing"""
+    with dst_zip._lock:
+        dst_zip._writecheck(zinfo)
+        dst_zip._didModify = True
+        zinfo.header_offset = dst_zip.fp.tell()
+        if alignment and zinfo.compress_type == zipfile.ZIP_STORED:
+            zinfo.extra = _alignment_extra(zinfo, zinfo.header_offset, alignment)
+        dst_zip.fp.write(zinfo.FileHeader())
+        for chunk in chunks:
+            dst_zip.fp.write(chunk)
+        dst_zip.filelist.append(zinfo)
+        dst_zip.NameToInfo[zinfo.filename] = zinfo
+        dst_zip.start_dir = dst_zip.fp.tell()
+
+
+def write_file(dst_zip, file_path, arcname, compress_type=zipfile.ZIP_DEFLATED, alignment=0):
+    """Add a file to an archive, aligning it when stored"""
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    zinfo.compress_type = compress_type
+
+    if compress_type == zipfile.ZIP_STORED:
+        zinfo.CRC = file_crc32(file_path)
+        zinfo.compress_size = zinfo.file_size
+        write_entry(dst_zip, zinfo, _read_chunks(file_path), alignment)
+    elif zinfo.file_size > _STREAM_THRESHOLD:
+        dst_zip.write(file_path, arcname, compress_type=compress_type)
+    else:
+        zinfo.CRC, zinfo.file_size, data = compress_file(file_path, compress_type)
+        zinfo.compress_size = len(data)
+        write_entry(dst_zip, zinfo, [data], alignment)
+    return zinfo
+
+
+def write_bytes(dst_zip, arcname, data, compress_type=zipfile.ZIP_DEFLATED, alignment=0):
+    """Add in-memory data to an archive, aligning it when stored"""
+    if compress_type != zipfile.ZIP_STORED:
+        dst_zip.writestr(arcname, data, compress_type=compress_type)
+        return
+    zinfo = zipfile.ZipInfo(arcname, time.localtime(time.time())[:6])
+    zinfo.compress_type = compress_type
+    zinfo.external_attr = 0o600 << 16
+    zinfo.CRC = zlib.crc32(data) & 0xffffffff
+    zinfo.file_size = zinfo.compress_size = len(data)
+    write_entry(dst_zip, zinfo, [data], alignment)
+
+
+def copy_raw_entry(src_fp, info, dst_zip, alignment=0):
+    """Copy an entry's compressed bytes verbatim into another archive (no recompression)"""
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.create_system = info.create_system
+    zinfo.external_attr = info.external_attr
+    zinfo.internal_attr = info.internal_attr
+    zinfo.comment = info.comment
+    # Sizes are known up front, so they go in the local header instead of a data descriptor
+    zinfo.flag_bits = info.flag_bits & ~_DATA_DESCRIPTOR_FLAG
+    zinfo.extra = zipfile._strip_extra(info.extra, (_ZIP64_EXTRA_ID,))
+
+    offset = _data_offset(src_fp, info)
+
+    def chunks():
+        remaining = info.compress_size
+        src_fp.seek(offset)
+        while remaining > 0:
+            chunk = src_fp.read(min(_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated entry data for {info.filename}")
+            remaining -= len(chunk)
+            yield chunk
+
+    write_entry(dst_zip, zinfo, chunks(), alignment)
+    return zinfo
+
+
+class APKRebuilder:
+    """Rebuild an APK by streaming the original archive and recompressing only edited files"""
+
+    def __init__(self, compression=zipfile.ZIP_DEFLATED, policy=DEFAULT_POLICY):
+        self.compression = compression
+        # Rewritten entries follow the policy; copied entries keep their original method
+        self.policy = policy
+
+    def rebuild(self, original_apk, decompiled_dir, output_path, file_index=None, previous_apk=None):
+        """Merge decompiled edits into the original APK, writing output_path in one pass"""
+        stats = {'copied': 0, 'reused': 0, 'recompressed': 0, 'added': 0}
+
+        # file_index (from BuildManifest.scan) carries sizes and CRCs, so files are not re-read
+        # and entries the previous build already compressed can be copied from it
+        if file_index is None:
+            files = self._scan_tree(decompiled_dir)
+        else:
+            files = {name: os.path.join(decompiled_dir, *name.split('/')) for name in file_index}
+        previous = self._open_previous(previous_apk) if file_index is not None else None
+        temp_output = output_path + '.tmp'
+
+        try:
+            with zipfile.ZipFile(original_apk, 'r') as src, \
+                    open(original_apk, 'rb') as src_fp, \
+                    zipfile.ZipFile(temp_output, 'w', self.compression) as dst:
+                infos = {info.filename: info for info in src.infolist() if not info.is_dir()}
+
+                for name in order_entries(infos):
+                    info = infos[name]
+                    file_path = files.pop(name, None)
+
+                    if file_path is None or self._is_unchanged(file_path, info, file_index):
+                        copy_raw_entry(src_fp, info, dst, self.policy.alignment)
+                        stats['copied'] += 1
+                    elif self._reuse_previous(previous, name, file_index, dst):
+                        stats['reused'] += 1
+                    else:
+                        self._write_file(dst, file_path, name)
+                        stats['recompressed'] += 1
+
+                # Files that only exist in the decompiled tree
+                for name in order_entries(sorted(files)):
+                    if self._reuse_previous(previous, name, file_index, dst):
+                        stats['reused'] += 1
+                    else:
+                        self._write_file(dst, files[name], name)
+                        stats['added'] += 1
+
+            # The previous build is often output_path itself, which Windows cannot replace while open
+            self._close_previous(previous)
+            previous = None
+            os.replace(temp_output, output_path)
+
+        finally:
+            self._close_previous(previous)
+            if os.path.exists(temp_output):
+                os.remove(temp_output)
+
+        logging.info(f"APK rebuilt: {output_path} ({stats['copied']} copied, {stats['reused']} reused, "
+                     f"{stats['recompressed']} recompressed, {stats['added']} added)")
+        return stats
+
+    @staticmethod
+    def _close_previous(previous):
+        if previous:
+            previous[0].close()
+            previous[1].close()
+
+    def _open_previous(self, previous_apk):
+        """Open the previous build output for raw reuse, if it is a readable archive"""
+        if not previous_apk or not os.path.exists(previous_apk):
+            return None
+        try:
+            previous_zip = zipfile.ZipFile(previous_apk, 'r')
+        except zipfile.BadZipFile:
+            logging.warning(f"Previous build is not a valid archive, ignoring: {previous_apk}")
+            return None
+        return previous_zip, open(previous_apk, 'rb')
+
+    def _reuse_previous(self, previous, name, file_index, dst):
+        """Copy an entry from the previous build when it was compressed from identical content"""
+        if not previous:
+            return False
+        previous_zip, previous_fp = previous
+        try:
+            info = previous_zip.getinfo(name)
+        except KeyError:
+            return False
+        entry = file_index[name]
+        if info.file_size != entry['size'] or info.CRC != entry['crc32']:
+            return False
+        if info.compress_type != self.policy.compress_type(name):
+            return False
+        copy_raw_entry(previous_fp, info, dst, self.policy.alignment)
+        return True
+
+    def _write_file(self, dst, file_path, name):
+        write_file(dst, file_path, name, self.policy.compress_type(name), self.policy.alignment)
+
+    def _scan_tree(self, directory):
+        """Map archive names to file paths for every file under directory"""
+        files = {}
+        for root, dirs, filenames in os.walk(directory):
+            for filename in filenames:
+                file_path = os.path.join(root, filename)
+                arcname = os.path.relpath(file_path, directory).replace(os.sep, '/')
+                files[arcname] = file_path
+        return files
+
+    def _is_unchanged(self, file_path, info, file_index=None):
+        """Check whether a decompiled file still matches its original archive entry"""
+        if file_index is not None:
+            entry = file_index[info.filename]
+            return entry['size'] == info.file_size and entry['crc32'] == info.CRC
+        if os.path.getsize(file_path) != info.file_size:
+            return False
+        return file_crc32(file_path) == info.CRC
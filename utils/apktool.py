@@ -6,12 +6,32 @@ import base64
 import hashlib
 import time
 import zipfile
+import zlib
 from pathlib import Path
+from utils.apktool_pool import get_pool
+from utils.apk_rebuilder import write_file, write_bytes
+from utils.compression_policy import DEFAULT_POLICY
+from utils.blob_store import file_sha256
+from utils.decompile_cache import DecompileCache
+
+_CHUNK_SIZE = 1024 * 1024
 
 class APKTool:
-    def __init__(self):
+    # apktool options used for every decode; part of the decompile cache key
+    DECODE_FLAGS = ['-f']
+    
+    def __init__(self, cache_folder=None):
         self.apktool_path = self._find_apktool()
         self.java_path = self._find_java()
+        self.timeout = int(os.environ.get('APKTOOL_TIMEOUT', 300))
+        # Warm JVM workers avoid paying JVM startup and framework loading on every call
+        self.pool = get_pool(self.java_path, self._find_jar())
+        
+        # Pristine decoded trees reused when the same APK is uploaded again
+        self.decompile_cache = None
+        if cache_folder:
+            max_bytes = int(os.environ.get('DECOMPILE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+            self.decompile_cache = DecompileCache(os.path.join(cache_folder, 'decompile'), max_bytes)
         
     def _find_apktool(self):
         """Find apktool executable"""
@@ -53,7 +73,65 @@ class APKTool:
         logging.warning("Java not found. Please install Java for APK operations.")
         return None
     
-    def decompile(self, apk_path, output_dir):
+    def _find_jar(self):
+        """Find the apktool jar behind the configured executable"""
+        if not self.apktool_path:
+            return None
+        if self.apktool_path.endswith('.jar'):
+            return self.apktool_path
+        
+        # Wrapper scripts keep apktool.jar next to themselves
+        jar_path = os.path.join(os.path.dirname(os.path.realpath(self.apktool_path)), 'apktool.jar')
+        return jar_path if os.path.exists(jar_path) else None
+    
+    def _run(self, args):
+        """Run an apktool command on a pooled worker, or as a one-shot process"""
+        if self.pool and not self.pool.disabled:
+            try:
+                return self.pool.run(args, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                raise
+            except Exception as e:
+                logging.warning(f"apktool worker unavailable, running one-shot: {str(e)}")
+        
+        if self.apktool_path.endswith('.jar'):
+            cmd = [self.java_path, '-jar', self.apktool_path] + args
+        else:
+            cmd = [self.apktool_path] + args
+        
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        return result.returncode == 0, result.stderr
+    
+    def _tool_version(self):
+        """Fingerprint of the apktool build in use, so an upgrade invalidates cached decodes"""
+        path = self._find_jar() or self.apktool_path
+        stat = os.stat(path)
+        return f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    
+    def _decompile_cached(self, apk_path, output_dir, apk_sha256):
+        """Seed output_dir from the decompile cache, decoding into the cache on a miss"""
+        cache = self.decompile_cache
+        key = cache.make_key(apk_sha256 or file_sha256(apk_path), self._tool_version(), ['d'] + self.DECODE_FLAGS)
+        
+        with cache.key_lock(key):
+            if cache.clone(key, output_dir):
+                logging.info(f"APK decompile served from cache: {apk_path}")
+                return True, ''
+            
+            staging = cache.staging_path(key)
+            success, output = self._run(['d', apk_path, '-o', staging] + self.DECODE_FLAGS)
+            if not success:
+                shutil.rmtree(staging, ignore_errors=True)
+                return False, output
+            
+            if cache.commit(key, staging):
+                cache.clone(key, output_dir)
+            else:
+                shutil.rmtree(output_dir, ignore_errors=True)
+                shutil.move(staging, output_dir)
+            return True, output
+    
+    def decompile(self, apk_path, output_dir, apk_sha256=None):
         """Decompile APK file"""
         try:
             if not self.apktool_path or not self.java_path:
@@ -62,20 +140,17 @@ class APKTool:
             # Create output directory
             os.makedirs(output_dir, exist_ok=True)
             
-            # Build command
-            if self.apktool_path.endswith('.jar'):
-                cmd = [self.java_path, '-jar', self.apktool_path, 'd', apk_path, '-o', output_dir, '-f']
-            else:
-                cmd = [self.apktool_path, 'd', apk_path, '-o', output_dir, '-f']
-            
             # Execute command
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            if self.decompile_cache:
+                success, output = self._decompile_cached(apk_path, output_dir, apk_sha256)
+            else:
+                success, output = self._run(['d', apk_path, '-o', output_dir] + self.DECODE_FLAGS)
             
-            if result.returncode == 0:
+            if success:
                 logging.info(f"APK decompiled successfully: {apk_path}")
                 return True
             else:
-                logging.error(f"APK decompilation failed: {result.stderr}")
+                logging.error(f"APK decompilation failed: {output}")
                 return False
                 
         except subprocess.TimeoutExpired:
@@ -85,26 +160,20 @@ class APKTool:
             logging.error(f"Decompile error: {str(e)}")
             return False
     
-    def compile(self, source_dir, output_apk):
+    def compile(self, source_dir, output_apk, file_index=None):
         """Compile APK from source"""
         try:
             if not self.apktool_path or not self.java_path:
-                return self._simulate_compile(source_dir, output_apk)
-            
-            # Build command
-            if self.apktool_path.endswith('.jar'):
-                cmd = [self.java_path, '-jar', self.apktool_path, 'b', source_dir, '-o', output_apk]
-            else:
-                cmd = [self.apktool_path, 'b', source_dir, '-o', output_apk]
+                return self._simulate_compile(source_dir, output_apk, file_index)
             
             # Execute command
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            success, output = self._run(['b', source_dir, '-o', output_apk])
             
-            if result.returncode == 0:
+            if success:
                 logging.info(f"APK compiled successfully: {output_apk}")
                 return True
             else:
-                logging.error(f"APK compilation failed: {result.stderr}")
+                logging.error(f"APK compilation failed: {output}")
                 return False
                 
         except subprocess.TimeoutExpired:
@@ -206,14 +275,20 @@ class APKTool:
             logging.error(f"Simulate decompile error: {str(e)}")
             return False
     
-    def _simulate_compile(self, source_dir, output_apk):
+    def _simulate_compile(self, source_dir, output_apk, file_index=None):
         """Simulate compilation when apktool is not available"""
         try:
+            # SHA-1s already computed by the build manifest scan are reused instead of re-reading files
+            known_sha1 = {name: entry['sha1'] for name, entry in (file_index or {}).items()}
+            policy = DEFAULT_POLICY
+
+            def add_bytes(arcname, data):
+                write_bytes(zipf, arcname, data, policy.compress_type(arcname), policy.alignment)
             
             # Create a more legitimate APK structure
             with zipfile.ZipFile(output_apk, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zipf:
-                # Track files for manifest
-                file_hashes = {}
+                # Track base64 SHA-1 digests for the manifest and signature file
+                file_digests = {}
                 
                 # Add AndroidManifest.xml first
                 manifest_path = os.path.join(source_dir, 'AndroidManifest.xml')
@@ -223,8 +298,8 @@ class APKTool:
                     
                     # Create proper binary manifest (simplified)
                     binary_manifest = self._create_binary_manifest(manifest_data)
-                    zipf.writestr('AndroidManifest.xml', binary_manifest)
-                    file_hashes['AndroidManifest.xml'] = hashlib.sha1(binary_manifest).hexdigest()
+                    add_bytes('AndroidManifest.xml', binary_manifest)
+                    file_digests['AndroidManifest.xml'] = self._b64_digest(hashlib.sha1(binary_manifest).digest())
                 
                 # Add resources directory structure
                 for root, dirs, files in os.walk(source_dir):
@@ -233,37 +308,39 @@ class APKTool:
                             continue  # Already added
                         
                         file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, source_dir)
+                        arcname = os.path.relpath(file_path, source_dir).replace(os.sep, '/')
                         
                         try:
-                            with open(file_path, 'rb') as f:
-                                file_data = f.read()
-                            
-                            zipf.writestr(arcname, file_data)
-                            file_hashes[arcname] = hashlib.sha1(file_data).hexdigest()
+                            # Stream the file into the archive and hash it in chunks
+                            write_file(zipf, file_path, arcname, policy.compress_type(arcname), policy.alignment)
+                            if arcname in known_sha1:
+                                digest = bytes.fromhex(known_sha1[arcname])
+                            else:
+                                digest = self._sha1_file(file_path)
+                            file_digests[arcname] = self._b64_digest(digest)
                         except Exception as e:
                             logging.warning(f"Could not add file to APK: {arcname}")
                 
                 # Create proper resources.arsc
                 resources_arsc = self._create_resources_arsc()
-                zipf.writestr('resources.arsc', resources_arsc)
-                file_hashes['resources.arsc'] = hashlib.sha1(resources_arsc).hexdigest()
+                add_bytes('resources.arsc', resources_arsc)
+                file_digests['resources.arsc'] = self._b64_digest(hashlib.sha1(resources_arsc).digest())
                 
                 # Create proper classes.dex
                 classes_dex = self._create_classes_dex()
-                zipf.writestr('classes.dex', classes_dex)
-                file_hashes['classes.dex'] = hashlib.sha1(classes_dex).hexdigest()
+                add_bytes('classes.dex', classes_dex)
+                file_digests['classes.dex'] = self._b64_digest(hashlib.sha1(classes_dex).digest())
                 
                 # Create proper META-INF files with real checksums
-                manifest_mf_content = self._create_manifest_mf(file_hashes)
-                zipf.writestr('META-INF/MANIFEST.MF', manifest_mf_content)
+                manifest_mf_content, sections = self._create_manifest_mf(file_digests)
+                add_bytes('META-INF/MANIFEST.MF', manifest_mf_content)
                 
-                cert_sf_content = self._create_cert_sf(file_hashes, manifest_mf_content)
-                zipf.writestr('META-INF/CERT.SF', cert_sf_content)
+                cert_sf_content = self._create_cert_sf(sections, manifest_mf_content)
+                add_bytes('META-INF/CERT.SF', cert_sf_content)
                 
                 # Create proper certificate
                 cert_rsa = self._create_cert_rsa()
-                zipf.writestr('META-INF/CERT.RSA', cert_rsa)
+                add_bytes('META-INF/CERT.RSA', cert_rsa)
             
             logging.info("Enhanced simulated compilation completed (APKTool not available)")
             return True
@@ -272,6 +349,18 @@ class APKTool:
             logging.error(f"Simulate compile error: {str(e)}")
             return False
     
+    def _sha1_file(self, path):
+        """Calculate a file's SHA-1 digest using chunked reads"""
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                sha1.update(chunk)
+        return sha1.digest()
+    
+    def _b64_digest(self, digest):
+        """Encode a raw digest the way JAR manifests expect"""
+        return base64.b64encode(digest).decode()
+    
     def _create_binary_manifest(self, xml_data):
         """Create a simplified binary manifest"""
         # Simple binary XML header for Android
@@ -333,48 +422,43 @@ class APKTool:
         dex_data[map_offset:map_offset+4] = (1).to_bytes(4, 'little')  # map size
         
         # Calculate and set checksum
-        checksum = self._calculate_adler32(dex_data[12:])
+        checksum = self._calculate_adler32(memoryview(dex_data)[12:])
         dex_data[8:12] = checksum.to_bytes(4, 'little')
         
         return bytes(dex_data)
     
     def _calculate_adler32(self, data):
         """Calculate Adler-32 checksum"""
-        a, b = 1, 0
-        for byte in data:
-            a = (a + byte) % 65521
-            b = (b + a) % 65521
-        return (b << 16) | a
+        return zlib.adler32(data) & 0xffffffff
     
-    def _create_manifest_mf(self, file_hashes):
-        """Create proper MANIFEST.MF with real hashes"""
+    def _create_manifest_mf(self, file_digests):
+        """Create proper MANIFEST.MF with real hashes, returning it with its per-file sections"""
         manifest_content = "Manifest-Version: 1.0\r\n"
         manifest_content += "Created-By: APK Editor Enhanced\r\n"
         manifest_content += "\r\n"
         
-        for filename, file_hash in file_hashes.items():
-            manifest_content += f"Name: {filename}\r\n"
-            manifest_content += f"SHA1-Digest: {base64.b64encode(bytes.fromhex(file_hash)).decode()}\r\n"
-            manifest_content += "\r\n"
+        sections = {}
+        for filename, digest in file_digests.items():
+            sections[filename] = f"Name: {filename}\r\nSHA1-Digest: {digest}\r\n\r\n"
         
-        return manifest_content.encode('utf-8')
+        manifest_content += ''.join(sections.values())
+        return manifest_content.encode('utf-8'), sections
     
-    def _create_cert_sf(self, file_hashes, manifest_mf_content):
+    def _create_cert_sf(self, sections, manifest_mf_content):
         """Create proper CERT.SF file"""
-        manifest_hash = hashlib.sha1(manifest_mf_content).hexdigest()
+        manifest_digest = self._b64_digest(hashlib.sha1(manifest_mf_content).digest())
         
         cert_content = "Signature-Version: 1.0\r\n"
         cert_content += "Created-By: APK Editor Enhanced\r\n"
-        cert_content += f"SHA1-Digest-Manifest: {base64.b64encode(bytes.fromhex(manifest_hash)).decode()}\r\n"
+        cert_content += f"SHA1-Digest-Manifest: {manifest_digest}\r\n"
         cert_content += "\r\n"
         
-        for filename, file_hash in file_hashes.items():
-            # Create section hash (simplified)
-            section_content = f"Name: {filename}\r\nSHA1-Digest: {base64.b64encode(bytes.fromhex(file_hash)).decode()}\r\n\r\n"
-            section_hash = hashlib.sha1(section_content.encode()).hexdigest()
+        # Each entry signs the exact manifest section text built for MANIFEST.MF
+        for filename, section_content in sections.items():
+            section_digest = self._b64_digest(hashlib.sha1(section_content.encode('utf-8')).digest())
             
             cert_content += f"Name: {filename}\r\n"
-            cert_content += f"SHA1-Digest: {base64.b64encode(bytes.fromhex(section_hash)).decode()}\r\n"
+            cert_content += f"SHA1-Digest: {section_digest}\r\n"
             cert_content += "\r\n"
         
         return cert_content.encode('utf-8')
@@ -0,0 +1,193 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+import subprocess
+from collections import deque
+
+# Worker shim kept next to the bundled apktool jar/scripts
+WORKER_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'tools', 'ApktoolWorker.java')
+
+# Same JVM options the bundled apktool launcher uses
+JVM_OPTIONS = [
+    '-Xmx1024M',
+    '-Duser.language=en',
+    '-Dfile.encoding=UTF8',
+    '-Djdk.util.zip.disableZip64ExtraFieldValidation=true',
+    '-Djdk.nio.zipfs.allowDotZipEntry=true'
+]
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ApktoolWorker:
+    """A single warm JVM running apktool jobs sent over stdin"""
+
+    def __init__(self, java_path, jar_path, start_timeout=60):
+        cmd = [java_path] + JVM_OPTIONS + ['-cp', jar_path, WORKER_SOURCE]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, text=True, encoding='utf-8',
+                                        errors='replace', bufsize=1)
+        self.jobs = 0
+        self._replies = queue.Queue()
+        self._output = deque(maxlen=200)
+
+        # Pipes are drained on threads so a chatty job cannot block the JVM on a full pipe
+        threading.Thread(target=self._read_replies, daemon=True).start()
+        threading.Thread(target=self._read_output, daemon=True).start()
+
+        if self._next_reply(start_timeout) != 'READY':
+            self.close()
+            raise RuntimeError(f"apktool worker failed to start: {self.output()}")
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, args, timeout):
+        """Run one apktool command and return (success, output)"""
+        self._output.clear()
+        self.process.stdin.write('\t'.join(args) + '\n')
+        self.process.stdin.flush()
+
+        reply = self._next_reply(timeout)
+        self.jobs += 1
+        if reply is None:
+            # apktool calls System.exit on most errors, which takes the worker down with it
+            return False, self.output()
+        return reply == 'DONE 0', self.output()
+
+    def output(self):
+        """Return what apktool printed for the current job"""
+        return '\n'.join(self._output)
+
+    def close(self):
+        """Stop the worker JVM"""
+        try:
+            if self.process.stdin:
+                self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+
+    def _next_reply(self, timeout):
+        try:
+            return self._replies.get(timeout=timeout)
+        except queue.Empty:
+            self.process.kill()
+            raise subprocess.TimeoutExpired(self.process.args, timeout)
+
+    def _read_replies(self):
+        for line in self.process.stdout:
+            self._replies.put(line.rstrip('\n'))
+        self._replies.put(None)
+
+    def _read_output(self):
+        for line in self.process.stderr:
+            self._output.append(line.rstrip('\n'))
+
+
+class ApktoolPool:
+    """Fixed-size pool of warm apktool JVMs, recycled after max_jobs jobs or a crash"""
+
+    def __init__(self, java_path, jar_path, size=2, max_jobs=50, timeout=300):
+        self.java_path = java_path
+        self.jar_path = jar_path
+        self.size = size
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.disabled = False
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(size)
+
+    def warm(self):
+        """Start one worker in the background so the first job skips JVM startup"""
+        def start():
+            try:
+                worker = ApktoolWorker(self.java_path, self.jar_path)
+                with self._lock:
+                    self._idle.append(worker)
+            except Exception as e:
+                self._disable(e)
+
+        threading.Thread(target=start, daemon=True).start()
+
+    def run(self, args, timeout=None):
+        """Run apktool with args on a pooled worker and return (success, output)"""
+        if self.disabled:
+            raise RuntimeError("apktool worker pool is disabled")
+        if any('\t' in arg or '\n' in arg for arg in args):
+            raise ValueError("apktool arguments cannot be sent to a worker")
+
+        timeout = timeout or self.timeout
+        with self._slots:
+            worker = self._acquire()
+            try:
+                success, output = worker.run(args, timeout)
+            except Exception:
+                worker.close()
+                raise
+            self._release(worker)
+            return success, output
+
+    def shutdown(self):
+        """Stop all idle workers"""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.close()
+
+    def _acquire(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive:
+                    return worker
+        try:
+            return ApktoolWorker(self.java_path, self.jar_path)
+        except Exception as e:
+            self._disable(e)
+            raise
+
+    def _release(self, worker):
+        if not worker.alive or worker.jobs >= self.max_jobs:
+            logging.info(f"Recycling apktool worker after {worker.jobs} jobs")
+            worker.close()
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def _disable(self, error):
+        # Usually a Java older than 11 (no source-file launch) or an unusable jar
+        if not self.disabled:
+            logging.warning(f"apktool worker pool disabled, falling back to one-shot runs: {str(error)}")
+        self.disabled = True
+
+
+def get_pool(java_path, jar_path):
+    """Return the shared pool for this java/apktool pair, or None when pooling is off"""
+    size = int(os.environ.get('APKTOOL_POOL_SIZE', 2))
+    if size <= 0 or not java_path or not jar_path or not os.path.exists(WORKER_SOURCE):
+        return None
+
+    key = (java_path, os.path.abspath(jar_path))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ApktoolPool(java_path, key[1], size=size,
+                               max_jobs=int(os.environ.get('APKTOOL_WORKER_MAX_JOBS', 50)),
+                               timeout=int(os.environ.get('APKTOOL_TIMEOUT', 300)))
+            pool.warm()
+            _pools[key] = pool
+        return pool
+
+
+@atexit.register
+def _shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
@@ -0,0 +1,129 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+
+_CHUNK_SIZE = 1024 * 1024
+
+# One lock per store folder, shared by every BlobStore instance in the process
+_locks = {}
+_locks_guard = threading.Lock()
+
+# Digests of served files, keyed by path, size and mtime so a rebuild invalidates them
+_digest_cache = {}
+_digest_cache_lock = threading.Lock()
+_DIGEST_CACHE_ENTRIES = 256
+
+
+def file_sha256(path):
+    """Calculate a file's SHA-256 using chunked reads"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def cached_file_sha256(path):
+    """file_sha256, remembered until the file's size or mtime changes"""
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    with _digest_cache_lock:
+        digest = _digest_cache.get(key)
+    if digest is None:
+        digest = file_sha256(path)
+        with _digest_cache_lock:
+            if len(_digest_cache) >= _DIGEST_CACHE_ENTRIES:
+                _digest_cache.pop(next(iter(_digest_cache)))
+            _digest_cache[key] = digest
+    return digest
+
+
+class BlobStore:
+    """Content-addressed APK store; projects get hardlinks and blobs are reference counted"""
+
+    REFS_FILENAME = 'refs.json'
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.refs_path = os.path.join(self.root, self.REFS_FILENAME)
+        os.makedirs(self.root, exist_ok=True)
+        with _locks_guard:
+            self._lock = _locks.setdefault(self.root, threading.Lock())
+
+    def blob_path(self, digest):
+        """Path of the blob holding content with this SHA-256"""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def store(self, source_path, dest_path, digest=None):
+        """Place source_path's content at dest_path through the store and return its SHA-256"""
+        digest = digest or file_sha256(source_path)
+        blob = self.blob_path(digest)
+
+        with self._lock:
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                self._link_or_copy(source_path, blob)
+            else:
+                logging.info(f"Reusing stored blob {digest[:12]} for {os.path.basename(source_path)}")
+
+            if os.path.lexists(dest_path):
+                os.remove(dest_path)
+            self._link_or_copy(blob, dest_path)
+
+            refs = self._load_refs()
+            paths = refs.setdefault(digest, [])
+            dest = os.path.abspath(dest_path)
+            if dest not in paths:
+                paths.append(dest)
+            self._save_refs(refs)
+
+        return digest
+
+    def release(self, dest_path):
+        """Drop dest_path's reference, deleting the blob once nothing links to it"""
+        dest = os.path.abspath(dest_path)
+        with self._lock:
+            refs = self._load_refs()
+            for digest, paths in list(refs.items()):
+                if dest not in paths:
+                    continue
+
+                paths.remove(dest)
+                if not paths:
+                    del refs[digest]
+                    try:
+                        os.remove(self.blob_path(digest))
+                        logging.info(f"Blob removed: {digest[:12]}")
+                    except FileNotFoundError:
+                        pass
+                self._save_refs(refs)
+                return True
+        return False
+
+    def _link_or_copy(self, source, dest):
+        """Hardlink dest to source, copying when the filesystem cannot link"""
+        try:
+            os.link(source, dest)
+        except OSError:
+            temp_path = dest + '.tmp'
+            shutil.copy2(source, temp_path)
+            os.replace(temp_path, dest)
+
+    def _load_refs(self):
+        try:
+            with open(self.refs_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.error(f"Unreadable blob reference file, starting empty: {str(e)}")
+            return {}
+
+    def _save_refs(self, refs):
+        temp_path = self.refs_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(refs, f)
+        os.replace(temp_path, self.refs_path)
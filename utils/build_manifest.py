@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+import zlib
+import logging
+from datetime import datetime
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class BuildManifest:
+    """Per-project record of the decompiled tree as of the last successful compile"""
+
+    FILENAME = 'build_manifest.json'
+
+    def __init__(self, project_dir, ignored_dirs=()):
+        self.project_dir = project_dir
+        # Top-level folders the build tool writes into (e.g. apktool's build/) are not inputs
+        self.ignored_dirs = set(ignored_dirs)
+        self.decompiled_dir = os.path.join(project_dir, 'decompiled')
+        self.manifest_path = os.path.join(project_dir, self.FILENAME)
+
+    def load(self):
+        """Load the manifest written by the last successful compile"""
+        try:
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable build manifest: {str(e)}")
+        return {}
+
+    def scan(self, previous=None):
+        """Describe every file under decompiled/, hashing only files whose size or mtime moved"""
+        known = (previous or {}).get('files', {})
+        files = {}
+
+        for arcname, stat in self._walk(self.decompiled_dir, ''):
+            entry = known.get(arcname)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                files[arcname] = entry
+                continue
+
+            crc, sha1 = self._hash_file(os.path.join(self.decompiled_dir, arcname))
+            files[arcname] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'crc32': crc,
+                'sha1': sha1
+            }
+
+        return files
+
+    def is_current(self, previous, files, outputs):
+        """Check whether the tree is unchanged since the last compile and its outputs still exist"""
+        if not previous or not outputs:
+            return False
+
+        if not all(os.path.exists(os.path.join(self.project_dir, name)) for name in outputs):
+            return False
+
+        known = previous.get('files', {})
+        if known.keys() != files.keys():
+            return False
+
+        return all(known[name]['sha1'] == entry['sha1'] for name, entry in files.items())
+
+    def save(self, files):
+        """Persist the tree state used by a successful compile"""
+        manifest = {
+            'compiled_at': datetime.now().isoformat(),
+            'files': files
+        }
+
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self.manifest_path)
+
+    def changed_files(self, previous, files):
+        """List archive names added or modified since the last compile"""
+        known = previous.get('files', {}) if previous else {}
+        return [name for name, entry in files.items()
+                if name not in known or known[name]['sha1'] != entry['sha1']]
+
+    def _walk(self, directory, prefix):
+        """Yield (archive name, stat result) for every file under directory"""
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    arcname = prefix + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if not prefix and entry.name in self.ignored_dirs:
+                            continue
+                        yield from self._walk(entry.path, arcname + '/')
+                    elif entry.is_file():
+                        yield arcname, entry.stat()
+        except FileNotFoundError:
+            return
+
+    def _hash_file(self, path):
+        """Calculate the ZIP CRC-32 and SHA-1 of a file in one chunked pass"""
+        crc = 0
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+                sha1.update(chunk)
+        return crc & 0xffffffff, sha1.hexdigest()
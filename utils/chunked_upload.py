@@ -0,0 +1,200 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+import zipfile
+from datetime import datetime
+
+_CHUNK_SIZE = 1024 * 1024
+_LOCAL_FILE_HEADER = b'PK\x03\x04'
+
+
+class UploadError(Exception):
+    """Rejected upload request; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class _UploadSession:
+    """In-memory state of one resumable upload"""
+
+    def __init__(self, state):
+        self.state = state
+        self.lock = threading.Lock()
+        self.sha256 = None
+
+
+class ChunkedUploads:
+    """Resumable uploads streamed to disk, hashed and checked as the bytes arrive"""
+
+    def __init__(self, upload_folder, max_size=2 * 1024 ** 3, min_size=1000):
+        self.partial_folder = os.path.join(upload_folder, 'partial')
+        self.max_size = max_size
+        self.min_size = min_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.partial_folder, exist_ok=True)
+
+    def create(self, filename, size=None):
+        """Start an upload and return its state"""
+        if size is not None and not (self.min_size <= size <= self.max_size):
+            raise UploadError(f"APK size must be between {self.min_size} and {self.max_size} bytes", 413)
+
+        state = {
+            'id': str(uuid.uuid4()),
+            'filename': filename,
+            'size': size,
+            'offset': 0,
+            'created_at': datetime.now().isoformat()
+        }
+        session = _UploadSession(state)
+        session.sha256 = hashlib.sha256()
+        open(self._data_path(state['id']), 'wb').close()
+        self._save_state(state)
+
+        with self._lock:
+            self._sessions[state['id']] = session
+        logging.info(f"Chunked upload started: {filename} ({state['id']})")
+        return dict(state)
+
+    def status(self, upload_id):
+        """Return an upload's state, including the offset to resume from"""
+        return dict(self._session(upload_id).state)
+
+    def write_chunk(self, upload_id, offset, stream):
+        """Append bytes read from stream at offset and return the new offset"""
+        session = self._session(upload_id)
+        with session.lock:
+            state = session.state
+            if offset != state['offset']:
+                raise UploadError(f"Expected offset {state['offset']}", 409, offset=state['offset'])
+
+            self._resume_hash(session)
+            data_path = self._data_path(upload_id)
+            written = 0
+            try:
+                with open(data_path, 'r+b') as f:
+                    f.seek(offset)
+                    while True:
+                        chunk = stream.read(_CHUNK_SIZE)
+                        if not chunk:
+                            break
+
+                        # Reject non-ZIP data with the first bytes instead of after the whole file
+                        if offset + written < len(_LOCAL_FILE_HEADER):
+                            head = chunk[:len(_LOCAL_FILE_HEADER) - offset - written]
+                            if head != _LOCAL_FILE_HEADER[offset + written:offset + written + len(head)]:
+                                raise UploadError("Not an APK (missing ZIP header)", 415)
+                        if offset + written + len(chunk) > (state['size'] or self.max_size):
+                            raise UploadError("Upload is larger than announced", 413)
+
+                        f.write(chunk)
+                        session.sha256.update(chunk)
+                        written += len(chunk)
+            finally:
+                # Whatever reached the disk counts, so a dropped connection resumes after it
+                if written:
+                    state['offset'] = offset + written
+                    self._save_state(state)
+
+            return state['offset']
+
+    def complete(self, upload_id):
+        """Verify a finished upload and return (path, sha256); the caller takes ownership of the file"""
+        session = self._session(upload_id)
+        with session.lock:
+            state = session.state
+            if state['size'] is not None and state['offset'] != state['size']:
+                raise UploadError(f"Upload incomplete: {state['offset']} of {state['size']} bytes", 409,
+                                  offset=state['offset'])
+            if state['offset'] < self.min_size:
+                raise UploadError("APK file is too small", 400)
+
+            data_path = self._data_path(upload_id)
+            self._check_central_directory(data_path, state['offset'])
+            self._resume_hash(session)
+            digest = session.sha256.hexdigest()
+
+            os.remove(self._state_path(upload_id))
+            with self._lock:
+                self._sessions.pop(upload_id, None)
+
+        logging.info(f"Chunked upload complete: {state['filename']} ({state['offset']} bytes)")
+        return data_path, digest
+
+    def discard(self, upload_id):
+        """Drop an upload and its partial data"""
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+        for path in (self._data_path(upload_id), self._state_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _session(self, upload_id):
+        try:
+            uuid.UUID(upload_id)
+        except ValueError:
+            raise UploadError("Upload not found", 404)
+
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                # Resuming after a restart: the state survives on disk, the hash is rebuilt lazily
+                try:
+                    with open(self._state_path(upload_id), 'r') as f:
+                        session = _UploadSession(json.load(f))
+                except FileNotFoundError:
+                    raise UploadError("Upload not found", 404)
+                self._sessions[upload_id] = session
+            return session
+
+    def _resume_hash(self, session):
+        """Rebuild the running SHA-256 from the bytes already on disk"""
+        if session.sha256 is not None:
+            return
+        state = session.state
+        sha256 = hashlib.sha256()
+        remaining = state['offset']
+        with open(self._data_path(state['id']), 'rb') as f:
+            while remaining > 0:
+                chunk = f.read(min(_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                remaining -= len(chunk)
+        session.sha256 = sha256
+
+    def _check_central_directory(self, data_path, size):
+        """Validate the ZIP end record and central directory bounds from the file's tail"""
+        with open(data_path, 'r+b') as f:
+            # Drop any bytes past the acknowledged offset left by an interrupted chunk
+            f.truncate(size)
+            endrec = zipfile._EndRecData(f)
+            if not endrec:
+                raise UploadError("Not an APK (no ZIP central directory)", 415)
+
+            cd_size = endrec[zipfile._ECD_SIZE]
+            cd_offset = endrec[zipfile._ECD_OFFSET]
+            if endrec[zipfile._ECD_ENTRIES_TOTAL] == 0 or cd_offset + cd_size > size:
+                raise UploadError("Corrupt APK central directory", 415)
+
+            f.seek(cd_offset)
+            if f.read(4) != zipfile.stringCentralDir:
+                raise UploadError("Corrupt APK central directory", 415)
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.partial_folder, f"{upload_id}.part")
+
+    def _state_path(self, upload_id):
+        return os.path.join(self.partial_folder, f"{upload_id}.json")
+
+    def _save_state(self, state):
+        temp_path = self._state_path(state['id']) + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self._state_path(state['id']))
@@ -0,0 +1,42 @@
+import os
+import zipfile
+
+# Already-compressed formats gain nothing from deflate; storing them makes rebuilds cheaper
+# and lets the device mmap them straight out of the APK
+DEFAULT_STORED_EXTENSIONS = (
+    '.png', '.jpg', '.jpeg', '.gif', '.webp',
+    '.ogg', '.mp3', '.m4a', '.aac', '.mp4', '.3gp', '.webm', '.mkv', '.amr', '.flac',
+    '.zip', '.jar', '.apk', '.gz', '.7z'
+)
+DEFAULT_STORED_NAMES = ('resources.arsc',)
+
+
+class CompressionPolicy:
+    """Pick STORED or DEFLATED per archive entry and the alignment of stored data"""
+
+    def __init__(self, stored_extensions=DEFAULT_STORED_EXTENSIONS, stored_names=DEFAULT_STORED_NAMES,
+                 alignment=4, default=zipfile.ZIP_DEFLATED):
+        self.stored_extensions = tuple(ext.lower() for ext in stored_extensions)
+        self.stored_names = set(stored_names)
+        self.alignment = alignment
+        self.default = default
+
+    @classmethod
+    def from_env(cls):
+        """Build the policy, letting APK_STORED_EXTENSIONS / APK_ALIGNMENT override the defaults"""
+        extensions = os.environ.get('APK_STORED_EXTENSIONS')
+        if extensions is not None:
+            stored_extensions = [ext.strip() if ext.strip().startswith('.') else '.' + ext.strip()
+                                 for ext in extensions.split(',') if ext.strip()]
+        else:
+            stored_extensions = DEFAULT_STORED_EXTENSIONS
+        return cls(stored_extensions, alignment=int(os.environ.get('APK_ALIGNMENT', 4)))
+
+    def compress_type(self, arcname):
+        """Compression method for an archive entry"""
+        if arcname in self.stored_names or arcname.lower().endswith(self.stored_extensions):
+            return zipfile.ZIP_STORED
+        return self.default
+
+
+DEFAULT_POLICY = CompressionPolicy.from_env()
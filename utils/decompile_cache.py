@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl that makes a copy-on-write clone of a whole file (btrfs, XFS, bcachefs)
+_FICLONE = 0x40049409
+
+# Parts of a decoded tree the editor rewrites in place; these are never hardlinked,
+# so an edit can never reach the cached tree through a shared inode
+_EDITABLE_DIRS = ('res',)
+
+
+class DecompileCache:
+    """Pristine decoded trees keyed by APK hash, decoder version and flags, evicted LRU by size"""
+
+    INDEX_FILENAME = 'index.json'
+
+    def __init__(self, root, max_bytes=2 * 1024 ** 3):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.root, self.INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._reflink = fcntl is not None
+        os.makedirs(self.root, exist_ok=True)
+
+    def make_key(self, apk_sha256, tool_version, flags):
+        """Build a cache key from the APK digest, decoder fingerprint and decode flags"""
+        raw = '\0'.join([apk_sha256, tool_version] + list(flags))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def key_lock(self, key):
+        """Lock serializing decodes of the same key, so concurrent uploads decode once"""
+        with self._lock:
+            # Reentrant, so clone() can take it again under a decode already holding it
+            return self._key_locks.setdefault(key, threading.RLock())
+
+    def tree_path(self, key):
+        return os.path.join(self.root, key)
+
+    def has(self, key):
+        return os.path.isdir(self.tree_path(key))
+
+    def staging_path(self, key):
+        """Fresh directory to decode into before calling commit()"""
+        staging = os.path.join(self.root, f"{key}.tmp")
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        return staging
+
+    def commit(self, key, staging):
+        """Publish a decoded tree and evict older entries beyond max_bytes"""
+        size = self._tree_size(staging)
+        if size > self.max_bytes:
+            logging.info(f"Decoded tree too large to cache ({size} bytes)")
+            return False
+
+        os.replace(staging, self.tree_path(key))
+        with self._lock:
+            index = self._load_index()
+            index[key] = {'size': size, 'last_used': time.time()}
+            self._evict(index, keep=key)
+            self._save_index(index)
+        return True
+
+    def clone(self, key, dest):
+        """Seed dest with a cached tree; returns False on a miss"""
+        # Held while linking, so eviction cannot remove the tree halfway through
+        with self.key_lock(key):
+            source = self.tree_path(key)
+            if not os.path.isdir(source):
+                return False
+
+            if os.path.exists(dest):
+                shutil.rmtree(dest)
+            self._clone_tree(source, dest, editable=False, top=True)
+
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                index[key]['last_used'] = time.time()
+                self._save_index(index)
+        return True
+
+    def _clone_tree(self, source, dest, editable, top=False):
+        os.makedirs(dest, exist_ok=True)
+        with os.scandir(source) as entries:
+            for entry in entries:
+                target = os.path.join(dest, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    self._clone_tree(entry.path, target, editable or (top and entry.name in _EDITABLE_DIRS))
+                elif top or editable:
+                    # Top-level files (AndroidManifest.xml, apktool.yml) and res/ are edited in place
+                    self._clone_file(entry.path, target)
+                else:
+                    self._link_file(entry.path, target)
+
+    def _reflink_file(self, source, dest):
+        """Copy-on-write clone a file where the filesystem supports it"""
+        if not self._reflink:
+            return False
+        try:
+            with open(source, 'rb') as src, open(dest, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            shutil.copystat(source, dest)
+            return True
+        except OSError as e:
+            if os.path.exists(dest):
+                os.remove(dest)
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+                raise
+            # Remember the filesystem cannot reflink and stop trying
+            self._reflink = False
+            return False
+
+    def _clone_file(self, source, dest):
+        if not self._reflink_file(source, dest):
+            shutil.copy2(source, dest)
+
+    def _link_file(self, source, dest):
+        if self._reflink_file(source, dest):
+            return
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copy2(source, dest)
+
+    def _evict(self, index, keep):
+        """Drop least recently used trees until the cache fits in max_bytes"""
+        total = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            # self._lock is held and clone() takes it after the key lock, so never wait here;
+            # a key being cloned or decoded is left for a later eviction
+            key_lock = self._key_locks.setdefault(key, threading.RLock())
+            if not key_lock.acquire(blocking=False):
+                continue
+            try:
+                shutil.rmtree(self.tree_path(key), ignore_errors=True)
+                total -= index.pop(key)['size']
+            finally:
+                key_lock.release()
+            logging.info(f"Evicted decompile cache entry {key[:12]}")
+
+    def _tree_size(self, directory):
+        total = 0
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                total += os.path.getsize(os.path.join(root, name))
+        return total
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {}
+        except Exception as e:
+            logging.error(f"Unreadable decompile cache index, starting empty: {str(e)}")
+            index = {}
+        # Entries whose tree vanished are dropped
+        return {key: entry for key, entry in index.items() if os.path.isdir(self.tree_path(key))}
+
+    def _save_index(self, index):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temp_path, self.index_path)
@@ -1,70 +1,105 @@
 import os
-import json
 import shutil
 import logging
+from contextlib import contextmanager
 from datetime import datetime
+from utils.project_index import ProjectIndex
+from utils.metadata_store import MetadataStore
 
 class FileManager:
-    def __init__(self, projects_folder):
+    def __init__(self, projects_folder, blob_store=None):
         self.projects_folder = projects_folder
+        self.blob_store = blob_store
         os.makedirs(projects_folder, exist_ok=True)
-    
-    def list_projects(self):
-        """List all projects"""
-        projects = []
+        self.index = ProjectIndex(projects_folder)
+        self.metadata = MetadataStore(projects_folder)
         
+        # First run against an existing projects folder: build the index once
+        if self.index.created:
+            self.rebuild_index()
+    
+    def list_projects(self, offset=0, limit=None, sort='created_at', descending=True):
+        """List projects from the index, one page at a time"""
         try:
-            for project_id in os.listdir(self.projects_folder):
-                project_path = os.path.join(self.projects_folder, project_id)
-                if os.path.isdir(project_path):
-                    metadata_path = os.path.join(project_path, 'metadata.json')
-                    if os.path.exists(metadata_path):
-                        with open(metadata_path, 'r') as f:
-                            metadata = json.load(f)
-                        
-                        # Add calculated fields
-                        metadata['size'] = self._get_directory_size(project_path)
-                        metadata['has_compiled'] = os.path.exists(os.path.join(project_path, 'compiled.apk'))
-                        metadata['has_signed'] = os.path.exists(os.path.join(project_path, 'signed.apk'))
-                        
-                        projects.append(metadata)
-            
-            # Sort by creation date (newest first)
-            projects.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            
+            return self.index.list(offset=offset, limit=limit, sort=sort, descending=descending)
         except Exception as e:
             logging.error(f"Error listing projects: {str(e)}")
-        
-        return projects
+            return []
+    
+    def count_projects(self):
+        """Count indexed projects"""
+        try:
+            return self.index.count()
+        except Exception as e:
+            logging.error(f"Error counting projects: {str(e)}")
+            return 0
     
     def get_project(self, project_id):
         """Get project metadata"""
         try:
-            project_path = os.path.join(self.projects_folder, project_id)
-            metadata_path = os.path.join(project_path, 'metadata.json')
-            
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r') as f:
-                    metadata = json.load(f)
-                
-                # Add calculated fields
-                metadata['size'] = self._get_directory_size(project_path)
-                metadata['has_compiled'] = os.path.exists(os.path.join(project_path, 'compiled.apk'))
-                metadata['has_signed'] = os.path.exists(os.path.join(project_path, 'signed.apk'))
-                
-                return metadata
+            if self.metadata.exists(project_id):
+                project = self.index.get(project_id)
+                if project is None:
+                    project = self.index_project(project_id)
+                return project
             
         except Exception as e:
             logging.error(f"Error getting project: {str(e)}")
         
         return None
     
+    def index_project(self, project_id):
+        """Refresh a project's index row from its metadata and files"""
+        try:
+            project_path = os.path.join(self.projects_folder, project_id)
+            metadata = self.metadata.load(project_id)
+            if metadata is None:
+                self.index.remove(project_id)
+                return None
+            
+            metadata.setdefault('id', project_id)
+            
+            size = self._get_directory_size(project_path)
+            has_compiled = os.path.exists(os.path.join(project_path, 'compiled.apk'))
+            has_signed = os.path.exists(os.path.join(project_path, 'signed.apk'))
+            self.index.upsert(metadata, size, has_compiled, has_signed)
+            
+            metadata['size'] = size
+            metadata['has_compiled'] = has_compiled
+            metadata['has_signed'] = has_signed
+            return metadata
+            
+        except Exception as e:
+            logging.error(f"Error indexing project {project_id}: {str(e)}")
+            return None
+    
+    def rebuild_index(self):
+        """Re-index every project folder and drop rows for projects that are gone"""
+        project_ids = set()
+        try:
+            for project_id in os.listdir(self.projects_folder):
+                if self.metadata.exists(project_id):
+                    project_ids.add(project_id)
+                    self.index_project(project_id)
+            
+            for project_id in self.index.ids() - project_ids:
+                self.index.remove(project_id)
+            
+            logging.info(f"Project index rebuilt: {len(project_ids)} projects")
+        except Exception as e:
+            logging.error(f"Error rebuilding project index: {str(e)}")
+    
     def delete_project(self, project_id):
         """Delete a project"""
         try:
             project_path = os.path.join(self.projects_folder, project_id)
             if os.path.exists(project_path):
+                # original.apk is a link into the blob store, drop its reference first
+                if self.blob_store:
+                    self.blob_store.release(os.path.join(project_path, 'original.apk'))
                 shutil.rmtree(project_path)
+                self.index.remove(project_id)
+                self.metadata.forget(project_id)
                 logging.info(f"Project deleted: {project_id}")
                 return True
             
@@ -76,21 +111,19 @@ class FileManager:
     def update_project_metadata(self, project_id, updates):
         """Update project metadata"""
         try:
-            project_path = os.path.join(self.projects_folder, project_id)
-            metadata_path = os.path.join(project_path, 'metadata.json')
+            metadata_path = self.metadata.path(project_id)
             
             if os.path.exists(metadata_path):
-                with open(metadata_path, 'r') as f:
-                    metadata = json.load(f)
-                
-                # Update fields
-                metadata.update(updates)
-                metadata['updated_at'] = datetime.now().isoformat()
-                
-                # Save updated metadata
-                with open(metadata_path, 'w') as f:
-                    json.dump(metadata, f, indent=2)
+                # Update fields; locked and written atomically by the metadata store
+                updates = dict(updates, updated_at=datetime.now().isoformat())
+                with self.track_size(project_id, metadata_path):
+                    metadata = self.metadata.update(project_id, updates)
+                if metadata is None:
+                    return False
                 
+                metadata.setdefault('id', project_id)
+                if not self.index.update_metadata(metadata):
+                    self.index_project(project_id)
                 logging.info(f"Project metadata updated: {project_id}")
                 return True
             
@@ -99,15 +132,60 @@ class FileManager:
         
         return False
     
+    @contextmanager
+    def track_size(self, project_id, *paths):
+        """Apply the size change of files/folders written, replaced or deleted inside the block"""
+        before = sum(self._path_size(path) for path in paths)
+        try:
+            yield
+        finally:
+            try:
+                delta = sum(self._path_size(path) for path in paths) - before
+                self.index.adjust_size(project_id, delta)
+            except Exception as e:
+                logging.error(f"Error updating project size: {str(e)}")
+    
+    def refresh_outputs(self, project_id):
+        """Re-check which build outputs exist for a project"""
+        try:
+            project_path = os.path.join(self.projects_folder, project_id)
+            self.index.set_outputs(project_id,
+                                   os.path.exists(os.path.join(project_path, 'compiled.apk')),
+                                   os.path.exists(os.path.join(project_path, 'signed.apk')))
+        except Exception as e:
+            logging.error(f"Error updating project outputs: {str(e)}")
+    
+    def reconcile_size(self, project_id):
+        """Recount a project's size from disk, correcting any drift in the recorded value"""
+        size = self._get_directory_size(os.path.join(self.projects_folder, project_id))
+        try:
+            self.index.set_size(project_id, size)
+        except Exception as e:
+            logging.error(f"Error reconciling project size: {str(e)}")
+        return size
+    
+    def _path_size(self, path):
+        """Size of a file, or of everything under a folder; 0 if it does not exist"""
+        try:
+            if os.path.isdir(path):
+                return self._get_directory_size(path)
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+    
     def _get_directory_size(self, directory):
         """Calculate directory size"""
         total_size = 0
         try:
-            for dirpath, dirnames, filenames in os.walk(directory):
-                for filename in filenames:
-                    filepath = os.path.join(dirpath, filename)
-                    if os.path.exists(filepath):
-                        total_size += os.path.getsize(filepath)
+            # scandir reuses the stat data from the directory listing where the platform provides it
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        total_size += self._get_directory_size(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total_size += entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logging.error(f"Error calculating directory size: {str(e)}")
         
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.generation_stream import GenerationStream
+
+DEFAULT_BASE_URL = 'https://generativelanguage.googleapis.com/v1beta'
+DEFAULT_MODEL = 'gemini-1.5-flash'
+DUMMY_API_KEY = 'AIzaSyDummy_Key_Replace_With_Real_Key'
+
+
+class GeminiError(Exception):
+    """Raised when the Gemini API cannot produce a response"""
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so prompts differing only in formatting share a cache entry"""
+    return ' '.join(prompt.split())
+
+
+class ResponseCache:
+    """Generated texts on disk keyed by prompt, model and config, expired by TTL and evicted LRU by size"""
+
+    def __init__(self, root, ttl=7 * 24 * 3600, max_bytes=64 * 1024 ** 2):
+        self.root = os.path.abspath(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached text, or None on a miss or an expired entry"""
+        path = self.path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Dropping unreadable AI response cache entry {key[:12]}: {str(e)}")
+            self._remove(path)
+            return None
+
+        if time.time() - entry.get('created_at', 0) > self.ttl:
+            self._remove(path)
+            return None
+        try:
+            # The mtime doubles as the last-used time for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return entry.get('text')
+
+    def put(self, key, text):
+        path = self.path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': time.time(), 'text': text}, f)
+        os.replace(temp_path, path)
+        self._evict(keep=path)
+
+    def _evict(self, keep):
+        """Drop expired entries, then least recently used ones until the cache fits in max_bytes"""
+        with self._lock:
+            now = time.time()
+            entries = []
+            total = 0
+            with os.scandir(self.root) as scan:
+                for entry in scan:
+                    if entry.name.endswith('.json') and entry.is_file():
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+
+            for mtime, size, path in sorted(entries):
+                if path == keep:
+                    continue
+                # An entry unused for a whole TTL was necessarily created before it
+                if total > self.max_bytes or now - mtime > self.ttl:
+                    self._remove(path)
+                    total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class GeminiClient:
+    """Gemini API client sharing one connection pool, capping concurrent calls and coalescing identical prompts"""
+
+    def __init__(self, api_key, model=DEFAULT_MODEL, base_url=DEFAULT_BASE_URL, cache_folder=None,
+                 max_concurrency=4, timeout=30, cache_ttl=7 * 24 * 3600, cache_max_bytes=64 * 1024 ** 2):
+        self.api_key = api_key
+        self.model = model
+        # Point at a local stub server to exercise the client without the real API
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_folder, cache_ttl, cache_max_bytes) if cache_folder else None
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['POST']))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @classmethod
+    def from_env(cls, cache_folder=None):
+        """Build a client from GEMINI_* environment variables"""
+        return cls(os.environ.get('GEMINI_API_KEY', DUMMY_API_KEY),
+                   model=os.environ.get('GEMINI_MODEL', DEFAULT_MODEL),
+                   base_url=os.environ.get('GEMINI_BASE_URL', DEFAULT_BASE_URL),
+                   cache_folder=cache_folder,
+                   max_concurrency=int(os.environ.get('GEMINI_MAX_CONCURRENCY', 4)),
+                   timeout=int(os.environ.get('GEMINI_TIMEOUT', 30)),
+                   cache_ttl=int(os.environ.get('GEMINI_CACHE_TTL', 7 * 24 * 3600)),
+                   cache_max_bytes=int(os.environ.get('GEMINI_CACHE_MAX_BYTES', 64 * 1024 ** 2)))
+
+    @property
+    def enabled(self):
+        return bool(self.api_key) and self.api_key != DUMMY_API_KEY
+
+    def cache_key(self, prompt, generation_config):
+        digest = hashlib.sha256()
+        for part in (normalize_prompt(prompt), self.model, json.dumps(generation_config or {}, sort_keys=True)):
+            data = part.encode('utf-8')
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def generate(self, prompt, generation_config=None):
+        """Return the generated text for prompt, from the cache or a call shared with identical in-flight prompts"""
+        key = self.cache_key(prompt, generation_config)
+        if self.cache:
+            text = self.cache.get(key)
+            if text is not None:
+                logging.info(f"AI response served from cache {key[:12]}")
+                return text
+
+        shared, owner = self._join(key)
+        if not owner:
+            logging.info(f"Waiting on in-flight AI request {key[:12]}")
+            text = shared.wait()
+            if shared.error:
+                raise GeminiError(shared.error)
+            return text
+
+        try:
+            with self._semaphore:
+                text = self._request(prompt, generation_config)
+            if self.cache:
+                self.cache.put(key, text)
+            shared.append(text)
+            shared.close()
+            return text
+        except Exception as e:
+            shared.close(error=str(e))
+            raise
+        finally:
+            self._leave(key, shared)
+
+    def stream(self, prompt, generation_config=None):
+        """Yield generated text as the model produces it; followers of an in-flight prompt replay its chunks"""
+        key = self.cache_key(prompt, generation_config)
+        if self.cache:
+            text = self.cache.get(key)
+            if text is not None:
+                logging.info(f"AI response served from cache {key[:12]}")
+                yield text
+                return
+
+        shared, owner = self._join(key)
+        if not owner:
+            logging.info(f"Following in-flight AI request {key[:12]}")
+            for text in shared.follow(keepalive=None):
+                if text:
+                    yield text
+            if shared.error:
+                raise GeminiError(shared.error)
+            return
+
+        try:
+            parts = []
+            with self._semaphore:
+                for text in self._stream_request(prompt, generation_config):
+                    parts.append(text)
+                    shared.append(text)
+                    yield text
+            if self.cache and parts:
+                self.cache.put(key, ''.join(parts))
+            shared.close()
+        except Exception as e:
+            shared.close(error=str(e))
+            raise
+        finally:
+            self._leave(key, shared)
+
+    def _join(self, key):
+        """Return the shared output for key and whether the caller owns it and must produce it"""
+        with self._lock:
+            shared = self._inflight.get(key)
+            if shared is not None:
+                return shared, False
+            shared = self._inflight[key] = GenerationStream()
+            return shared, True
+
+    def _leave(self, key, shared):
+        if not shared.closed:
+            # The owner's reader stopped early, so followers would otherwise wait forever
+            shared.close(error='AI request abandoned before it finished')
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _post(self, method, prompt, generation_config, **kwargs):
+        request_data = {'contents': [{'parts': [{'text': prompt}]}]}
+        if generation_config:
+            request_data['generationConfig'] = generation_config
+
+        url = f"{self.base_url}/models/{self.model}:{method}"
+        try:
+            # Sent as a header so the key never appears in logged URLs
+            response = self.session.post(url, json=request_data, timeout=self.timeout,
+                                         headers={'x-goog-api-key': self.api_key}, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise GeminiError(f"Request error: {str(e)}")
+
+        if response.status_code != 200:
+            message = f"Gemini API error: {response.status_code} - {response.text[:500]}"
+            response.close()
+            raise GeminiError(message)
+        return response
+
+    def _request(self, prompt, generation_config):
+        response = self._post('generateContent', prompt, generation_config)
+
+        try:
+            return response.json()['candidates'][0]['content']['parts'][0]['text']
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise GeminiError('No content generated by Gemini API')
+
+    def _stream_request(self, prompt, generation_config):
+        """Yield text parts from streamGenerateContent's server-sent events"""
+        response = self._post('streamGenerateContent', prompt, generation_config, params={'alt': 'sse'}, stream=True)
+        with response:
+            try:
+                # chunk_size=None hands over each chunk as it arrives instead of waiting for a full buffer
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    try:
+                        event = json.loads(line[len('data:'):])
+                    except ValueError:
+                        logging.warning("Skipping malformed Gemini stream event")
+                        continue
+                    for candidate in event.get('candidates', [])[:1]:
+                        for part in candidate.get('content', {}).get('parts', []):
+                            if part.get('text'):
+                                yield part['text']
+            except requests.exceptions.RequestException as e:
+                raise GeminiError(f"Stream interrupted: {str(e)}")
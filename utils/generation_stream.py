@@ -0,0 +1,49 @@
+import threading
+
+
+class GenerationStream:
+    """Text produced by a background generation, replayable from the start by any number of followers"""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def append(self, text):
+        if not text:
+            return
+        with self._cond:
+            self.chunks.append(text)
+            self._cond.notify_all()
+
+    def close(self, error=None):
+        with self._cond:
+            self.closed = True
+            self.error = error
+            self._cond.notify_all()
+
+    def wait(self):
+        """Block until the generation is closed and return all of its text"""
+        with self._cond:
+            while not self.closed:
+                self._cond.wait()
+            return ''.join(self.chunks)
+
+    def follow(self, keepalive=15):
+        """Yield every chunk so far, then new ones as they arrive; yields None after keepalive idle seconds"""
+        index = 0
+        while True:
+            with self._cond:
+                if index >= len(self.chunks) and not self.closed:
+                    self._cond.wait(keepalive)
+                chunks = self.chunks[index:]
+                closed = self.closed
+
+            if chunks:
+                index += len(chunks)
+                yield ''.join(chunks)
+            elif closed:
+                return
+            else:
+                yield None
@@ -0,0 +1,57 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run_batch(project_ids, apply_project, max_workers=4):
+    """Run apply_project(project_id) across projects on a worker pool and aggregate one report.
+
+    apply_project returns a dict with a 'status' of 'ok', 'failed' or 'not_found' and, for
+    'ok', the {file: [changes]} it made under 'changes'.
+    """
+    # Keep the caller's order but never touch a project twice
+    project_ids = list(dict.fromkeys(project_ids))
+
+    def run_one(project_id):
+        try:
+            return apply_project(project_id)
+        except Exception as e:
+            logging.error(f"Batch GUI modification failed for {project_id}: {str(e)}")
+            return {'status': 'failed', 'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(project_ids) or 1))) as pool:
+        results = dict(zip(project_ids, pool.map(run_one, project_ids)))
+
+    summary = {'projects': len(project_ids), 'succeeded': 0, 'failed': 0, 'not_found': 0,
+               'files_changed': 0, 'changes': 0}
+    for result in results.values():
+        status = result.get('status')
+        if status == 'ok':
+            summary['succeeded'] += 1
+        elif status == 'not_found':
+            summary['not_found'] += 1
+        else:
+            summary['failed'] += 1
+        changes = result.get('changes') or {}
+        summary['files_changed'] += len(changes)
+        summary['changes'] += sum(len(file_changes) for file_changes in changes.values())
+
+    logging.info(f"Batch GUI modification: {summary['succeeded']}/{summary['projects']} projects, "
+                 f"{summary['changes']} changes in {summary['files_changed']} files")
+    return {'summary': summary, 'projects': results}
+
+
+class ProjectProgress:
+    """Stand-in job for one project of a batch job, mapping its progress into that project's share"""
+
+    def __init__(self, job, project_id, index, total):
+        self.job = job
+        self.project_id = project_id
+        self.index = index
+        self.total = total
+
+    def update(self, progress=None, message=None):
+        overall = None if progress is None else (self.index * 100 + progress) // self.total
+        self.job.update(overall, f"[{self.project_id}] {message}" if message else None)
+
+    def append_log(self, line):
+        self.job.append_log(f"[{self.project_id}] {line}")
@@ -0,0 +1,167 @@
+import re
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Concepts and the words or phrases that name them. Phrases match whole tokens only, so
+# "light" never fires inside "highlight", and "d-pad", "d pad" and "dpad" all tokenize alike.
+TERMS = {
+    'blue': ['blue'],
+    'green': ['green'],
+    'red': ['red'],
+    'yellow': ['yellow'],
+    'orange': ['orange'],
+    'purple': ['purple', 'violet'],
+    'pink': ['pink'],
+    'black': ['black'],
+    'white': ['white'],
+    'gray': ['gray', 'grey'],
+    'dark': ['dark', 'darker'],
+    'light': ['light', 'lights', 'lighter', 'lighting'],
+    'bigger': ['bigger', 'enlarge', 'increase size'],
+    'larger': ['larger'],
+    'smaller': ['smaller', 'shrink', 'decrease size'],
+    'wider': ['wider'],
+    'taller': ['taller'],
+    'thinner': ['thinner', 'narrower'],
+    'resize': ['resize', 'resized'],
+    'glow': ['glow', 'glows', 'glowing'],
+    'shadow': ['shadow', 'shadows', 'drop shadow'],
+    'gradient': ['gradient', 'gradients'],
+    'transparent': ['transparent', 'translucent', 'see through'],
+    'opacity': ['opacity', 'opaque'],
+    'blur': ['blur', 'blurred', 'blurry'],
+    'sharp': ['sharp', 'sharper'],
+    'bold': ['bold'],
+    'italic': ['italic', 'italics'],
+    'move': ['move', 'moved', 'relocate'],
+    'position': ['position', 'reposition'],
+    'align': ['align', 'aligned', 'alignment'],
+    'center': ['center', 'centre', 'centered', 'centred'],
+    'left': ['left'],
+    'right': ['right'],
+    'top': ['top'],
+    'bottom': ['bottom'],
+    'margin': ['margin', 'margins'],
+    'padding': ['padding'],
+    'knob': ['knob', 'knobs', 'joystick'],
+    'control': ['control', 'controls', 'controller'],
+    'dpad': ['dpad', 'd pad', 'directional pad'],
+    'connection': ['connection', 'bluetooth'],
+    'status': ['status'],
+    'connected': ['connected', 'online'],
+    'disconnected': ['disconnected', 'not connected', 'offline'],
+    'button': ['button', 'buttons'],
+    'text': ['text', 'font', 'label', 'labels'],
+}
+
+# Which concepts AIHelper.analyze_gui_changes reports, and in what order
+CATEGORIES = {
+    'colors': ['blue', 'green', 'red', 'yellow', 'orange', 'purple', 'pink', 'black', 'white', 'gray', 'dark',
+               'light'],
+    'sizes': ['bigger', 'larger', 'smaller', 'wider', 'taller', 'thinner', 'resize'],
+    'effects': ['glow', 'shadow', 'gradient', 'transparent', 'opacity', 'blur', 'sharp', 'bold', 'italic'],
+    'layout': ['move', 'position', 'align', 'center', 'left', 'right', 'top', 'bottom', 'margin', 'padding'],
+}
+
+_LARGE = {'bigger', 'larger'}
+
+
+def _color_options(field, colors):
+    return [({name}, {'colors': {field: value}}) for name, value in colors]
+
+
+_BASIC_COLORS = [('blue', '#007bff'), ('green', '#28a745'), ('red', '#dc3545')]
+
+# (triggers, options): a rule fires when any trigger concept is named, and then applies the
+# first option naming any of its concepts, like the if/elif chains these rules replaced
+MODIFICATION_RULES = [
+    ({'knob', 'control'}, _color_options('control_color', _BASIC_COLORS + [('orange', '#fd7e14')])),
+    ({'dpad'}, [(_LARGE, {'layouts': {'dpad_size': 'large'}}),
+                ({'smaller'}, {'layouts': {'dpad_size': 'small'}})]),
+    ({'glow', 'light'}, _color_options('glow_color', _BASIC_COLORS)),
+    ({'connection', 'status'}, [({'connected'}, {'strings': {'connection_status': 'Connected'},
+                                                 'colors': {'status_color': '#28a745'}}),
+                                ({'disconnected'}, {'strings': {'connection_status': 'Disconnected'},
+                                                    'colors': {'status_color': '#dc3545'}})]),
+    ({'button'}, _color_options('button_color', _BASIC_COLORS)),
+    ({'text'}, [(_LARGE, {'layouts': {'text_size': 'large'}}),
+                ({'smaller'}, {'layouts': {'text_size': 'small'}})]),
+]
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+class PhraseMatcher:
+    """Token trie over every phrase, finding all whole-word matches in one pass over the text"""
+
+    def __init__(self, terms):
+        self._root = {}
+        self._max_length = 0
+        for term, phrases in terms.items():
+            for phrase in phrases:
+                tokens = tokenize(phrase)
+                node = self._root
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                # None is never a token, so it can mark the end of a phrase
+                node[None] = term
+                self._max_length = max(self._max_length, len(tokens))
+
+    def find(self, text):
+        """Return the set of concepts named in text; longer phrases win where they overlap"""
+        tokens = tokenize(text)
+        found = set()
+        i = 0
+        while i < len(tokens):
+            node = self._root
+            match = None
+            for j in range(i, min(len(tokens), i + self._max_length)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if None in node:
+                    match = (node[None], j + 1)
+            if match:
+                found.add(match[0])
+                i = match[1]
+            else:
+                i += 1
+        return found
+
+
+class GuiRuleEngine:
+    """Intent rules over a phrase matcher, compiled once and shared by every request"""
+
+    def __init__(self, terms=TERMS, categories=CATEGORIES, rules=MODIFICATION_RULES):
+        unknown = {t for names in categories.values() for t in names} - set(terms)
+        unknown |= {t for triggers, options in rules for t in triggers} - set(terms)
+        unknown |= {t for triggers, options in rules for when, _ in options for t in when} - set(terms)
+        if unknown:
+            raise ValueError(f"GUI rules reference undefined terms: {', '.join(sorted(unknown))}")
+
+        self.matcher = PhraseMatcher(terms)
+        self.categories = categories
+        self.rules = rules
+
+    def analyze(self, description):
+        """Group the concepts named in a description by category"""
+        found = self.matcher.find(description)
+        return {category: [term for term in names if term in found] for category, names in self.categories.items()}
+
+    def apply(self, description, modifications):
+        """Merge the modifications the description asks for into a colors/layouts/strings dict"""
+        found = self.matcher.find(description)
+        for triggers, options in self.rules:
+            if not triggers & found:
+                continue
+            for when, changes in options:
+                if when & found:
+                    for section, values in changes.items():
+                        modifications.setdefault(section, {}).update(values)
+                    break
+        return modifications
+
+
+DEFAULT_ENGINE = GuiRuleEngine()
@@ -0,0 +1,175 @@
+import threading
+import logging
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting for a worker"""
+
+
+class Job:
+    """State, progress and log tail of a background task"""
+
+    def __init__(self, kind, project_id=None, next_url=None, log_size=50):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.project_id = project_id
+        self.next_url = next_url
+        # Positional arguments, so cleanup code can tell which files a job still needs
+        self.args = ()
+        self.state = 'queued'
+        self.progress = 0
+        self.message = 'Waiting for a free worker'
+        self.error = None
+        self.result = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.log = deque(maxlen=log_size)
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.state in ('queued', 'running')
+
+    def update(self, progress=None, message=None):
+        """Record progress (0-100) and an optional status message"""
+        with self._lock:
+            if progress is not None:
+                self.progress = max(0, min(100, int(progress)))
+            if message:
+                self.message = message
+                self._append_log(message)
+
+    def append_log(self, line):
+        """Add a line to the job's log tail"""
+        with self._lock:
+            self._append_log(line)
+
+    def _append_log(self, line):
+        self.log.append(f"{datetime.now().strftime('%H:%M:%S')} {line}")
+
+    def to_dict(self):
+        """Serialize the job for the polling endpoint"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'project_id': self.project_id,
+                'state': self.state,
+                'progress': self.progress,
+                'message': self.message,
+                'error': self.error,
+                'next_url': self.next_url,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'log': list(self.log)
+            }
+
+
+class _JobLogHandler(logging.Handler):
+    """Copy log records emitted by a worker thread into that thread's job"""
+
+    def __init__(self, current):
+        super().__init__(level=logging.INFO)
+        self.current = current
+
+    def emit(self, record):
+        job = getattr(self.current, 'job', None)
+        if job is not None:
+            try:
+                job.append_log(f"{record.levelname}: {record.getMessage()}")
+            except Exception:
+                self.handleError(record)
+
+
+class JobQueue:
+    """Bounded worker pool running decompile/compile/sign jobs off the request thread"""
+
+    def __init__(self, max_workers=2, max_pending=20, max_finished=100):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._project_locks = {}
+        self._current = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='apk-job')
+        logging.getLogger().addHandler(_JobLogHandler(self._current))
+
+    def submit(self, kind, func, *args, project_id=None, next_url=None, **kwargs):
+        """Queue func(job, *args, **kwargs) and return its Job record"""
+        with self._lock:
+            # Hand back the in-flight job instead of starting a duplicate for the project
+            if project_id is not None:
+                for job in self.jobs.values():
+                    if job.active and job.kind == kind and job.project_id == project_id:
+                        return job
+
+            pending = sum(1 for job in self.jobs.values() if job.active)
+            if pending >= self.max_workers + self.max_pending:
+                raise JobQueueFull("Too many jobs are queued, please try again shortly")
+
+            job = Job(kind, project_id=project_id, next_url=next_url)
+            job.args = args
+            self.jobs[job.id] = job
+            self._prune()
+
+        self._executor.submit(self._run, job, func, args, kwargs)
+        logging.info(f"Job queued: {kind} {job.id}")
+        return job
+
+    def get(self, job_id):
+        """Look up a job by ID"""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def active_jobs(self, project_id=None):
+        """List queued or running jobs, optionally for a single project"""
+        with self._lock:
+            return [job for job in self.jobs.values()
+                    if job.active and (project_id is None or job.project_id == project_id)]
+
+    def project_lock(self, project_id):
+        """Lock serializing work on one project across jobs of different kinds, e.g. compile and batch_compile"""
+        with self._lock:
+            return self._project_locks.setdefault(project_id, threading.Lock())
+
+    def _run(self, job, func, args, kwargs):
+        """Execute a job in a worker thread and record its outcome"""
+        self._current.job = job
+        with job._lock:
+            job.state = 'running'
+            job.started_at = datetime.now().isoformat()
+        started = f"Started {job.kind}"
+        job.update(message=started)
+
+        try:
+            result = func(job, *args, **kwargs)
+            with job._lock:
+                job.result = result
+                job.state = 'done'
+                job.progress = 100
+            # Keep the job's own final message, e.g. "APK compiled successfully!"
+            if job.message == started:
+                job.update(message=f"Finished {job.kind}")
+        except Exception as e:
+            logging.error(f"Job {job.kind} {job.id} failed: {str(e)}")
+            with job._lock:
+                job.state = 'failed'
+                job.error = str(e)
+                job.message = str(e)
+        finally:
+            with job._lock:
+                job.finished_at = datetime.now().isoformat()
+            self._current.job = None
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_finished"""
+        finished = [job_id for job_id, job in self.jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
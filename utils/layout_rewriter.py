@@ -0,0 +1,195 @@
+import os
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+# One scan finds every start tag, stepping over comments, processing instructions and CDATA
+_MARKUP = re.compile(
+    r'<!--.*?-->|<\?.*?\?>|<!\[CDATA\[.*?\]\]>'
+    r'|<(?P<tag>[A-Za-z_][\w.:-]*)(?P<attrs>(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*)(?P<end>\s*/?>)',
+    re.DOTALL)
+_ATTRIBUTE = re.compile(r'(?P<name>[^\s=/>]+)\s*=\s*(?:"(?P<dq>[^"]*)"|\'(?P<sq>[^\']*)\')')
+
+
+class AttributeRule:
+    """Rewrite one attribute; rewrite(value) returns the new value, or None to leave it alone.
+
+    Values are the raw attribute text as written in the file. With add_missing, elements
+    lacking the attribute get rewrite(None) appended.
+    """
+
+    def __init__(self, attribute, rewrite, tags=None, add_missing=False):
+        self.attribute = attribute
+        self.rewrite = rewrite
+        self.tags = set(tags) if tags else None
+        self.add_missing = add_missing
+
+    def applies_to(self, tag):
+        return self.tags is None or tag in self.tags
+
+
+def scale_unit(factor, unit):
+    """Rewrite for values like "14sp": multiply the number, keep anything else as is"""
+    pattern = re.compile(rf'(\d+(?:\.\d+)?){re.escape(unit)}')
+
+    def rewrite(value):
+        match = pattern.fullmatch(value or '')
+        return f"{float(match.group(1)) * factor:.0f}{unit}" if match else None
+    return rewrite
+
+
+def map_values(mapping):
+    """Rewrite that swaps whole values through a dict"""
+    return mapping.get
+
+
+def constant(value):
+    """Rewrite for add_missing rules that always supply the same value"""
+    return lambda current: value if current is None else None
+
+
+class LayoutRewriter:
+    """Apply a set of attribute rules to layout XML in one pass over each file's start tags"""
+
+    def __init__(self, rules, max_workers=None):
+        # Looked up per attribute and per tag, so the cost of a tag is independent of the rule count
+        self._by_attribute = {}
+        self._additions = []
+        for rule in rules:
+            self._by_attribute.setdefault(rule.attribute, []).append(rule)
+            if rule.add_missing:
+                self._additions.append(rule)
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) + 4)
+
+    def rewrite_text(self, text):
+        """Return the rewritten text and a list of changes (element, line, attribute, old, new)"""
+        changes = []
+        line = [1, 0]
+
+        def line_of(pos):
+            # Matches arrive in order, so count newlines incrementally
+            line[0] += text.count('\n', line[1], pos)
+            line[1] = pos
+            return line[0]
+
+        def replace_tag(match):
+            tag = match.group('tag')
+            if tag is None:
+                return match.group(0)
+
+            attrs = match.group('attrs')
+            pieces = []
+            last = 0
+            present = set()
+            for attr in _ATTRIBUTE.finditer(attrs):
+                name = attr.group('name')
+                present.add(name)
+                value_group = 'dq' if attr.group('dq') is not None else 'sq'
+                value = attr.group(value_group)
+                for rule in self._by_attribute.get(name, ()):
+                    if not rule.applies_to(tag):
+                        continue
+                    new_value = rule.rewrite(value)
+                    if new_value is not None and new_value != value:
+                        pieces.append(attrs[last:attr.start(value_group)])
+                        pieces.append(new_value)
+                        last = attr.end(value_group)
+                        changes.append({'element': tag, 'line': line_of(match.start()), 'attribute': name,
+                                        'old': value, 'new': new_value})
+                    break
+            pieces.append(attrs[last:])
+
+            for rule in self._additions:
+                if rule.attribute in present or not rule.applies_to(tag):
+                    continue
+                new_value = rule.rewrite(None)
+                if new_value is not None:
+                    present.add(rule.attribute)
+                    pieces.append(f' {rule.attribute}="{new_value}"')
+                    changes.append({'element': tag, 'line': line_of(match.start()), 'attribute': rule.attribute,
+                                    'old': None, 'new': new_value})
+
+            new_attrs = ''.join(pieces)
+            if new_attrs == attrs:
+                return match.group(0)
+            return f"<{tag}{new_attrs}{match.group('end')}"
+
+        return _MARKUP.sub(replace_tag, text), changes
+
+    def rewrite_file(self, path):
+        """Rewrite one file in place, writing it only when something changed; return its changes"""
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        new_text, changes = self.rewrite_text(text)
+        if changes:
+            _write_atomic(path, new_text)
+        return changes
+
+    def rewrite_files(self, paths):
+        """Rewrite files on a worker pool and return {path: changes} for the files that changed"""
+        report = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for path, future in [(path, pool.submit(self.rewrite_file, path)) for path in paths]:
+                try:
+                    changes = future.result()
+                except (OSError, UnicodeDecodeError) as e:
+                    logging.error(f"Could not rewrite {path}: {str(e)}")
+                    continue
+                if changes:
+                    report[path] = changes
+        return report
+
+
+def layout_paths(decompiled_dir):
+    """XML files directly under res/layout"""
+    layout_dir = os.path.join(decompiled_dir, 'res', 'layout')
+    if not os.path.isdir(layout_dir):
+        return []
+    with os.scandir(layout_dir) as entries:
+        return sorted(entry.path for entry in entries if entry.name.endswith('.xml') and entry.is_file())
+
+
+def rewrite_values(path, tag, values, add_missing=False):
+    """Set the text of <tag name="..."> resources in a values XML file in one pass; return the changes"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    changes = []
+    seen = set()
+    pattern = re.compile(rf'(<{tag}\s+name="(?P<name>[^"]+)"[^>]*(?<!/)>)(?P<value>.*?)(</{tag}>)', re.DOTALL)
+
+    def replace(match):
+        name = match.group('name')
+        if name not in values:
+            return match.group(0)
+        seen.add(name)
+        new_value = escape(str(values[name]))
+        if new_value == match.group('value'):
+            return match.group(0)
+        changes.append({'element': tag, 'name': name, 'old': match.group('value'), 'new': new_value})
+        return f"{match.group(1)}{new_value}{match.group(4)}"
+
+    text = pattern.sub(replace, text)
+
+    if add_missing:
+        insert_point = text.rfind('</resources>')
+        if insert_point >= 0:
+            added = ''
+            for name, value in values.items():
+                if name not in seen:
+                    added += f'    <{tag} name="{escape(name)}">{escape(str(value))}</{tag}>\n'
+                    changes.append({'element': tag, 'name': name, 'old': None, 'new': escape(str(value))})
+            text = text[:insert_point] + added + text[insert_point:]
+
+    if changes:
+        _write_atomic(path, text)
+    return changes
+
+
+def _write_atomic(path, text):
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
@@ -0,0 +1,118 @@
+import os
+import shutil
+import zipfile
+import logging
+import threading
+
+# Entries the editor works on directly; everything else stays in original.apk until read
+EAGER_PREFIXES = ('res/values/', 'res/layout/')
+EAGER_ENTRIES = ('AndroidManifest.xml',)
+
+_directory_cache = {}
+_directory_lock = threading.Lock()
+
+
+def _central_directory(apk_path):
+    """Map archive names to ZipInfo for an APK, cached until the file changes"""
+    stat = os.stat(apk_path)
+    key = (os.path.abspath(apk_path), stat.st_size, stat.st_mtime_ns)
+    with _directory_lock:
+        entries = _directory_cache.get(key)
+    if entries is None:
+        with zipfile.ZipFile(apk_path, 'r') as zf:
+            entries = {info.filename: info for info in zf.infolist() if not info.is_dir()}
+        with _directory_lock:
+            _directory_cache.clear()
+            _directory_cache[key] = entries
+    return entries
+
+
+class LazyTree:
+    """Decompiled tree backed by original.apk, extracting entries on first access"""
+
+    def __init__(self, decompiled_dir, original_apk):
+        self.decompiled_dir = decompiled_dir
+        self.original_apk = original_apk
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, apk_path, decompiled_dir):
+        """Extract only the entries the editor needs up front and return the number extracted"""
+        os.makedirs(decompiled_dir, exist_ok=True)
+        extracted = 0
+        with zipfile.ZipFile(apk_path, 'r') as zf:
+            for info in zf.infolist():
+                name = info.filename
+                if info.is_dir() or not (name in EAGER_ENTRIES or name.startswith(EAGER_PREFIXES)):
+                    continue
+                target = cls._safe_path(decompiled_dir, name)
+                if target:
+                    zf.extract(info, decompiled_dir)
+                    extracted += 1
+        logging.info(f"Lazy decompile: extracted {extracted} entries up front")
+        return extracted
+
+    def entries(self):
+        """Archive entries of the original APK"""
+        if not os.path.exists(self.original_apk):
+            return {}
+        return _central_directory(self.original_apk)
+
+    def list_dir(self, rel_dir):
+        """List (name, size) for files directly in rel_dir, on disk or still in the archive"""
+        files = {}
+        prefix = rel_dir.strip('/') + '/'
+        for name, info in self.entries().items():
+            if name.startswith(prefix) and '/' not in name[len(prefix):]:
+                files[name[len(prefix):]] = info.file_size
+
+        # Files on disk win: they may have been edited or added
+        directory = os.path.join(self.decompiled_dir, *rel_dir.strip('/').split('/'))
+        if os.path.isdir(directory):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        files[entry.name] = entry.stat().st_size
+
+        return sorted(files.items())
+
+    def exists(self, rel_path):
+        """Check whether a file exists on disk or in the original archive"""
+        full_path = self._safe_path(self.decompiled_dir, rel_path)
+        if not full_path:
+            return False
+        return os.path.exists(full_path) or rel_path.replace(os.sep, '/') in self.entries()
+
+    def path(self, rel_path):
+        """On-disk path of rel_path without extracting it, or None if it escapes the tree"""
+        return self._safe_path(self.decompiled_dir, rel_path)
+
+    def materialize(self, rel_path):
+        """Return the on-disk path of rel_path, extracting it from the archive if needed"""
+        full_path = self._safe_path(self.decompiled_dir, rel_path)
+        if not full_path or os.path.exists(full_path):
+            return full_path
+
+        info = self.entries().get(rel_path.replace(os.sep, '/'))
+        if info is None:
+            return full_path
+
+        with self._lock:
+            if not os.path.exists(full_path):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                temp_path = full_path + '.tmp'
+                with zipfile.ZipFile(self.original_apk, 'r') as zf, \
+                        zf.open(info) as src, open(temp_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(temp_path, full_path)
+                logging.info(f"Materialized {rel_path} from original APK")
+        return full_path
+
+    @staticmethod
+    def _safe_path(base_dir, rel_path):
+        """Resolve rel_path under base_dir, or None if it escapes it"""
+        base = os.path.realpath(base_dir)
+        full_path = os.path.realpath(os.path.join(base, rel_path))
+        if os.path.commonpath([base, full_path]) != base or full_path == base:
+            return None
+        return full_path
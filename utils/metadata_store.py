@@ -0,0 +1,145 @@
+import os
+import copy
+import json
+import logging
+import threading
+
+
+class _ProjectState:
+    """Lock, queued updates and cached document of one project's metadata.json"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        # (mtime_ns, size) and parsed document, swapped as one tuple so readers never mix them
+        self.cache = None
+
+
+class _PendingUpdate:
+    def __init__(self, updates):
+        self.updates = updates
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class MetadataStore:
+    """metadata.json access with per-project locks, atomic writes and an mtime-checked read cache"""
+
+    FILENAME = 'metadata.json'
+
+    def __init__(self, projects_folder):
+        self.projects_folder = projects_folder
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def path(self, project_id):
+        return os.path.join(self.projects_folder, project_id, self.FILENAME)
+
+    def exists(self, project_id):
+        return os.path.isfile(self.path(project_id))
+
+    def load(self, project_id):
+        """Return a copy of a project's metadata, or None if it has none"""
+        state = self._state(project_id)
+        metadata = self._read(project_id, state)
+        return copy.deepcopy(metadata) if metadata is not None else None
+
+    def save(self, project_id, metadata):
+        """Replace a project's metadata"""
+        state = self._state(project_id)
+        with state.lock:
+            self._write(project_id, state, copy.deepcopy(metadata))
+
+    def update(self, project_id, updates):
+        """Merge a dict of fields, or apply a callable editing the dict in place, and return the result"""
+        # Updates queued while another thread holds the lock are applied by it in the same write
+        state = self._state(project_id)
+        pending = _PendingUpdate(updates)
+        with self._lock:
+            state.pending.append(pending)
+
+        with state.lock:
+            if pending.done:
+                if pending.error:
+                    raise pending.error
+                return pending.result
+
+            with self._lock:
+                batch, state.pending = state.pending, []
+
+            try:
+                metadata = self._apply(project_id, state, batch)
+            except Exception as e:
+                # Every caller in the batch sees the failed read or write
+                metadata = None
+                for item in batch:
+                    item.error = e
+
+            for item in batch:
+                item.result = copy.deepcopy(metadata) if metadata is not None else None
+                item.done = True
+
+        if pending.error:
+            raise pending.error
+        return pending.result
+
+    def _apply(self, project_id, state, batch):
+        metadata = self._read(project_id, state)
+        if metadata is None:
+            return None
+
+        metadata = copy.deepcopy(metadata)
+        for item in batch:
+            try:
+                if callable(item.updates):
+                    item.updates(metadata)
+                else:
+                    metadata.update(item.updates)
+            except Exception as e:
+                # Reported to the caller that queued it; the rest of the batch still lands
+                item.error = e
+        self._write(project_id, state, metadata)
+        if len(batch) > 1:
+            logging.debug(f"Coalesced {len(batch)} metadata updates for {project_id}")
+        return metadata
+
+    def forget(self, project_id):
+        """Drop cached state for a deleted project"""
+        with self._lock:
+            self._states.pop(project_id, None)
+
+    def _state(self, project_id):
+        with self._lock:
+            return self._states.setdefault(project_id, _ProjectState())
+
+    def _read(self, project_id, state):
+        """Parsed metadata, re-read only when the file's mtime or size changed"""
+        path = self.path(project_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        key = (stat.st_mtime_ns, stat.st_size)
+        cache = state.cache
+        if cache is not None and cache[0] == key:
+            return cache[1]
+
+        with open(path, 'r') as f:
+            metadata = json.load(f)
+        state.cache = (key, metadata)
+        return metadata
+
+    def _write(self, project_id, state, metadata):
+        """Write through a temp file and rename, so readers never see a partial document"""
+        path = self.path(project_id)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+        stat = os.stat(path)
+        state.cache = ((stat.st_mtime_ns, stat.st_size), metadata)
@@ -0,0 +1,82 @@
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.apk_rebuilder import order_entries, write_entry, write_file, compress_file
+from utils.compression_policy import DEFAULT_POLICY
+
+# Files above this size are streamed through zipfile in order instead of held in memory
+_STREAM_THRESHOLD = 64 * 1024 * 1024
+
+
+class ParallelZipWriter:
+    """Build an archive by compressing entries on a worker pool and writing them in a fixed order"""
+
+    def __init__(self, output_path, policy=DEFAULT_POLICY, compresslevel=-1, max_workers=None):
+        self.output_path = output_path
+        self.policy = policy
+        self.compresslevel = compresslevel
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._entries = {}
+
+    def add_file(self, file_path, arcname, compress_type=None):
+        """Queue a file for the archive; a later add with the same name replaces it"""
+        arcname = arcname.replace(os.sep, '/')
+        self._entries.pop(arcname, None)
+        if compress_type is None:
+            compress_type = self.policy.compress_type(arcname)
+        self._entries[arcname] = (file_path, compress_type)
+
+    def add_tree(self, directory, skip=None):
+        """Queue every file under directory in sorted order; skip(arcname) can exclude entries"""
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                arcname = os.path.relpath(file_path, directory).replace(os.sep, '/')
+                if skip is None or not skip(arcname):
+                    self.add_file(file_path, arcname)
+
+    def write(self):
+        """Compress all queued entries and write the archive, priority entries first"""
+        names = order_entries(self._entries)
+        window = self.max_workers * 2
+
+        # zlib releases the GIL while deflating, so threads keep every core busy
+        # without copying file contents between processes
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool, \
+                zipfile.ZipFile(self.output_path, 'w', self.policy.default) as dst:
+            pending = deque()
+            queue = iter(names)
+
+            def submit_next():
+                for name in queue:
+                    file_path, compress_type = self._entries[name]
+                    if os.path.getsize(file_path) > _STREAM_THRESHOLD:
+                        pending.append((name, None))
+                    else:
+                        pending.append((name, pool.submit(compress_file, file_path, compress_type,
+                                                          self.compresslevel)))
+                    return True
+                return False
+
+            while len(pending) < window and submit_next():
+                pass
+
+            while pending:
+                name, future = pending.popleft()
+                file_path, compress_type = self._entries[name]
+                if future is None:
+                    write_file(dst, file_path, name, compress_type, self.policy.alignment)
+                else:
+                    crc, size, data = future.result()
+                    zinfo = zipfile.ZipInfo.from_file(file_path, name)
+                    zinfo.compress_type = compress_type
+                    zinfo.CRC = crc
+                    zinfo.file_size = size
+                    zinfo.compress_size = len(data)
+                    write_entry(dst, zinfo, [data], self.policy.alignment)
+                submit_next()
+
+        return len(names)
@@ -0,0 +1,98 @@
+import os
+import hashlib
+import logging
+import threading
+
+# Bump when the renderers change so stale images stop matching
+RENDER_VERSION = '1'
+
+
+class PreviewCache:
+    """Rendered preview PNGs keyed by a hash of everything they are drawn from, evicted LRU by size"""
+
+    def __init__(self, root, max_bytes=256 * 1024 ** 2):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def make_key(self, *parts):
+        """Hash render inputs (bytes or str) into a cache key"""
+        digest = hashlib.sha256(RENDER_VERSION.encode('utf-8'))
+        for part in parts:
+            data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.png")
+
+    @staticmethod
+    def etag(path):
+        """Strong ETag of a cached image: its key, which changes whenever the content does"""
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def get(self, key):
+        """Return the cached image path, or None on a miss"""
+        path = self.path(key)
+        try:
+            # The mtime doubles as the last-used time for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def render(self, key, render_func):
+        """Return the cached image for key, calling render_func(path) to draw it on a miss"""
+        path = self.get(key)
+        if path:
+            return path
+
+        with self._key_lock(key):
+            # Another request may have rendered it while we waited
+            path = self.get(key)
+            if path:
+                return path
+
+            path = self.path(key)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                render_func(temp_path)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            logging.info(f"Rendered preview {key[:12]}")
+
+        self._evict(keep=path)
+        return path
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _evict(self, keep):
+        """Drop least recently used images until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.root) as scan:
+                for entry in scan:
+                    if entry.name.endswith('.png') and entry.is_file():
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self._key_locks.pop(os.path.basename(path)[:-len('.png')], None)
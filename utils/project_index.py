@@ -0,0 +1,130 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    original_apk TEXT,
+    status TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    has_compiled INTEGER NOT NULL DEFAULT 0,
+    has_signed INTEGER NOT NULL DEFAULT 0,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS projects_created_at ON projects (created_at);
+CREATE INDEX IF NOT EXISTS projects_updated_at ON projects (updated_at);
+CREATE INDEX IF NOT EXISTS projects_name ON projects (name);
+CREATE INDEX IF NOT EXISTS projects_size ON projects (size);
+"""
+
+
+class ProjectIndex:
+    """SQLite index of project metadata, sizes and build outputs kept under projects/"""
+
+    FILENAME = 'index.db'
+    SORT_COLUMNS = ('created_at', 'updated_at', 'name', 'size')
+
+    def __init__(self, projects_folder):
+        self.db_path = os.path.join(projects_folder, self.FILENAME)
+        self.created = not os.path.exists(self.db_path)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def upsert(self, metadata, size, has_compiled, has_signed):
+        """Insert or replace a project's row"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO projects '
+                '(id, name, original_apk, status, created_at, updated_at, size, has_compiled, has_signed, metadata) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (metadata['id'], metadata.get('name'), metadata.get('original_apk'), metadata.get('status'),
+                 metadata.get('created_at', ''), metadata.get('updated_at', metadata.get('created_at', '')),
+                 size, int(bool(has_compiled)), int(bool(has_signed)), json.dumps(metadata))
+            )
+
+    def update_metadata(self, metadata):
+        """Replace a project's metadata, keeping its size and output flags"""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE projects SET name = ?, original_apk = ?, status = ?, created_at = ?, updated_at = ?, '
+                'metadata = ? WHERE id = ?',
+                (metadata.get('name'), metadata.get('original_apk'), metadata.get('status'),
+                 metadata.get('created_at', ''), metadata.get('updated_at', metadata.get('created_at', '')),
+                 json.dumps(metadata), metadata['id'])
+            )
+            return cursor.rowcount > 0
+
+    def adjust_size(self, project_id, delta):
+        """Add delta bytes to a project's recorded size"""
+        if not delta:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute('UPDATE projects SET size = MAX(0, size + ?) WHERE id = ?', (delta, project_id))
+
+    def set_size(self, project_id, size):
+        """Overwrite a project's recorded size"""
+        with self._lock, self._connect() as conn:
+            conn.execute('UPDATE projects SET size = ? WHERE id = ?', (size, project_id))
+
+    def set_outputs(self, project_id, has_compiled, has_signed):
+        """Record whether compiled/signed APKs exist for a project"""
+        with self._lock, self._connect() as conn:
+            conn.execute('UPDATE projects SET has_compiled = ?, has_signed = ? WHERE id = ?',
+                         (int(bool(has_compiled)), int(bool(has_signed)), project_id))
+
+    def remove(self, project_id):
+        """Drop a project's row"""
+        with self._lock, self._connect() as conn:
+            conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+
+    def get(self, project_id):
+        """Return a project's indexed metadata, or None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM projects WHERE id = ?', (project_id,)).fetchone()
+        return self._to_project(row) if row else None
+
+    def list(self, offset=0, limit=None, sort='created_at', descending=True):
+        """Return one page of projects ordered by an indexed column"""
+        if sort not in self.SORT_COLUMNS:
+            sort = 'created_at'
+        order = 'DESC' if descending else 'ASC'
+        query = f'SELECT * FROM projects ORDER BY {sort} {order}, id {order} LIMIT ? OFFSET ?'
+
+        with self._connect() as conn:
+            rows = conn.execute(query, (limit if limit is not None else -1, max(0, offset))).fetchall()
+        return [self._to_project(row) for row in rows]
+
+    def count(self):
+        """Return the number of indexed projects"""
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+
+    def ids(self):
+        """Return the IDs of all indexed projects"""
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute('SELECT id FROM projects')}
+
+    def _to_project(self, row):
+        project = json.loads(row['metadata'])
+        project['size'] = row['size']
+        project['has_compiled'] = bool(row['has_compiled'])
+        project['has_signed'] = bool(row['has_signed'])
+        return project
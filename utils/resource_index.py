@@ -0,0 +1,198 @@
+import os
+import copy
+import json
+import logging
+import threading
+import xml.etree.ElementTree as ET
+
+ANDROID_NS = '{http://schemas.android.com/apk/res/android}'
+INDEX_VERSION = 2
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+STRINGS_PATH = 'res/values/strings.xml'
+COLORS_PATH = 'res/values/colors.xml'
+MANIFEST_PATH = 'AndroidManifest.xml'
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _parse_manifest(manifest_path):
+    """Return (package, application label, launcher activity) from a decoded AndroidManifest.xml"""
+    root = ET.parse(manifest_path).getroot()
+    package = root.get('package')
+
+    app_element = root.find('.//application')
+    label = app_element.get(ANDROID_NS + 'label') if app_element is not None else None
+
+    launcher = None
+    for activity in root.iter('activity'):
+        for intent_filter in activity.iter('intent-filter'):
+            actions = {a.get(ANDROID_NS + 'name') for a in intent_filter.iter('action')}
+            categories = {c.get(ANDROID_NS + 'name') for c in intent_filter.iter('category')}
+            if 'android.intent.action.MAIN' in actions and 'android.intent.category.LAUNCHER' in categories:
+                launcher = activity.get(ANDROID_NS + 'name')
+                break
+        if launcher:
+            break
+
+    return package, label, launcher
+
+
+def _parse_values(values_path, tag):
+    """Map resource names to values for one tag (string, color) of a values XML file"""
+    root = ET.parse(values_path).getroot()
+    return {element.get('name'): element.text or '' for element in root.iter(tag) if element.get('name')}
+
+
+class ResourceIndex:
+    """Manifest and resource metadata of a decompiled project, built once and kept in resource_index.json"""
+
+    def __init__(self, decompiled_dir, index_path=None):
+        self.decompiled_dir = decompiled_dir
+        # Stored next to decompiled/ so it never ends up in a build
+        self.index_path = index_path or os.path.join(os.path.dirname(os.path.abspath(decompiled_dir)),
+                                                     'resource_index.json')
+
+    def build(self):
+        """Parse the manifest, strings and colors once, inventory layouts and drawables, and save the index"""
+        data = {
+            'version': INDEX_VERSION,
+            'package': None,
+            'app_label': None,
+            'launcher_activity': None,
+            'strings': {},
+            'strings_size': None,
+            'colors': {},
+            'layouts': {},
+            'drawables': {}
+        }
+        self._index_manifest(data)
+        self._index_strings(data)
+        self._index_colors(data)
+
+        res_dir = os.path.join(self.decompiled_dir, 'res')
+        if os.path.isdir(res_dir):
+            with os.scandir(res_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        self._index_directory(data, f"res/{entry.name}")
+
+        self._save(data)
+        logging.info(f"Resource index built: {len(data['strings'])} strings, "
+                     f"{len(data['layouts'])} layouts, {len(data['drawables'])} drawables")
+        return data
+
+    def load(self):
+        """Return a copy of the index, building it if it is missing or from an older version"""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return self.build()
+
+        key = (self.index_path, stat.st_mtime_ns, stat.st_size)
+        with _cache_lock:
+            data = _cache.get(self.index_path)
+            if data is not None and data[0] == key:
+                # Callers may edit what they get; the cached document is shared by every request
+                return copy.deepcopy(data[1])
+
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Rebuilding unreadable resource index: {str(e)}")
+            return self.build()
+        if data.get('version') != INDEX_VERSION:
+            return self.build()
+
+        with _cache_lock:
+            _cache[self.index_path] = (key, data)
+        return copy.deepcopy(data)
+
+    def update(self, *rel_paths):
+        """Refresh the index entries for resources that were saved"""
+        data = self.load()
+        for rel_path in rel_paths:
+            rel_path = rel_path.replace(os.sep, '/').lstrip('/')
+            if rel_path == MANIFEST_PATH:
+                self._index_manifest(data)
+            elif rel_path == STRINGS_PATH:
+                self._index_strings(data)
+            elif rel_path == COLORS_PATH:
+                self._index_colors(data)
+            else:
+                self._index_file(data, rel_path)
+        self._save(data)
+        return data
+
+    def app_name(self, data=None):
+        """Resolve the app label through the string table"""
+        data = data or self.load()
+        strings = data['strings']
+        if strings.get('app_name'):
+            return strings['app_name']
+
+        label = data.get('app_label')
+        if label and label.startswith('@string/'):
+            return strings.get(label[len('@string/'):])
+        return label
+
+    def _index_manifest(self, data):
+        manifest_path = os.path.join(self.decompiled_dir, MANIFEST_PATH)
+        data['package'] = data['app_label'] = data['launcher_activity'] = None
+        if os.path.exists(manifest_path):
+            try:
+                data['package'], data['app_label'], data['launcher_activity'] = _parse_manifest(manifest_path)
+            except ET.ParseError as e:
+                logging.warning(f"Could not parse AndroidManifest.xml: {str(e)}")
+
+    def _index_strings(self, data):
+        strings_path = os.path.join(self.decompiled_dir, STRINGS_PATH)
+        data['strings'] = {}
+        data['strings_size'] = None
+        if os.path.exists(strings_path):
+            data['strings_size'] = os.path.getsize(strings_path)
+            try:
+                data['strings'] = _parse_values(strings_path, 'string')
+            except ET.ParseError as e:
+                logging.warning(f"Could not parse strings.xml: {str(e)}")
+
+    def _index_colors(self, data):
+        colors_path = os.path.join(self.decompiled_dir, COLORS_PATH)
+        data['colors'] = {}
+        if os.path.exists(colors_path):
+            try:
+                data['colors'] = _parse_values(colors_path, 'color')
+            except ET.ParseError as e:
+                logging.warning(f"Could not parse colors.xml: {str(e)}")
+
+    def _index_directory(self, data, rel_dir):
+        with os.scandir(os.path.join(self.decompiled_dir, rel_dir)) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self._add_file(data, f"{rel_dir}/{entry.name}", entry.stat().st_size)
+
+    def _index_file(self, data, rel_path):
+        full_path = os.path.join(self.decompiled_dir, rel_path)
+        data['layouts'].pop(rel_path, None)
+        data['drawables'].pop(rel_path, None)
+        if os.path.isfile(full_path):
+            self._add_file(data, rel_path, os.path.getsize(full_path))
+
+    @staticmethod
+    def _add_file(data, rel_path, size):
+        directory, name = rel_path.rsplit('/', 1)
+        if directory == 'res/layout' and name.endswith('.xml'):
+            data['layouts'][rel_path] = size
+        elif directory.startswith(('res/drawable', 'res/mipmap')) and name.lower().endswith(IMAGE_EXTENSIONS):
+            data['drawables'][rel_path] = size
+
+    def _save(self, data):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(temp_path, self.index_path)
+
+        stat = os.stat(self.index_path)
+        with _cache_lock:
+            _cache[self.index_path] = ((self.index_path, stat.st_mtime_ns, stat.st_size), copy.deepcopy(data))
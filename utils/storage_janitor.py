@@ -0,0 +1,178 @@
+import os
+import time
+import json
+import shutil
+import fnmatch
+import logging
+import threading
+
+# Entries younger than this are never evicted for quota; they may still be being written
+_GRACE_SECONDS = 10 * 60
+
+
+class StorageCategory:
+    """Top-level entries of a folder matching name patterns, removed once older than ttl seconds"""
+
+    def __init__(self, name, folder, patterns, ttl):
+        self.name = name
+        self.folder = folder
+        self.patterns = patterns
+        self.ttl = ttl
+
+    def matches(self, entry_name):
+        return any(fnmatch.fnmatch(entry_name, pattern) for pattern in self.patterns)
+
+
+def default_categories(upload_folder, temp_folder):
+    """Categories for the temp and upload folders; STORAGE_TTL_<NAME> overrides a TTL in seconds"""
+    hour = 3600
+    categories = [
+        StorageCategory('partial_uploads', os.path.join(upload_folder, 'partial'), ['*.part', '*.json'], 48 * hour),
+        StorageCategory('uploads', upload_folder, ['*_*'], 24 * hour),
+        StorageCategory('extract_dirs', temp_folder,
+                        ['icon_extract_*', 'apk_plus_*', 'installable_*', 'std_apk_*'], hour),
+        StorageCategory('previews', temp_folder, ['layout_preview_*.png', 'icon_*.png', 'preview_*.png'], 24 * hour),
+        StorageCategory('generated_functions', temp_folder, ['generated_function_*.py'], 7 * 24 * hour),
+        StorageCategory('conversions', temp_folder, ['convert_*'], 7 * 24 * hour),
+    ]
+    for category in categories:
+        ttl = os.environ.get(f"STORAGE_TTL_{category.name.upper()}")
+        if ttl:
+            category.ttl = int(ttl)
+    return categories
+
+
+def conversion_paths(temp_folder):
+    """Files referenced by the conversion history, which must stay downloadable"""
+    record_path = os.path.join(temp_folder, 'conversions.json')
+    try:
+        with open(record_path, 'r') as f:
+            conversions = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return {record['path'] for record in conversions if isinstance(record, dict) and record.get('path')}
+
+
+def job_paths(job_queue):
+    """Path arguments of queued or running jobs"""
+    return {arg for job in job_queue.active_jobs() for arg in job.args if isinstance(arg, str)}
+
+
+class StorageJanitor:
+    """Expire temp and upload files by category TTL and evict the oldest beyond a total-bytes quota"""
+
+    def __init__(self, categories, max_bytes=5 * 1024 ** 3, interval=3600, protected=None):
+        self.categories = categories
+        self.max_bytes = max_bytes
+        self.interval = interval
+        # Callables returning paths that must survive a sweep (conversion history, active jobs)
+        self.protected = protected or []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Sweep now and then every interval seconds on a daemon thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='storage-janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def sweep(self):
+        """Run one pass and return the number of entries and bytes removed"""
+        with self._lock:
+            now = time.time()
+            protected = self._protected_paths()
+            removed = freed = 0
+            survivors = []
+
+            for category, path, size, mtime in self._entries():
+                if path in protected:
+                    continue
+                if now - mtime > category.ttl:
+                    if self._remove(path):
+                        removed += 1
+                        freed += size
+                else:
+                    survivors.append((mtime, size, path))
+
+            # Over quota: least recently modified first, sparing anything still fresh
+            total = sum(size for mtime, size, path in survivors)
+            for mtime, size, path in sorted(survivors):
+                if total <= self.max_bytes:
+                    break
+                if now - mtime < _GRACE_SECONDS:
+                    continue
+                if self._remove(path):
+                    removed += 1
+                    freed += size
+                    total -= size
+
+        if removed:
+            logging.info(f"Storage janitor removed {removed} entries ({freed} bytes)")
+        return {'removed': removed, 'freed': freed}
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.error(f"Storage janitor sweep failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def _protected_paths(self):
+        paths = set()
+        for source in self.protected:
+            try:
+                paths.update(os.path.abspath(path) for path in source())
+            except Exception as e:
+                logging.error(f"Storage janitor could not list protected paths: {str(e)}")
+        return paths
+
+    def _entries(self):
+        """Yield (category, path, size, mtime) for every entry a category owns; first match wins"""
+        seen = set()
+        for category in self.categories:
+            folder = os.path.abspath(category.folder)
+            try:
+                scan = os.scandir(folder)
+            except FileNotFoundError:
+                continue
+            with scan:
+                for entry in scan:
+                    path = os.path.join(folder, entry.name)
+                    if path in seen or not category.matches(entry.name):
+                        continue
+                    seen.add(path)
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                        size = self._tree_size(path) if entry.is_dir(follow_symlinks=False) else stat.st_size
+                    except FileNotFoundError:
+                        continue
+                    yield category, path, size, stat.st_mtime
+
+    def _tree_size(self, directory):
+        total = 0
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _remove(self, path):
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logging.warning(f"Storage janitor could not remove {path}: {str(e)}")
+            return False